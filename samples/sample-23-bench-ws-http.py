@@ -0,0 +1,67 @@
+#
+# APIサーバーの HTTP(`/cmd`) と WebSocket(`/ws`) の速さを比べる
+#
+# $ pi0servo api-server 17 18 &
+# $ uv run samples/sample-23-bench-ws-http.py [N] [HOST:PORT]
+#
+# サーボを動かさないコマンド(qsize)を N 回送り、
+# 1秒あたりのコマンド数と、往復の遅れ(p50, p99)を表示する。
+#
+import json
+import statistics
+import sys
+import time
+
+import requests
+from websockets.sync.client import connect
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+HOST = sys.argv[2] if len(sys.argv) > 2 else "localhost:8000"
+
+CMD = {"method": "qsize"}
+
+
+def report(name: str, lat: list[float], total_sec: float):
+    """結果を表示する"""
+    lat = sorted(lat)
+    p99 = lat[int(len(lat) * 0.99) - 1]
+    print(
+        f"{name:14s}: {len(lat) / total_sec:8.0f} cmds/sec, "
+        f"p50 {statistics.median(lat) * 1000:6.2f} ms, "
+        f"p99 {p99 * 1000:6.2f} ms"
+    )
+
+
+def bench(name: str, send_one):
+    """send_one()を N 回呼ぶ"""
+    send_one()  # warm up
+    lat = []
+    t_start = time.perf_counter()
+    for _ in range(N):
+        t0 = time.perf_counter()
+        send_one()
+        lat.append(time.perf_counter() - t0)
+    report(name, lat, time.perf_counter() - t_start)
+
+
+url = f"http://{HOST}/cmd"
+print(f"* N = {N}, HOST = {HOST}\n")
+
+# コマンドごとに、新しい接続
+bench("HTTP", lambda: requests.post(url, json=CMD, timeout=5).json())
+
+# keep-alive (同じ接続を使い回す)
+with requests.Session() as session:
+    bench(
+        "HTTP(Session)",
+        lambda: session.post(url, json=CMD, timeout=5).json(),
+    )
+
+# 1つの WebSocket 接続で、続けて送る
+with connect(f"ws://{HOST}/ws?events=0") as ws:
+
+    def ws_send_one():
+        ws.send(json.dumps(CMD))
+        return json.loads(ws.recv())
+
+    bench("WebSocket", ws_send_one)
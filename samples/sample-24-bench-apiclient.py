@@ -0,0 +1,68 @@
+#
+# ApiClient の送り方による速さを比べる
+#
+# $ pi0servo api-server --uds /tmp/pi0servo.sock 17 18 &
+# $ uv run samples/sample-24-bench-apiclient.py [N] [URL] [UDS]
+#
+# サーボを動かさないコマンド(qsize)を N 個送り、
+# 1秒あたりのコマンド数を表示する。
+#
+import asyncio
+import sys
+import time
+
+from pi0servo import ApiClient, AsyncApiClient
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+URL = sys.argv[2] if len(sys.argv) > 2 else ApiClient.DEF_URL
+UDS = sys.argv[3] if len(sys.argv) > 3 else None  # Unixドメインソケット
+
+CMD = {"method": "qsize", "group": "default"}
+
+
+def report(name: str, total_sec: float):
+    """結果を表示する"""
+    print(f"{name:24s}: {N / total_sec:8.0f} cmds/sec")
+
+
+def bench_post(name: str, client: ApiClient):
+    """1つずつ送って、返り値を待つ"""
+    t_start = time.perf_counter()
+    for _ in range(N):
+        client.post(CMD)
+    report(name, time.perf_counter() - t_start)
+
+
+def bench_submit(name: str, client: ApiClient):
+    """submit()でためて、まとめて送る"""
+    t_start = time.perf_counter()
+    futs = [client.submit(CMD) for _ in range(N)]
+    client.flush()
+    for fut in futs:
+        fut.result()
+    report(name, time.perf_counter() - t_start)
+
+
+async def bench_async(name: str, max_inflight: int):
+    """同時に max_inflight 個まで送る"""
+    async with AsyncApiClient(URL, max_inflight=max_inflight) as client:
+        t_start = time.perf_counter()
+        await asyncio.gather(*[client.post(CMD) for _ in range(N)])
+        report(name, time.perf_counter() - t_start)
+
+
+print(f"* N = {N}, URL = {URL}\n")
+
+bench_post("post", ApiClient(URL))
+
+with ApiClient(URL, keep_alive=True) as client:
+    bench_post("post(keep_alive)", client)
+
+if UDS:
+    with ApiClient(URL, uds=UDS) as client:
+        bench_post("post(uds)", client)
+
+with ApiClient(URL, keep_alive=True, batch_max=50) as client:
+    bench_submit("submit(batch_max=50)", client)
+
+asyncio.run(bench_async("AsyncApiClient(8)", 8))
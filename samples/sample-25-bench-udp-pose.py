@@ -0,0 +1,52 @@
+#
+# UDPの姿勢フレーム(UdpPoseServer)の速さと遅れを、ループバックで測る
+#
+# $ uv run samples/sample-25-bench-udp-pose.py [N] [RATE]
+#
+# 同じプロセスで UdpPoseServer を動かし、N 個のフレームを
+# 1秒あたり RATE 個(0: できるだけ速く)送る。
+# サーボは動かさず、受け取ったコマンドの時刻を記録するだけ。
+#
+import statistics
+import sys
+import time
+
+from pi0servo import UdpPoseSender, UdpPoseServer
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+RATE = float(sys.argv[2]) if len(sys.argv) > 2 else 1000.0
+
+recv_time: dict[int, float] = {}
+
+
+def on_cmd(cmd: dict) -> dict:
+    """フレームの番号は、最初の角度(0.1度単位)"""
+    recv_time[round(cmd["params"]["angles"][0] * 10)] = time.perf_counter()
+    return {"result": None}
+
+
+server = UdpPoseServer(on_cmd, {"default": 2}, "127.0.0.1", 0)
+server.start()
+
+send_time = []
+with UdpPoseSender(*server.address) as sender:
+    t_start = time.perf_counter()
+    for i in range(N):
+        if RATE > 0:
+            while time.perf_counter() < t_start + i / RATE:
+                pass
+        send_time.append(time.perf_counter())
+        sender.send([(i % 3000) / 10, 0])
+    total_sec = time.perf_counter() - t_start
+
+time.sleep(0.5)
+server.end()
+
+lat = sorted(recv_time[i] - send_time[i] for i in recv_time if i < N)
+print(f"* N = {N}, RATE = {RATE}")
+print(f"sent      : {N / total_sec:8.0f} frames/sec")
+print(f"stats     : {server.stats}")
+print(
+    f"latency   : p50 {statistics.median(lat) * 1000:6.3f} ms, "
+    f"p99 {lat[int(len(lat) * 0.99) - 1] * 1000:6.3f} ms"
+)
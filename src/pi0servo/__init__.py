@@ -10,8 +10,10 @@ else:
 
 from .core.calibrable_servo import CalibrableServo
 from .core.multi_servo import MultiServo
+from .core.multi_track import MultiTrackScheduler
 from .core.piservo import PiServo
 from .helper.commonlib import CommonLib
+from .helper.group_router import GroupRouter
 from .helper.jsonrpc_worker import JsonRpcWorker
 from .helper.str_cmd_to_json import StrCmdToJson
 from .helper.thread_worker import ThreadWorker
@@ -22,7 +24,8 @@ from .utils.mylogger import errmsg, get_logger
 from .utils.onekeycli import OneKeyCli
 from .utils.scriptrunner import ScriptRunner
 from .utils.servo_config_manager import ServoConfigManager
-from .web.api_client import ApiClient
+from .web.api_client import ApiClient, AsyncApiClient
+from .web.udp_pose import UdpPoseSender, UdpPoseServer
 
 __all__ = [
     "__version__",
@@ -30,16 +33,21 @@ __all__ = [
     "errmsg",
     "get_logger",
     "ApiClient",
+    "AsyncApiClient",
     "CalibrableServo",
     "CliBase",
     "CliWithHistory",
     "CommonLib",
+    "GroupRouter",
     "ScriptRunner",
     "MultiServo",
+    "MultiTrackScheduler",
     "OneKeyCli",
     "PiServo",
     "ServoConfigManager",
     "StrCmdToJson",
     "ThreadWorker",
+    "UdpPoseSender",
+    "UdpPoseServer",
     "JsonRpcWorker",
 ]
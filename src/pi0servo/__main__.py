@@ -17,7 +17,9 @@ from .command.cmd_strcli import CmdStrCli
 from .command.cmd_strclient import CmdStrClient
 from .command.cmd_strjsonrpccli import CmdStrJsonRpcCli
 from .core.calibrable_servo import CalibrableServo
+from .helper.cmd_queue import CmdQueue
 from .helper.commonlib import CommonLib
+from .helper.group_router import GroupRouter
 from .utils.clickutils import click_common_opts
 from .utils.mylogger import errmsg, get_logger
 
@@ -260,22 +262,148 @@ def str_cli(ctx, pins_str, history_file, script_file, debug):
     show_default=True,
     help="port number",
 )
+@click.option(
+    "--coalesce",
+    is_flag=True,
+    default=False,
+    help="latest-wins: drop queued absolute moves superseded by newer ones",
+)
+@click.option(
+    "--queue-max",
+    type=int,
+    default=0,
+    show_default=True,
+    help="max queued commands (0: unlimited)",
+)
+@click.option(
+    "--queue-policy",
+    type=click.Choice(CmdQueue.POLICIES),
+    default=CmdQueue.DEF_POLICY,
+    show_default=True,
+    help="policy when the queue is full",
+)
+@click.option(
+    "--lookahead",
+    type=int,
+    default=0,
+    show_default=True,
+    help="blend up to N following queued moves into one path (0: off)",
+)
+@click.option(
+    "--use-script",
+    is_flag=True,
+    default=False,
+    help="play synchronous moves as pigpio scripts in the daemon",
+)
+@click.option(
+    "--trust-daemon",
+    is_flag=True,
+    default=False,
+    help="read current pulses from pigpiod instead of the last command",
+)
+@click.option(
+    "--group",
+    "-g",
+    "groups",
+    type=str,
+    multiple=True,
+    help="servo group with its own queue: NAME=PIN,PIN,... (repeatable)",
+)
+@click.option(
+    "--separate-pi",
+    is_flag=True,
+    default=False,
+    help="one pigpio connection per group",
+)
+@click.option(
+    "--isolate",
+    is_flag=True,
+    default=False,
+    help="run servo workers in a separate process (shared memory)",
+)
+@click.option(
+    "--udp-port",
+    type=int,
+    default=None,
+    help="also accept binary pose frames on this UDP port (latest-wins)",
+)
+@click.option(
+    "--uds",
+    type=str,
+    default=None,
+    help="also listen on this Unix domain socket (disables auto-reload)",
+)
+@click.option(
+    "--production",
+    is_flag=True,
+    default=False,
+    help="no auto-reload, fastest loop/HTTP parser, no access log",
+)
 @click_common_opts(__version__)
-def api_server(ctx, pins, server_host, port, debug):
+def api_server(
+    ctx,
+    pins,
+    server_host,
+    port,
+    coalesce,
+    queue_max,
+    queue_policy,
+    lookahead,
+    use_script,
+    trust_daemon,
+    groups,
+    separate_pi,
+    isolate,
+    udp_port,
+    uds,
+    production,
+    debug,
+):
     """API (JSON) Server ."""
     cmd_name = ctx.command.name
     __log = get_logger(__name__, debug)
     __log.debug("cmd_name=%s", cmd_name)
     __log.debug("pins=%s", pins)
     __log.debug("server_host=%s, port=%s", server_host, port)
+    __log.debug("coalesce=%s", coalesce)
+    __log.debug("queue_max=%s, queue_policy=%s", queue_max, queue_policy)
+    __log.debug("lookahead=%s, use_script=%s", lookahead, use_script)
+    __log.debug("trust_daemon=%s", trust_daemon)
+    __log.debug("groups=%s, separate_pi=%s", groups, separate_pi)
+    __log.debug("isolate=%s", isolate)
+    __log.debug("udp_port=%s", udp_port)
+    __log.debug("uds=%s", uds)
+    __log.debug("production=%s", production)
+
+    try:
+        _groups = GroupRouter.parse_groups(list(groups))
+    except ValueError as _e:
+        raise click.BadParameter(str(_e), param_hint="--group") from _e
 
-    if not pins:
+    if not pins and not _groups:
         print_pins_error(ctx)
         return
 
     app = None
     try:
-        app = CmdApiServer(pins, server_host, port, debug=debug)
+        app = CmdApiServer(
+            pins,
+            server_host,
+            port,
+            coalesce=coalesce,
+            queue_maxsize=queue_max,
+            queue_policy=queue_policy,
+            lookahead=lookahead,
+            use_script=use_script,
+            trust_daemon=trust_daemon,
+            groups=_groups,
+            separate_pi=separate_pi,
+            isolate=isolate,
+            udp_port=udp_port,
+            uds=uds,
+            production=production,
+            debug=debug,
+        )
         app.main()
 
     finally:
@@ -300,8 +428,14 @@ def api_server(ctx, pins, server_host, port, debug):
     help="History file",
 )
 @click.option("--script-file", "-f", type=str, default="", help="script file")
+@click.option(
+    "--uds",
+    type=str,
+    default=None,
+    help="connect through this Unix domain socket (api-server --uds)",
+)
 @click_common_opts(__version__)
-def api_client(ctx, url, history_file, script_file, debug):
+def api_client(ctx, url, history_file, script_file, uds, debug):
     """String API Client."""
     cmd_name = ctx.command.name
     __log = get_logger(__name__, debug)
@@ -312,11 +446,12 @@ def api_client(ctx, url, history_file, script_file, debug):
         history_file,
         script_file,
     )
+    __log.debug("uds=%s", uds)
 
     app = None
     try:
         app = CmdApiClient(
-            cmd_name + "> ", url, history_file, script_file, debug
+            cmd_name + "> ", url, history_file, script_file, uds, debug
         )
         app.main()
     except Exception as _e:
@@ -340,8 +475,14 @@ def api_client(ctx, url, history_file, script_file, debug):
     help="History file",
 )
 @click.option("--script-file", "-f", type=str, default="", help="script file")
+@click.option(
+    "--uds",
+    type=str,
+    default=None,
+    help="connect through this Unix domain socket (api-server --uds)",
+)
 @click_common_opts(__version__)
-def str_client(ctx, url, history_file, script_file, debug):
+def str_client(ctx, url, history_file, script_file, uds, debug):
     """String Command API Client."""
     cmd_name = ctx.command.name
     __log = get_logger(__name__, debug)
@@ -352,6 +493,7 @@ def str_client(ctx, url, history_file, script_file, debug):
         history_file,
         script_file,
     )
+    __log.debug("uds=%s", uds)
 
     app = None
     try:
@@ -360,6 +502,7 @@ def str_client(ctx, url, history_file, script_file, debug):
             url,
             history_file,
             script_file,
+            uds=uds,
             debug=debug,
         )
         app.main()
@@ -12,24 +12,29 @@ class CmdApiClient(CliWithHistory):
     """CmdApiClient."""
 
     def __init__(
-        self, cmd_name, url, history_file, script_file, debug=False
+        self, cmd_name, url, history_file, script_file, uds=None, debug=False
     ) -> None:
         """Constractor."""
         super().__init__(cmd_name, history_file, debug=debug)
         self.__debug = debug
         self.__log = get_logger(self.__class__.__name__, self.__debug)
         self.__log.debug("cmd_name=%s, url=%s", cmd_name, url)
+        self.__log.debug("uds=%s", uds)
 
         self.url = url
 
         try:
-            self.api_client = ApiClient(self.url, debug=self.__debug)
+            self.api_client = ApiClient(
+                self.url, keep_alive=True, uds=uds, debug=self.__debug
+            )
         except Exception as _e:
             self.__log.error(errmsg(_e))
 
     def end(self):
         """end"""
         self.__log.debug("")
+        if hasattr(self, "api_client"):
+            self.api_client.close()
         super().end()
         print("\n* Bye\n")
 
@@ -3,11 +3,15 @@
 #
 """cmd_apiserver.py"""
 
+import importlib.util
 import os
+import socket
+import stat
 
 import uvicorn
 
 from pi0servo import get_logger
+from pi0servo.helper.cmd_queue import CmdQueue
 
 
 class CmdApiServer:
@@ -15,19 +19,76 @@ class CmdApiServer:
 
     ENV_PINS = "PI0SERVO_PINS"
     ENV_DEBUG = "PI0SERVO_DEBUG"
+    ENV_COALESCE = "PI0SERVO_COALESCE"
+    ENV_QUEUE_MAX = "PI0SERVO_QUEUE_MAX"
+    ENV_QUEUE_POLICY = "PI0SERVO_QUEUE_POLICY"
+    ENV_LOOKAHEAD = "PI0SERVO_LOOKAHEAD"
+    ENV_USE_SCRIPT = "PI0SERVO_USE_SCRIPT"
+    ENV_TRUST_DAEMON = "PI0SERVO_TRUST_DAEMON"
+    ENV_GROUPS = "PI0SERVO_GROUPS"
+    ENV_SEPARATE_PI = "PI0SERVO_SEPARATE_PI"
+    ENV_ISOLATE = "PI0SERVO_ISOLATE"
+    ENV_UDP_PORT = "PI0SERVO_UDP_PORT"
+    ENV_UDP_HOST = "PI0SERVO_UDP_HOST"
 
     MODULE_API = "pi0servo.web.json_api:app"
 
-    def __init__(self, pins, hostname, port, debug=False):
-        """Constractor."""
+    def __init__(
+        self,
+        pins,
+        hostname,
+        port,
+        coalesce=False,
+        queue_maxsize=0,
+        queue_policy=CmdQueue.DEF_POLICY,
+        lookahead=0,
+        use_script=False,
+        trust_daemon=False,
+        groups: dict[str, list[int]] | None = None,
+        separate_pi=False,
+        isolate=False,
+        udp_port: int | None = None,
+        uds: str | None = None,
+        production=False,
+        debug=False,
+    ):
+        """Constractor.
+
+        `production=True`: 自動リロードをせずに、同じプロセスで動かす。
+        イベントループとHTTPパーサーは、使える中で速いもの
+        (uvloop, httptools)を選び、アクセスログは出さない。
+        """
         self.__debug = debug
         self.__log = get_logger(__class__.__name__, self.__debug)
         self.__log.debug("pin=%s", pins)
         self.__log.debug("hostname=%s, port=%s", hostname, port)
+        self.__log.debug("coalesce=%s", coalesce)
+        self.__log.debug(
+            "queue_maxsize=%s, queue_policy=%s", queue_maxsize, queue_policy
+        )
+        self.__log.debug("lookahead=%s, use_script=%s", lookahead, use_script)
+        self.__log.debug("trust_daemon=%s", trust_daemon)
+        self.__log.debug("groups=%s, separate_pi=%s", groups, separate_pi)
+        self.__log.debug("isolate=%s", isolate)
+        self.__log.debug("udp_port=%s", udp_port)
+        self.__log.debug("uds=%s", uds)
+        self.__log.debug("production=%s", production)
 
         self.pins = pins
         self.hostname = hostname
         self.port = port
+        self.coalesce = coalesce
+        self.queue_maxsize = queue_maxsize
+        self.queue_policy = queue_policy
+        self.lookahead = lookahead
+        self.use_script = use_script
+        self.trust_daemon = trust_daemon
+        self.groups = groups or {}
+        self.separate_pi = separate_pi
+        self.isolate = isolate
+        self.udp_port = udp_port
+        self.uds = uds
+        self.production = production
 
     def main(self):
         """main."""
@@ -35,14 +96,96 @@ class CmdApiServer:
 
         os.environ[self.ENV_PINS] = ",".join([str(p) for p in self.pins])
         os.environ[self.ENV_DEBUG] = "1" if self.__debug else "0"
-
-        uvicorn.run(
-            self.MODULE_API,
-            host=self.hostname,
-            port=self.port,
-            reload=True,
-            log_level="debug" if self.__debug else "warning",
+        os.environ[self.ENV_COALESCE] = "1" if self.coalesce else "0"
+        os.environ[self.ENV_QUEUE_MAX] = str(self.queue_maxsize)
+        os.environ[self.ENV_QUEUE_POLICY] = self.queue_policy
+        os.environ[self.ENV_LOOKAHEAD] = str(self.lookahead)
+        os.environ[self.ENV_USE_SCRIPT] = "1" if self.use_script else "0"
+        os.environ[self.ENV_TRUST_DAEMON] = "1" if self.trust_daemon else "0"
+        os.environ[self.ENV_GROUPS] = ";".join(
+            f"{_name}=" + ",".join(str(_p) for _p in _pins)
+            for _name, _pins in self.groups.items()
+        )
+        os.environ[self.ENV_SEPARATE_PI] = "1" if self.separate_pi else "0"
+        os.environ[self.ENV_ISOLATE] = "1" if self.isolate else "0"
+        os.environ[self.ENV_UDP_PORT] = (
+            "" if self.udp_port is None else str(self.udp_port)
         )
+        os.environ[self.ENV_UDP_HOST] = self.hostname
+
+        _log_level = "debug" if self.__debug else "warning"
+
+        if not self.production and not self.uds:
+            # 開発用: ソースを変更すると、リロードする
+            uvicorn.run(
+                self.MODULE_API,
+                host=self.hostname,
+                port=self.port,
+                reload=True,
+                log_level=_log_level,
+            )
+            return
+
+        # 同じプロセスで、1つのアプリ(JsonApi)を、
+        # TCP (と Unixドメインソケット) で動かす
+        _tcp = socket.create_server((self.hostname, self.port))
+        # 受け付けた接続に継承される (keep-alive で、遅延ACKを待たない)
+        _tcp.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        _sockets = [_tcp]
+        try:
+            if self.uds:
+                _sockets.append(self.bind_uds(self.uds))
+
+            _config = uvicorn.Config(
+                self.MODULE_API, log_level=_log_level, **self.server_options()
+            )
+            uvicorn.Server(_config).run(sockets=_sockets)
+        finally:
+            for _sock in _sockets:
+                _sock.close()
+            if self.uds and os.path.exists(self.uds):
+                os.unlink(self.uds)
+
+    def server_options(self) -> dict:
+        """`uvicorn.Config`のオプション。
+
+        production: 使える中で速いイベントループとHTTPパーサー、
+        アクセスログなし。
+        """
+        if not self.production:
+            return {}
+
+        _options = {
+            "loop": "uvloop" if self._has_module("uvloop") else "asyncio",
+            "http": "httptools" if self._has_module("httptools") else "h11",
+            "access_log": False,
+        }
+        self.__log.debug("options=%s", _options)
+        return _options
+
+    @staticmethod
+    def _has_module(name: str) -> bool:
+        return importlib.util.find_spec(name) is not None
+
+    @staticmethod
+    def bind_uds(path: str) -> socket.socket:
+        """Unixドメインソケットを作る。
+
+        前に残ったソケットファイルは消す。
+        同じグループのユーザーも、接続できる(0o660)。
+
+        Raises:
+            FileExistsError: ソケット以外のファイルがある。
+        """
+        if os.path.exists(path):
+            if not stat.S_ISSOCK(os.stat(path).st_mode):
+                raise FileExistsError(f"not a socket: {path}")
+            os.unlink(path)
+
+        _sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        _sock.bind(path)
+        os.chmod(path, 0o660)
+        return _sock
 
     def end(self):
         """end"""
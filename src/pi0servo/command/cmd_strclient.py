@@ -17,10 +17,11 @@ class CmdStrClient(CmdApiClient):
         url,
         history_file,
         script_file,
+        uds=None,
         debug=False,
     ):
         super().__init__(
-            cmd_name, url, history_file, script_file, debug=debug
+            cmd_name, url, history_file, script_file, uds=uds, debug=debug
         )
         self.__debug = debug
         self.__log = get_logger(self.__class__.__name__, self.__debug)
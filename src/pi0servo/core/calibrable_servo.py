@@ -28,7 +28,14 @@ class CalibrableServo(PiServo):
     POS_MIN = "min"
     POS_MAX = "max"
 
-    def __init__(self, pi, pin, conf_file=DEF_CONF_FILE, debug=False):
+    def __init__(
+        self,
+        pi,
+        pin,
+        conf_file=DEF_CONF_FILE,
+        debug=False,
+        trust_daemon=False,
+    ):
         """CalibrableServoオブジェクトを初期化する。
 
         親クラスを初期化した後、ServoConfigManagerを使って設定を読み込む。
@@ -40,8 +47,10 @@ class CalibrableServo(PiServo):
                        負の場合回転方向が逆になる。
             cenf_file (str, optional): キャリブレーション設定ファイル。
             debug (bool, optional): デバッグログを有効にするフラグ。
+            trust_daemon (bool, optional):
+                `True`の場合、パルス幅を毎回pigpiodから読み出す。
         """
-        super().__init__(pi, abs(pin), debug)
+        super().__init__(pi, abs(pin), debug, trust_daemon=trust_daemon)
 
         self._debug = debug
         self.__log = get_logger(self.__class__.__name__, self._debug)
@@ -155,10 +164,19 @@ class CalibrableServo(PiServo):
         if pulse is None:
             return
 
+        pulse = self.clip_pulse(pulse, forced)
+
+        super().move_pulse(pulse)
+
+    def clip_pulse(self, pulse: int, forced=False) -> int:
+        """パルス幅を、キャリブレーション範囲に制限する。
+
+        `forced`が`True`の場合は、PiServoの範囲(MIN..MAX)に制限する。
+        """
         if not forced:
             pulse = max(min(pulse, self.pulse_max), self.pulse_min)
 
-        super().move_pulse(pulse)
+        return super().clip_pulse(pulse)
 
     def deg2pulse(self, deg: float) -> int:
         """Degree to Pulse."""
@@ -202,17 +220,20 @@ class CalibrableServo(PiServo):
         self.__log.debug("pulse=%s, angle=%s", pulse, angle)
         return angle
 
-    def move_angle(self, deg: float | str | None = None):
-        """Move angle.
+    def angle2pulse(self, deg: float | str | None = None) -> int | None:
+        """Angle to pulse.
+
+        `move_angle()`と同じ規則で、角度をパルス幅に変換する。
 
         Args:
             deg (float | str | None):
                 文字列: 'center' | 'min' | 'max'
-                None | '': 動かさない (現在角度を維持)
-        """
-        self.__log.debug("pin=%s, deg=%s", self.pin, deg)
+                None | '': 現在角度
 
-        if deg is None:  # None の場合は、動かさない
+        Returns:
+            int | None: パルス幅。不正な文字列の場合は`None`。
+        """
+        if deg is None:  # None の場合は、現在角度
             deg = self.get_angle()
 
         elif isinstance(deg, str):
@@ -225,13 +246,26 @@ class CalibrableServo(PiServo):
             elif deg == "":
                 deg = self.get_angle()
             else:
-                self.__log.error('deg="%s": invalid string. do nothing', deg)
-                return
+                self.__log.error('deg="%s": invalid string', deg)
+                return None
 
         deg = max(min(deg, self.ANGLE_MAX), self.ANGLE_MIN)
-        self.__log.debug("deg=%s", deg)
 
-        pulse = self.deg2pulse(float(deg))
+        return self.deg2pulse(float(deg))
+
+    def move_angle(self, deg: float | str | None = None):
+        """Move angle.
+
+        Args:
+            deg (float | str | None):
+                文字列: 'center' | 'min' | 'max'
+                None | '': 動かさない (現在角度を維持)
+        """
+        self.__log.debug("pin=%s, deg=%s", self.pin, deg)
+
+        pulse = self.angle2pulse(deg)
+        if pulse is None:  # 不正な文字列: 動かさない
+            return
 
         self.move_pulse(pulse)
 
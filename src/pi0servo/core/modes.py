@@ -0,0 +1,25 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""modes.py
+
+コマンドのパラメータで使うモード名。
+
+numpy, pigpioなどを使わないので、コマンドの解析(`StrCmdToJson`)から、
+`MultiServo`などを読み込まずに使える。
+"""
+
+# `MultiServo.estop()`のモード
+ESTOP_HOLD = "hold"  # その位置に留める
+ESTOP_OFF = "off"  # すべてのサーボをオフにする
+ESTOP_MODES = (ESTOP_HOLD, ESTOP_OFF)
+
+# `step_n`コマンド: 自動
+STEP_N_AUTO = "auto"
+
+# `MotionProfile`の名前
+PROFILE_LINEAR = "linear"
+PROFILE_EASE = "ease"
+PROFILE_TRAPEZOID = "trapezoid"
+PROFILE_MINJERK = "minjerk"
+PROFILES = (PROFILE_LINEAR, PROFILE_EASE, PROFILE_TRAPEZOID, PROFILE_MINJERK)
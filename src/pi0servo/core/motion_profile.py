@@ -0,0 +1,87 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""motion_profile.py"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from . import modes
+
+
+class MotionProfile:
+    """Motion profiles for synchronized moves.
+
+    動作の進み具合(0.0 -> 1.0)の曲線。
+
+    * linear: 直線 (等速)
+    * ease: ease-in/out (余弦曲線)
+    * trapezoid: 台形速度 (加速・等速・減速)
+    * minjerk: 躍度最小 (5次多項式)
+
+    曲線は、(profile, step_n)ごとに一度だけ計算して、キャッシュしておく。
+    プロファイルを選んでも、各ステップの計算量は直線と変わらない。
+    """
+
+    LINEAR = modes.PROFILE_LINEAR
+    EASE = modes.PROFILE_EASE
+    TRAPEZOID = modes.PROFILE_TRAPEZOID
+    MINJERK = modes.PROFILE_MINJERK
+
+    PROFILES = modes.PROFILES
+    DEF_PROFILE = LINEAR
+
+    # 台形速度の加速(減速)区間の割合
+    TRAPEZOID_ACCEL = 0.25
+
+    CACHE_SIZE = 64
+
+    @classmethod
+    def is_valid(cls, profile: str | None) -> bool:
+        """Check profile name (None is default)."""
+        return profile is None or profile in cls.PROFILES
+
+    @staticmethod
+    @lru_cache(maxsize=CACHE_SIZE)
+    def table(profile: str, step_n: int) -> np.ndarray:
+        """Lookup table.
+
+        Args:
+            profile (str): プロファイル名。
+            step_n (int): ステップ数 (1以上)。
+
+        Returns:
+            np.ndarray: shape=(step_n,) の進み具合。
+                最終要素は、必ず 1.0。
+                (キャッシュを共有するので、書き換え不可)
+
+        Raises:
+            ValueError: 不明なプロファイル名。
+        """
+        _s = np.arange(1, step_n + 1, dtype=float) / step_n
+
+        if profile == MotionProfile.LINEAR:
+            _table = _s
+        elif profile == MotionProfile.EASE:
+            _table = (1 - np.cos(np.pi * _s)) / 2
+        elif profile == MotionProfile.TRAPEZOID:
+            _a = MotionProfile.TRAPEZOID_ACCEL
+            _v = 1 / (1 - _a)  # 等速区間の速度
+            _table = np.where(
+                _s < _a,
+                _v / _a / 2 * _s**2,
+                np.where(
+                    _s <= 1 - _a,
+                    _v * (_s - _a / 2),
+                    1 - _v / _a / 2 * (1 - _s) ** 2,
+                ),
+            )
+        elif profile == MotionProfile.MINJERK:
+            _table = 10 * _s**3 - 15 * _s**4 + 6 * _s**5
+        else:
+            raise ValueError(f"unknown profile: {profile!r}")
+
+        _table[-1] = 1.0
+        _table.setflags(write=False)
+        return _table
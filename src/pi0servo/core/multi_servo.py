@@ -3,10 +3,16 @@
 #
 """multi_servo.py"""
 
+import threading
 import time
 
 from ..utils.mylogger import get_logger
+from . import modes
 from .calibrable_servo import CalibrableServo
+from .motion_profile import MotionProfile
+from .script_player import ScriptPlayer
+from .step_scheduler import StepScheduler
+from .trajectory import TrajectoryPlanner
 
 
 class MultiServo:
@@ -15,7 +21,14 @@ class MultiServo:
     """
 
     DEF_MOVE_SEC = 0.2  # sec
-    DEF_STEP_N = 40
+    DEF_STEP_N = 40  # 明示的に指定する場合の例 (デフォルトは自動)
+    DEF_PWM_FRAME_SEC = 0.02  # sec (サーボのPWM周期: 50Hz)
+    DEF_MIN_PULSE_STEP = 0  # us (0: 使わない)
+
+    # `estop()`のモード
+    ESTOP_HOLD = modes.ESTOP_HOLD  # その位置に留める
+    ESTOP_OFF = modes.ESTOP_OFF  # すべてのサーボをオフにする
+    ESTOP_MODES = modes.ESTOP_MODES
 
     def __init__(
         self,
@@ -23,6 +36,11 @@ class MultiServo:
         pins: list[int],
         first_move=True,
         conf_file=CalibrableServo.DEF_CONF_FILE,
+        use_script=False,
+        trust_daemon=False,
+        dirty_check=True,
+        pwm_frame_sec: float = DEF_PWM_FRAME_SEC,
+        min_pulse_step: int = DEF_MIN_PULSE_STEP,
         debug=False,
     ):
         """
@@ -38,15 +56,47 @@ class MultiServo:
 
             conf_file (str): キャリブレーション設定ファイルのパス。
 
+            use_script (bool):
+                `True`の場合、`move_all_angles_sync()`の軌道を
+                pigpioのスクリプトとしてデーモン側で再生する。
+                再生できない場合は、Pythonのループにフォールバックする。
+
+            trust_daemon (bool):
+                `True`の場合、現在のパルス幅・角度を毎回pigpiodから読み出す。
+                `False`の場合は、最後に指令した値(シャドウ)を使う。
+
+            dirty_check (bool):
+                `True`の場合、`move_all_angles()`, `move_all_pulses()`で、
+                最後に指令した値と同じパルス幅は送信しない。
+                (`trust_daemon`が`True`の場合は、常に送信する)
+
+            pwm_frame_sec (float):
+                サーボのPWMフレーム周期(秒)。
+                `step_n`が指定されない場合、ステップ数は
+                「動作時間 / PWMフレーム周期」になる。
+
+            min_pulse_step (int):
+                1ステップの最小の有効なパルス変化量(us)。
+                0より大きい場合、ステップ数を
+                「最大のパルス変化量 / min_pulse_step」以下にする。
+
             debug (bool): デバッグフラグ
         """
         self._debug = debug
         self.__log = get_logger(self.__class__.__name__, self._debug)
         self.__log.debug(
-            "pins=%s, first_move=%s, conf_file=%s",
+            "pins=%s,first_move=%s,conf_file=%s,use_script=%s,trust_daemon=%s",
             pins,
             first_move,
             conf_file,
+            use_script,
+            trust_daemon,
+        )
+        self.__log.debug(
+            "dirty_check=%s,pwm_frame_sec=%s,min_pulse_step=%s",
+            dirty_check,
+            pwm_frame_sec,
+            min_pulse_step,
         )
 
         self._pi = pi
@@ -56,13 +106,52 @@ class MultiServo:
         self.servo_n = len(pins)
 
         self.servo = [
-            CalibrableServo(self._pi, _pin, conf_file=conf_file, debug=False)
+            CalibrableServo(
+                self._pi,
+                _pin,
+                conf_file=conf_file,
+                debug=False,
+                trust_daemon=trust_daemon,
+            )
             for _pin in self.pins
         ]
 
         self.conf_file = self.servo[0].conf_file
         self.__log.debug("conf_file=%s", self.conf_file)
 
+        self._planner = TrajectoryPlanner(self.servo, debug=self._debug)
+
+        self._scheduler = StepScheduler(debug=self._debug)
+
+        # 実行中の`move_all_angles_sync()`を、ステップの間で中断するための
+        # イベント (`cancel_move()`, `clear_cancel()`)
+        self.cancel_event = threading.Event()
+        # 中断の世代。`cancel_move()`, `estop()`のたびに増える。
+        # コマンドをキューに入れたときの世代と比べて、
+        # その後に中断されたコマンドを見分ける(`clear_cancel()`)。
+        self.cancel_gen = 0
+        self._cancel_lock = threading.Lock()
+
+        # 1ステップ分の書き込みと、`estop()`を排他する
+        self._write_lock = threading.RLock()
+
+        # 直前の`move_all_angles_sync()`の統計 (StepScheduler.run()参照)
+        # 移動ごとにリセットする (時間をかけて動かさなければ、空のまま)
+        self.last_move_stats: dict = {}
+
+        self.use_script = use_script
+        self._script_player = ScriptPlayer(self._pi, debug=self._debug)
+
+        self.trust_daemon = trust_daemon
+        self.dirty_check = dirty_check
+
+        self.pwm_frame_sec = pwm_frame_sec
+        self.min_pulse_step = min_pulse_step
+
+        # 送信したパルス数と、同じ値のため送信しなかったパルス数
+        self.pulse_write_n = 0
+        self.pulse_skip_n = 0
+
         if self.first_move:
             self.move_all_angles([0] * self.servo_n)
 
@@ -212,6 +301,116 @@ class MultiServo:
         for s in self.servo:
             s.off()
 
+    def cancel_move(self) -> int:
+        """実行中の同期移動を中断する。
+
+        別スレッドから呼び出す。
+        移動は、次のステップの前(最大でも1ステップの時間)で止まり、
+        サーボは、その時点の位置に留まる。
+        `clear_cancel()`を呼ぶまで、パルス幅は送信されない。
+
+        Returns
+        -------
+        int
+            新しい中断の世代(`cancel_gen`)。
+        """
+        self.__log.debug("")
+        with self._cancel_lock:
+            self.cancel_gen += 1
+            self.cancel_event.set()
+            return self.cancel_gen
+
+    def estop(self, mode: str = ESTOP_HOLD, t0: float | None = None) -> dict:
+        """Emergency stop.
+
+        実行中の移動(スクリプト再生を含む)を止めて、
+        "hold": その位置に留める。
+        "off": すべてのサーボをオフにする。
+
+        どのスレッドからでも呼び出せる。
+        書き込み中のステップが終わるのを待つだけなので、
+        遅れは、最大でも1ステップ分の書き込み時間(+ オフの書き込み)。
+
+        `clear_cancel()`を呼ぶまで、パルス幅は送信されない。
+
+        Parameters
+        ----------
+        mode: str
+            "hold" or "off"
+        t0: float | None
+            遅れを計る基準の時刻(`time.monotonic()`)。
+            None: この関数を呼んだ時刻。
+
+        Returns
+        -------
+        dict
+            {"mode": mode, "latency_sec": 停止までの時間(秒)}
+        """
+        if t0 is None:
+            t0 = time.monotonic()
+        if mode not in self.ESTOP_MODES:
+            raise ValueError(f"invalid mode: {mode!r}")
+
+        self.cancel_move()
+        self._script_player.stop()
+
+        # 書き込み中のステップが終わるのを待って、以降の書き込みを止める
+        with self._write_lock:
+            if mode == self.ESTOP_OFF:
+                for _s in self.servo:
+                    _s.off()
+            _latency_sec = time.monotonic() - t0
+
+        self.__log.warning("mode=%s, latency_sec=%.6f", mode, _latency_sec)
+        return {"mode": mode, "latency_sec": _latency_sec}
+
+    def clear_cancel(self, gen: int | None = None) -> bool:
+        """中断状態を解除する。
+
+        Parameters
+        ----------
+        gen: int | None
+            コマンドをキューに入れたときの`cancel_gen`。
+            その後に中断された(世代が古い)場合は、解除しない。
+            None: 世代によらず解除する。
+
+        Returns
+        -------
+        bool
+            `False`: 世代が古いので、解除しなかった
+            (そのコマンドは、実行せずに破棄する)。
+        """
+        with self._cancel_lock:
+            if gen is not None and gen != self.cancel_gen:
+                self.__log.debug("gen=%s < %s", gen, self.cancel_gen)
+                return False
+            self.cancel_event.clear()
+            return True
+
+    def wait_cancel(self, sec: float) -> bool:
+        """中断可能なsleep。
+
+        `cancel_move()`が呼ばれると、すぐに戻る。
+
+        Returns
+        -------
+        bool
+            中断された場合は`True`
+        """
+        return self.cancel_event.wait(sec)
+
+    def resync(self) -> list[int]:
+        """すべてのサーボのパルス幅を、pigpiodから読み出して同期する。
+
+        Returns
+        -------
+        list[int]
+            各サーボのパルス幅のリスト。
+        """
+        pulses = [s.resync() for s in self.servo]
+        self.__log.debug("pulses=%s", pulses)
+        return pulses
+
     def get_pulse(self, sv_idx: int) -> int:
         """Get pulse of servo[sv_idx]."""
         _pulse = self.servo[sv_idx].get_pulse()
@@ -245,8 +444,10 @@ class MultiServo:
         forced: bool
             `True`の場合、可動範囲外のパルス幅も強制的に設定する。
         """
-        for i in range(len(self.servo)):
-            self.move_pulse(i, pulses[i], forced)
+        # 1ステップ分(全サーボ)をまとめて書き込む
+        with self._write_lock:
+            for _i, _s in enumerate(self.servo):
+                self._write_pulse(_s, pulses[_i], forced)
 
     def move_pulse_relative(self, sv_idx: int, pulse_diff: int, forced=False):
         """Relative move one servo[sv_idx]."""
@@ -305,13 +506,64 @@ class MultiServo:
 
         for _i, _s in enumerate(self.servo):
             # self.__log.debug("pin=%s, angle=%s", _s.pin, target_angles[_i])
-            _s.move_angle(target_angles[_i])
+            self._write_pulse(_s, _s.angle2pulse(target_angles[_i]))
+
+    def _write_pulse(
+        self, servo: CalibrableServo, pulse: int | None, forced=False
+    ) -> bool:
+        """Dirty check して、パルス幅が変化した場合だけ送信する。
+
+        中断中(`cancel_move()`, `estop()`)は、送信しない。
+
+        Returns
+        -------
+        bool
+            `True`: 送信した, `False`: 送信しなかった
+        """
+        if pulse is None:
+            return False
+
+        with self._write_lock:
+            if self.cancel_event.is_set():
+                return False
+            return self._write_pulse_nolock(servo, pulse, forced)
+
+    def _write_pulse_nolock(
+        self, servo: CalibrableServo, pulse: int, forced=False
+    ) -> bool:
+        """`_write_pulse()`の本体."""
+
+        if (
+            self.dirty_check
+            and not self.trust_daemon
+            and servo.clip_pulse(pulse, forced) == servo.last_pulse
+        ):
+            self.pulse_skip_n += 1
+            return False
+
+        servo.move_pulse(pulse, forced)
+        self.pulse_write_n += 1
+        return True
+
+    @property
+    def write_stats(self) -> dict:
+        """パルス幅の送信数と、同じ値のため送信しなかった数。"""
+        return {
+            "written": self.pulse_write_n,
+            "skipped": self.pulse_skip_n,
+        }
+
+    def reset_write_stats(self):
+        """`write_stats`をリセットする。"""
+        self.pulse_write_n = 0
+        self.pulse_skip_n = 0
 
     def move_all_angles_sync(
         self,
         target_angles: list[float],
         move_sec: float = DEF_MOVE_SEC,
-        step_n: int = DEF_STEP_N,
+        step_n: int | None = None,
+        profile: str | None = None,
     ):
         """
         すべてのサーボを目標角度まで同期的かつ滑らかに動かす。
@@ -324,33 +576,192 @@ class MultiServo:
             None: 現在の角度(つまり、動かさない)
             文字列: "center", "min", "max"
         move_sec: float
-            動作にかかるおおよその時間（秒）。
-        step_n: int
+            動作にかかる時間（秒）。
+            各ステップは期限に合わせて送信され、遅れたステップは飛ばされる。
+            統計は`last_move_stats`に残る
+            (スクリプトで再生した場合は、"script"が`True`で、
+            step_n, planned_sec, elapsed_sec, cancelledだけ)。
+        step_n: int | None
             動作を分割するステップ数。
+            None: PWMフレーム周期などから、自動的に決める
             1以下の場合は、move_angle() を呼び出して、ダイレクトに動かす
+        profile: str | None
+            モーションプロファイル: "linear", "ease", "trapezoid", "minjerk"
+            None: "linear"
         """
         self.__log.debug(
-            "target_angles=%s, move_sec=%s, step_n=%s",
+            "target_angles=%s, move_sec=%s, step_n=%s, profile=%s",
             target_angles,
             move_sec,
             step_n,
+            profile,
         )
+        self.last_move_stats = {}
 
         if not self._validate_angle_list(target_angles):
             return
 
+        if not MotionProfile.is_valid(profile):
+            self.__log.error("invalid profile: %s", profile)
+            return
+        if profile is None:
+            profile = MotionProfile.DEF_PROFILE
+
+        if self.cancel_event.is_set():
+            self.__log.debug("cancelled")
+            return
+
         # step_n が１以下の場合は、ダイレクトに動かす
-        if step_n <= 1:
+        if step_n is not None and step_n <= 1:
             self.move_all_angles(target_angles)
             return
 
-        _step_sec = move_sec / step_n
-        self.__log.debug("_step_sec=%.3f", _step_sec)
-
         _start_angles = self.get_all_angles()
         self.__log.debug("_start_angles=%s", _start_angles)
 
         # target_anglesを数値(角度)に変換
+        _num_target_angles = self._resolve_target_angles(
+            target_angles, _start_angles
+        )
+        self.__log.debug("_num_target_angles=%s", _num_target_angles)
+
+        if step_n is None:
+            step_n = self._planner.adaptive_step_n(
+                _start_angles,
+                _num_target_angles,
+                move_sec,
+                self.pwm_frame_sec,
+                self.min_pulse_step,
+            )
+
+        _step_sec = move_sec / step_n
+        self.__log.debug("step_n=%s, _step_sec=%.3f", step_n, _step_sec)
+
+        # 全ステップのパルス幅を、まとめて計算しておく
+        _pulse_rows = self._planner.plan(
+            _start_angles, _num_target_angles, step_n, profile
+        ).tolist()
+
+        self._run_rows(_pulse_rows, _step_sec)
+
+    def move_all_angles_sync_path(
+        self,
+        waypoints: list[list[float]],
+        move_secs: list[float],
+        step_n: int | None = None,
+        profile: str | None = None,
+    ):
+        """複数の目標角度を、途中で止まらずに、続けて通過する。
+
+        `move_all_angles_sync()`を続けて呼び出すと、
+        目標角度ごとに止まる(減速・加速する)が、
+        これは、一つの連続した軌道として動かす。
+        (`TrajectoryPlanner.plan_path()`参照)
+
+        Parameters
+        ----------
+        waypoints: list[list[float]]
+            目標角度のリスト(`move_all_angles_sync()`の`target_angles`)。
+            None, 文字列は、一つ前の目標角度を基準に解釈する。
+        move_secs: list[float]
+            各目標角度までの動作時間（秒）。
+        step_n: int | None
+            全体のステップ数。
+            None: PWMフレーム周期などから、自動的に決める
+        profile: str | None
+            全体にかけるモーションプロファイル (None: "linear")
+        """
+        self.__log.debug(
+            "waypoints=%s, move_secs=%s, step_n=%s, profile=%s",
+            waypoints,
+            move_secs,
+            step_n,
+            profile,
+        )
+        self.last_move_stats = {}
+
+        if not waypoints or len(waypoints) != len(move_secs):
+            self.__log.error(
+                "len(waypoints)=%s != len(move_secs)=%s",
+                len(waypoints),
+                len(move_secs),
+            )
+            return
+        for _angles in waypoints:
+            if not self._validate_angle_list(_angles):
+                return
+
+        if not MotionProfile.is_valid(profile):
+            self.__log.error("invalid profile: %s", profile)
+            return
+        if profile is None:
+            profile = MotionProfile.DEF_PROFILE
+
+        if self.cancel_event.is_set():
+            self.__log.debug("cancelled")
+            return
+
+        _start_angles = self.get_all_angles()
+
+        # 経由点を数値(角度)に変換 (一つ前の経由点が基準)
+        _points = [_start_angles]
+        for _angles in waypoints:
+            _points.append(self._resolve_target_angles(_angles, _points[-1]))
+        self.__log.debug("_points=%s", _points)
+
+        _move_sec = sum(move_secs)
+        if step_n is None:
+            step_n = self._planner.path_step_n(
+                _points, _move_sec, self.pwm_frame_sec, self.min_pulse_step
+            )
+        step_n = max(step_n, 1)
+
+        _step_sec = _move_sec / step_n
+        self.__log.debug("step_n=%s, _step_sec=%.3f", step_n, _step_sec)
+
+        _pulse_rows = self._planner.plan_path(
+            _start_angles, _points[1:], move_secs, step_n, profile
+        ).tolist()
+
+        self._run_rows(_pulse_rows, _step_sec)
+
+    def _run_rows(self, pulse_rows: list[list[int]], step_sec: float):
+        """計算済みの軌道を再生する。"""
+        # デーモン側でスクリプトとして再生できれば、それで終わり
+        # (ステップごとの送信・遅れは分からないので、時間だけを残す)
+        _t0 = time.monotonic()
+        if self.use_script and self._play_script(pulse_rows, step_sec):
+            self.last_move_stats = {
+                "step_n": len(pulse_rows),
+                "planned_sec": step_sec * len(pulse_rows),
+                "elapsed_sec": time.monotonic() - _t0,
+                "cancelled": self.cancel_event.is_set(),
+                "script": True,
+            }
+            return
+
+        # 計算済みのパルス幅を、期限に合わせて1行ずつ送信する
+        self.last_move_stats = self._scheduler.run(
+            pulse_rows, step_sec, self.move_all_pulses, self.cancel_event
+        )
+
+    def _resolve_target_angles(
+        self, target_angles, start_angles: list[float]
+    ) -> list[float]:
+        """目標角度のリストを、数値(角度)のリストに変換する。
+
+        Parameters
+        ----------
+        target_angles: list[float | str | None]
+            None: 現在の角度(つまり、動かさない)
+            文字列: "center", "min", "max"
+        start_angles: list[float]
+            現在の角度のリスト。
+
+        Returns
+        -------
+        list[float]
+        """
         _num_target_angles = []
         for i, _angle in enumerate(target_angles):
             if i >= self.servo_n:
@@ -368,42 +779,61 @@ class MultiServo:
                     _num_target_angles.append(_servo.ANGLE_MAX)
                 else:  # 不明な文字: 動かさない
                     self.__log.warning("invalid word %a: ignored", _angle)
-                    _num_target_angles.append(_start_angles[i])
+                    _num_target_angles.append(start_angles[i])
 
             elif _angle is None:  # None は、「動かさない」の意味
-                _num_target_angles.append(_start_angles[i])
+                _num_target_angles.append(start_angles[i])
 
             else:  # num
                 # clip: ANGLE_MIN <= _angle <= ANGLE_MAX
                 _angle = max(min(_angle, _servo.ANGLE_MAX), _servo.ANGLE_MIN)
                 _num_target_angles.append(_angle)
 
-        self.__log.debug("_num_target_angles=%s", _num_target_angles)
+        return _num_target_angles
 
-        _angle_diffs = [
-            _num_target_angles[i] - _start_angles[i]
-            for i in range(self.servo_n)
-        ]
-        self.__log.debug("_angle_diffs=%s", _angle_diffs)
+    def _play_script(
+        self, pulse_rows: list[list[int]], step_sec: float
+    ) -> bool:
+        """軌道をpigpioのスクリプトとして再生する。
 
-        for _step_i in range(1, step_n + 1):
-            next_angles = [
-                _start_angles[i] + _angle_diffs[i] * _step_i / step_n
-                for i in range(self.servo_n)
-            ]
+        Returns
+        -------
+        bool
+            `False`の場合は、Pythonのループで動かす必要がある。
 
-            self.move_all_angles(next_angles)
-            # self.__log.debug(
-            #     "step %s/%s: next_angles=%s, _step_sec=%s",
-            #     _step_i, step_n, next_angles, _step_sec
-            # )
-            time.sleep(_step_sec)
+        Raises
+        ------
+        RuntimeError
+            再生を始めた後に失敗した (`ScriptPlayer.play()`)。
+        """
+        _pins = [_s.pin for _s in self.servo]
+        try:
+            _ret = self._script_player.play(
+                _pins, pulse_rows, step_sec, self.cancel_event
+            )
+        except RuntimeError:
+            # 途中まで動いたかもしれないので、位置はデーモンから読み直し、
+            # Pythonのループでは動かさない
+            self.resync()
+            raise
+        self.__log.debug("script: %s", "done" if _ret else "fallback")
+
+        if _ret and self.cancel_event.is_set():
+            # 途中で止めたので、位置はデーモンから読み直す
+            self.resync()
+        elif _ret and pulse_rows:
+            # デーモン側で動かしたので、シャドウを更新
+            for _s, _pulse in zip(self.servo, pulse_rows[-1], strict=True):
+                _s.last_pulse = _pulse
+
+        return _ret
 
     def move_all_angles_sync_relative(
         self,
         angle_diffs: list[float],
         move_sec: float = DEF_MOVE_SEC,
-        step_n: int = DEF_STEP_N,
+        step_n: int | None = None,
+        profile: str | None = None,
     ):
         """Relative Move.
 
@@ -414,9 +844,12 @@ class MultiServo:
             None: 現在の角度(つまり、動かさない)
         move_sec: float
             動作にかかるおおよその時間（秒）。
-        step_n: int
+        step_n: int | None
             動作を分割するステップ数。
+            None: PWMフレーム周期などから、自動的に決める
             1以下の場合は、move_angle() を呼び出して、ダイレクトに動かす
+        profile: str | None
+            モーションプロファイル (`move_all_angles_sync()`参照)
         """
         self.__log.debug("angle_diffs=%s", angle_diffs)
 
@@ -430,4 +863,4 @@ class MultiServo:
                 _new_angles[i] += angle_diffs[i]
         self.__log.debug("new_angles=%s", _new_angles)
 
-        self.move_all_angles_sync(_new_angles, move_sec, step_n)
+        self.move_all_angles_sync(_new_angles, move_sec, step_n, profile)
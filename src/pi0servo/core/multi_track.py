@@ -0,0 +1,395 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""multi_track.py"""
+
+import math
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from ..utils.mylogger import get_logger
+from .motion_profile import MotionProfile
+from .multi_servo import MultiServo
+from .trajectory import TrajectoryPlanner
+
+
+class TrackSegment:
+    """トラックの一区間 (目標角度まで、`move_sec`秒で動く)."""
+
+    def __init__(
+        self,
+        target_angles: list[float],
+        move_sec: float,
+        profile: str,
+        tick_sec: float,
+        gen: int = 0,
+    ):
+        """Constructor.
+
+        Args:
+            target_angles (list): トラックのサーボの目標角度。
+                None, 文字列は、区間の開始時に解釈する。
+            move_sec (float): 動作時間(秒)。
+            profile (str): モーションプロファイル。
+            tick_sec (float): tick の周期(秒)。
+            gen (int): 追加したときの中断の世代(`MultiServo.cancel_gen`)。
+        """
+        self.target_angles = target_angles
+        self.move_sec = move_sec
+        self.profile = profile
+        self.gen = gen
+
+        self.step_n = max(math.ceil(move_sec / tick_sec - 1e-9), 1)
+        self.tick_sec = tick_sec
+
+        # `begin()`で決まる
+        self.t_start = 0.0
+        self.start: np.ndarray = np.zeros(0)
+        self.target: np.ndarray = np.zeros(0)
+
+    def begin(self, t_start: float, start: list[float], target: list[float]):
+        """区間の開始時刻と、開始・目標角度(数値)を決める。"""
+        self.t_start = t_start
+        self.start = np.asarray(start, dtype=float)
+        self.target = np.asarray(target, dtype=float)
+
+    @property
+    def t_end(self) -> float:
+        """区間の終了時刻 (次の区間の開始時刻)."""
+        return self.t_start + self.step_n * self.tick_sec
+
+    def step_i(self, now: float) -> int:
+        """`now`のステップ番号 (0 .. step_n - 1)."""
+        _i = int((now - self.t_start) / self.tick_sec + 1e-9)
+        return min(max(_i, 0), self.step_n - 1)
+
+    def angles(self, step_i: int) -> np.ndarray:
+        """ステップ`step_i`の角度."""
+        _ratio = MotionProfile.table(self.profile, self.step_n)[step_i]
+        return self.start + (self.target - self.start) * _ratio
+
+
+class MotionTrack:
+    """一つのサーボ(またはサーボのグループ)のタイムライン."""
+
+    def __init__(self, name: str, servo_idx: list[int]):
+        """Constructor."""
+        self.name = name
+        self.servo_idx = servo_idx
+
+        self.segments: deque[TrackSegment] = deque()
+        self.current: TrackSegment | None = None
+
+    @property
+    def busy(self) -> bool:
+        """実行中、または実行待ちの区間がある。"""
+        return self.current is not None or bool(self.segments)
+
+
+class MultiTrackScheduler(threading.Thread):
+    """Multi-track motion scheduler.
+
+    サーボ(またはサーボのグループ)ごとに、独立したタイムライン(トラック)を
+    持ち、それぞれが別々の`move_sec`で動く。
+    例えば、腕をゆっくり動かしながら、頭を素早く動かすことができる。
+
+    各トラックには、区間(目標角度, 動作時間)のキューがあり、
+    区間が終わると、次の区間が(止まらずに)その終了時刻から始まる。
+
+    1つの tick ループが、全トラックのその時点の角度をまとめて計算し、
+    `MultiServo.move_all_pulses()`で、1回の書き込みにまとめて送る。
+    (動いていないサーボには、書き込まない)
+
+    `MultiServo.cancel_move()`, `estop()`されると、
+    それまでに追加された、すべてのトラックの区間を破棄して止まる。
+    その後に`add()`した区間は、中断を解除して動かす。
+
+    使い方:
+        mtrack = MultiTrackScheduler(mservo, {"arm": [0, 1], "head": [2]})
+        mtrack.start()
+        mtrack.add("arm", [45, -45], 2.0)
+        mtrack.add("head", [30], 0.3)
+        mtrack.add("head", [-30], 0.3)
+        mtrack.wait()
+        mtrack.end()
+    """
+
+    def __init__(
+        self,
+        mservo: MultiServo,
+        tracks: dict[str, list[int]] | None = None,
+        tick_sec: float | None = None,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            mservo (MultiServo): サーボ。
+            tracks (dict[str, list[int]] | None): トラック名 -> サーボ番号。
+                None: サーボごとに一つ("0", "1", ...)。
+            tick_sec (float | None): tick の周期(秒)。
+                None: `mservo.pwm_frame_sec`。
+
+        Raises:
+            ValueError: 不正なサーボ番号、複数のトラックに属するサーボ。
+        """
+        super().__init__(daemon=True)
+
+        self.__debug = debug
+        self.__log = get_logger(self.__class__.__name__, self.__debug)
+        self.__log.debug("tracks=%s, tick_sec=%s", tracks, tick_sec)
+
+        self.mservo = mservo
+        self.tick_sec = tick_sec or mservo.pwm_frame_sec
+
+        if tracks is None:
+            tracks = {str(_i): [_i] for _i in range(mservo.servo_n)}
+
+        _used: set[int] = set()
+        for _name, _idx in tracks.items():
+            for _i in _idx:
+                if not 0 <= _i < mservo.servo_n:
+                    raise ValueError(f"{_name}: invalid servo index: {_i}")
+                if _i in _used:
+                    raise ValueError(f"{_name}: servo {_i} in two tracks")
+                _used.add(_i)
+
+        self.tracks = {
+            _name: MotionTrack(_name, list(_idx))
+            for _name, _idx in tracks.items()
+        }
+
+        self._planner = TrajectoryPlanner(mservo.servo, debug=self.__debug)
+
+        self._cond = threading.Condition()
+        self._active = False
+        self._gen = mservo.cancel_gen  # 最後に見た中断の世代
+
+        # 統計
+        self.tick_n = 0
+        self.dropped_tick_n = 0  # 遅れのため飛ばした tick の数
+
+    def end(self):
+        """終了する。"""
+        self.__log.debug("")
+        with self._cond:
+            self._active = False
+            self._cond.notify_all()
+        if self.is_alive():
+            self.join()
+
+    def add(
+        self,
+        track: str,
+        target_angles: list,
+        move_sec: float = MultiServo.DEF_MOVE_SEC,
+        profile: str | None = None,
+    ):
+        """区間をトラックに追加する。
+
+        Args:
+            track (str): トラック名。
+            target_angles (list): トラックのサーボの目標角度。
+                None: 動かさない, 文字列: "center", "min", "max"
+            move_sec (float): 動作時間(秒)。
+            profile (str | None): モーションプロファイル (None: "linear")。
+
+        Raises:
+            ValueError: 不明なトラック、角度の数が違う、不明なプロファイル。
+        """
+        self.__log.debug(
+            "track=%s, target_angles=%s, move_sec=%s, profile=%s",
+            track,
+            target_angles,
+            move_sec,
+            profile,
+        )
+        _track = self.tracks.get(track)
+        if _track is None:
+            raise ValueError(f"unknown track: {track!r}")
+        if len(target_angles) != len(_track.servo_idx):
+            raise ValueError(
+                f"{track}: len(target_angles)={len(target_angles)}"
+                f" != {len(_track.servo_idx)}"
+            )
+        if not MotionProfile.is_valid(profile):
+            raise ValueError(f"unknown profile: {profile!r}")
+
+        with self._cond:
+            _seg = TrackSegment(
+                target_angles,
+                move_sec,
+                profile or MotionProfile.DEF_PROFILE,
+                self.tick_sec,
+                self.mservo.cancel_gen,
+            )
+            _track.segments.append(_seg)
+            self._cond.notify_all()
+
+        # 中断の後に追加された区間は、動かす
+        # (その間に、また中断された場合は、解除しない)
+        self.mservo.clear_cancel(_seg.gen)
+
+    def clear(self, track: str | None = None):
+        """区間を破棄して、その位置で止める。
+
+        Args:
+            track (str | None): トラック名 (None: すべて)。
+        """
+        self.__log.debug("track=%s", track)
+        with self._cond:
+            for _track in self.tracks.values():
+                if track is None or _track.name == track:
+                    _track.segments.clear()
+                    _track.current = None
+            self._cond.notify_all()
+
+    @property
+    def busy(self) -> bool:
+        """動作中、または実行待ちの区間があるトラックがある。"""
+        with self._cond:
+            return self._busy()
+
+    def _busy(self) -> bool:
+        """Lock held."""
+        return any(_t.busy for _t in self.tracks.values())
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """すべてのトラックの区間が終わるまで待つ。
+
+        Returns:
+            bool: タイムアウトした場合は`False`。
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._busy(), timeout)
+
+    def tick(self, now: float | None = None) -> bool:
+        """1 tick 分の書き込みをする。
+
+        全トラックの`now`の時点の角度を計算して、まとめて書き込む。
+
+        Args:
+            now (float | None): 時刻(`time.monotonic()`)。
+                None: 現在の時刻。
+
+        Returns:
+            bool: まだ動作中のトラックがある。
+        """
+        if now is None:
+            now = time.monotonic()
+
+        with self._cond:
+            if self.mservo.cancel_gen != self._gen:
+                self._discard_cancelled()
+
+            _angles = np.zeros(self.mservo.servo_n)
+            _mask = np.zeros(self.mservo.servo_n, dtype=bool)
+            for _track in self.tracks.values():
+                _seg = self._update_track(_track, now)
+                if _seg is None:
+                    continue
+                _step_i = _seg.step_i(now)
+                _angles[_track.servo_idx] = _seg.angles(_step_i)
+                _mask[_track.servo_idx] = True
+
+                # 最後のステップを書いたら、次の区間がなければ終わり
+                if _step_i >= _seg.step_n - 1 and not _track.segments:
+                    _track.current = None
+
+            _busy = self._busy()
+
+        if _mask.any():
+            # 全トラックの角度を、まとめてパルス幅に変換して、1回で書き込む
+            _pulses = self._planner.angles2pulses(_angles).tolist()
+            self.mservo.move_all_pulses(
+                [
+                    _p if _m else None
+                    for _p, _m in zip(_pulses, _mask, strict=True)
+                ]
+            )
+        self.tick_n += 1
+
+        if not _busy:
+            # 最後の書き込みが終わってから、`wait()`に通知する
+            with self._cond:
+                self._cond.notify_all()
+        return _busy
+
+    def _discard_cancelled(self):
+        """中断される前に追加された区間を破棄する (Lock held)."""
+        self._gen = self.mservo.cancel_gen
+        for _track in self.tracks.values():
+            if _track.current is not None and _track.current.gen != self._gen:
+                _track.current = None
+            _segs = [_s for _s in _track.segments if _s.gen == self._gen]
+            if len(_segs) < len(_track.segments):
+                _track.segments = deque(_segs)
+        self._cond.notify_all()
+
+    def _update_track(
+        self, track: MotionTrack, now: float
+    ) -> TrackSegment | None:
+        """`now`の時点の区間 (Lock held).
+
+        終わった区間の次の区間は、前の区間の終了時刻から始める。
+        休んでいたトラックの区間は、`now`から始める。
+        """
+        _seg = track.current
+        while _seg is None or (_seg.t_end <= now and track.segments):
+            if not track.segments:
+                return None
+            _next = track.segments.popleft()
+            if _seg is None:
+                _t_start = now
+                _start = self.mservo.get_all_angles()
+                _start = [_start[_i] for _i in track.servo_idx]
+            else:
+                _t_start = _seg.t_end
+                _start = _seg.target.tolist()
+            _next.begin(_t_start, _start, self._resolve(track, _next, _start))
+            _seg = track.current = _next
+        return _seg
+
+    def _resolve(
+        self, track: MotionTrack, seg: TrackSegment, start: list[float]
+    ) -> list[float]:
+        """区間の目標角度を、数値(角度)にする。"""
+        _target: list = [None] * self.mservo.servo_n
+        _start = [0.0] * self.mservo.servo_n
+        for _j, _i in enumerate(track.servo_idx):
+            _target[_i] = seg.target_angles[_j]
+            _start[_i] = start[_j]
+        _resolved = self.mservo._resolve_target_angles(_target, _start)
+        return [_resolved[_i] for _i in track.servo_idx]
+
+    def run(self):
+        """tick ループ.
+
+        区間がある間は、`tick_sec`ごとの期限(monotonic clock)で`tick()`する。
+        遅れて期限が過ぎた tick は飛ばす。
+        """
+        self.__log.debug("start")
+        self._active = True
+
+        while self._active:
+            with self._cond:
+                self._cond.wait_for(lambda: self._busy() or not self._active)
+            if not self._active:
+                break
+
+            _t0 = time.monotonic()
+            _k = 0
+            while self._active and self.tick():
+                _k += 1
+                _wait_sec = _t0 + _k * self.tick_sec - time.monotonic()
+                if _wait_sec > 0:
+                    self.mservo.cancel_event.wait(_wait_sec)
+                else:
+                    _late = int(-_wait_sec / self.tick_sec)
+                    self.dropped_tick_n += _late
+                    _k += _late
+
+        self.__log.debug("done")
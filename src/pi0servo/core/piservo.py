@@ -17,7 +17,7 @@ class PiServo:
     MAX = 2500
     CENTER = 1500
 
-    def __init__(self, pi, pin, debug=False):
+    def __init__(self, pi, pin, debug=False, trust_daemon=False):
         """PiServoクラスのコンストラクタ。
 
         Args:
@@ -28,13 +28,22 @@ class PiServo:
             debug (bool, optional):
                 デバッグログを有効にするかどうかのフラグ。
                 Trueの場合、詳細なログが出力される。デフォルトはFalse。
+            trust_daemon (bool, optional):
+                `True`の場合、`get_pulse()`は、毎回pigpiodから読み出す。
+                (他のプロセスも同じピンを操作する場合など)
+                `False`(デフォルト)の場合は、最後に指令したパルス幅
+                (ローカルのシャドウ)を返すので、通信が発生しない。
         """
         self._debug = debug
         self.__log = get_logger(self.__class__.__name__, self._debug)
-        self.__log.debug("pin=%s", pin)
+        self.__log.debug("pin=%s, trust_daemon=%s", pin, trust_daemon)
 
         self._pi = pi
         self._pin = pin
+        self.trust_daemon = trust_daemon
+
+        # 最後に指令したパルス幅 (None: 未知 --> 最初の読み出しで同期)
+        self._pulse: int | None = None
 
     @property
     def pi(self):
@@ -44,16 +53,49 @@ class PiServo:
     def pin(self):
         return self._pin
 
+    @property
+    def last_pulse(self) -> int | None:
+        """最後に指令したパルス幅 (None: 未知)。通信は発生しない。"""
+        return self._pulse
+
+    @last_pulse.setter
+    def last_pulse(self, pulse: int | None):
+        """シャドウを更新する。
+
+        pigpioのスクリプトなど、`move_pulse()`以外の方法で
+        パルス幅を指令した場合に使う。
+        """
+        self._pulse = pulse
+
     def get_pulse(self):
         """Get pulse.
 
+        `trust_daemon`が`False`で、シャドウが有効な場合は、
+        pigpiodに問い合わせずに、最後に指令したパルス幅を返す。
+
+        Returns:
+            int: pulse width (micro sec)
+        """
+        if self.trust_daemon or self._pulse is None:
+            return self.resync()
+
+        return self._pulse
+
+    def resync(self):
+        """pigpiodからパルス幅を読み出して、シャドウを同期する。
+
         Returns:
             int: pulse width (micro sec)
         """
         pulse = self.pi.get_servo_pulsewidth(self.pin)
         self.__log.debug("pulse=%s", pulse)
+        self._pulse = pulse
         return pulse
 
+    def clip_pulse(self, pulse: int) -> int:
+        """パルス幅を、MINからMAXの範囲に制限する。"""
+        return max(min(pulse, self.MAX), self.MIN)
+
     def move_pulse(self, pulse):
         """サーボモーターを指定されたパルス幅に移動させる。
 
@@ -68,10 +110,11 @@ class PiServo:
         self.__log.debug("pin=%s, pulse=%s", self.pin, pulse)
 
         if pulse < self.MIN or pulse > self.MAX:
-            pulse = max(min(pulse, self.MAX), self.MIN)
+            pulse = self.clip_pulse(pulse)
             self.__log.debug("pulse=%s", pulse)
 
         self.pi.set_servo_pulsewidth(self.pin, pulse)
+        self._pulse = pulse
 
     def move_pulse_relative(self, pulse_diff):
         """Move relative.
@@ -122,3 +165,4 @@ class PiServo:
         """
         self.__log.debug("pin=%s", self.pin)
         self.pi.set_servo_pulsewidth(self.pin, self.OFF)
+        self._pulse = self.OFF
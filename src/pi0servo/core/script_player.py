@@ -0,0 +1,257 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""script_player.py"""
+
+import threading
+import time
+
+from ..utils.mylogger import errmsg, get_logger
+
+
+class ScriptPlayer:
+    """Play pulse trajectory as a pigpio stored script.
+
+    計画済みの軌道(ステップごとのパルス幅のリスト)を、
+    pigpioのスクリプトに変換し、pigpiodデーモン側で再生させる。
+
+    Pythonからは、1回の動作につき `run_script()` を1回送るだけになり、
+    ステップごとのソケット通信と`time.sleep()`のジッターがなくなる。
+
+    スクリプトが長すぎる場合や、バックエンドがスクリプトに
+    対応していない場合は、`play()`が`False`を返すので、
+    呼び出し側でPythonループにフォールバックすること。
+    再生を始めた後の失敗(終了しない、pigpiodとの通信エラーなど)は、
+    スクリプトを止めて`RuntimeError`にする(フォールバックはしない)。
+    """
+
+    # pigpioのスクリプトステータス (pigpio.PI_SCRIPT_*と同じ値)
+    SCRIPT_INITING = 0
+    SCRIPT_HALTED = 1
+    SCRIPT_RUNNING = 2
+    SCRIPT_WAITING = 3
+    SCRIPT_FAILED = 4
+
+    DEF_MAX_SCRIPT_LEN = 16384  # chars (pigpiodの拡張長より十分小さく)
+    DEF_CACHE_N = 8  # 保存しておくスクリプトの数 (pigpioの上限は32)
+    DEF_POLL_SEC = 0.005  # sec
+    MAX_MICS = 1_000_000  # `mics`で待てる最大の時間 (us)
+
+    def __init__(
+        self,
+        pi,
+        max_script_len: int = DEF_MAX_SCRIPT_LEN,
+        cache_n: int = DEF_CACHE_N,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            pi (pigpio.pi): pigpio.piのインスタンス。
+            max_script_len (int): これより長いスクリプトは再生しない。
+            cache_n (int): pigpiod上に保存しておくスクリプトの最大数(1以上)。
+            debug (bool): デバッグフラグ
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "max_script_len=%s, cache_n=%s", max_script_len, cache_n
+        )
+
+        self._pi = pi
+        self.max_script_len = max_script_len
+        self.cache_n = max(cache_n, 1)
+
+        # バックエンドがスクリプトに対応しているか
+        self.supported = hasattr(pi, "store_script") and hasattr(
+            pi, "run_script"
+        )
+
+        # スクリプト文字列 -> script_id (古い順)
+        self._script_cache: dict[str, int] = {}
+
+        # 再生中の script_id
+        self._running_sid: int | None = None
+
+    def compile(
+        self, pins: list[int], pulse_rows: list[list[int]], step_sec: float
+    ) -> str:
+        """Compile pulse trajectory to pigpio script.
+
+        前のステップから変化したパルスだけを`servo`コマンドにする。
+
+        Args:
+            pins (list[int]): GPIOピン番号のリスト(正の値)。
+            pulse_rows (list[list[int]]): ステップごとのパルス幅のリスト。
+            step_sec (float): 1ステップの時間(秒)。
+
+        Returns:
+            script (str): e.g. "servo 17 1510 servo 27 1490 mics 5000 ..."
+        """
+        _step_usec = max(int(round(step_sec * 1_000_000)), 0)
+
+        # `mics`は1秒まで。長い待ちは分ける
+        _delay_words: list[str] = []
+        while _step_usec > 0:
+            _usec = min(_step_usec, self.MAX_MICS)
+            _delay_words.append(f"mics {_usec}")
+            _step_usec -= _usec
+
+        _words: list[str] = []
+        _prev: list[int | None] = [None] * len(pins)
+        for _row in pulse_rows:
+            for _i, _pulse in enumerate(_row):
+                if _pulse is None or _pulse == _prev[_i]:
+                    continue
+                _words.append(f"servo {pins[_i]} {int(_pulse)}")
+                _prev[_i] = _pulse
+
+            _words.extend(_delay_words)
+
+        return " ".join(_words)
+
+    def play(
+        self,
+        pins: list[int],
+        pulse_rows: list[list[int]],
+        step_sec: float,
+        cancel_event: threading.Event | None = None,
+    ) -> bool:
+        """Play pulse trajectory on pigpio daemon.
+
+        `cancel_event`がセットされた場合は、スクリプトを停止する。
+        (この場合も`True`を返すので、呼び出し側で位置を確認すること)
+
+        Returns:
+            bool:
+                `True`: 再生完了(または中断)
+                `False`: 再生を始められなかった(要フォールバック)
+
+        Raises:
+            RuntimeError: 再生を始めた後に失敗した。
+                スクリプトは停止するが、サーボは途中の位置にあるので、
+                フォールバックせずに、位置を読み直すこと。
+        """
+        if not self.supported:
+            self.__log.debug("not supported")
+            return False
+
+        _script = self.compile(pins, pulse_rows, step_sec)
+        if not _script:
+            return True
+
+        if len(_script) > self.max_script_len:
+            self.__log.debug(
+                "too long: len=%s > %s", len(_script), self.max_script_len
+            )
+            return False
+
+        # `run_script()`を送る前の失敗は、フォールバックできる
+        try:
+            _sid = self._get_script_id(_script)
+            if _sid is None:
+                return False
+
+            self._running_sid = _sid
+            _ret = self._pi.run_script(_sid)
+        except Exception as _e:
+            self.__log.warning(errmsg(_e))
+            self._running_sid = None
+            return False
+
+        if _ret is not None and _ret < 0:
+            self.__log.warning("run_script(%s)=%s", _sid, _ret)
+            self._running_sid = None
+            return False
+
+        # `run_script()`の後は、スクリプトが動いているかもしれないので、
+        # フォールバックしない
+        try:
+            # 再生時間の間は待ち、その後、終了をポーリングする
+            _play_sec = step_sec * len(pulse_rows)
+            if cancel_event is None:
+                time.sleep(_play_sec)
+            elif cancel_event.wait(_play_sec):
+                self.__log.debug("cancelled: stop_script(%s)", _sid)
+                self._pi.stop_script(_sid)
+                self._wait_status(_sid, self.SCRIPT_HALTED)
+                return True
+
+            if self._wait_status(_sid, self.SCRIPT_HALTED):
+                return True
+            _err = f"script {_sid} did not finish"
+
+        except Exception as _e:
+            _err = errmsg(_e)
+
+        finally:
+            self._running_sid = None
+
+        self.__log.error("%s: stop_script(%s)", _err, _sid)
+        self._stop_script(_sid)
+        raise RuntimeError(_err)
+
+    def stop(self):
+        """Stop running script (どのスレッドからでも呼べる)."""
+        _sid = self._running_sid
+        if _sid is None:
+            return
+        self._stop_script(_sid)
+
+    def _stop_script(self, sid: int):
+        """Stop script (errors are logged)."""
+        try:
+            self._pi.stop_script(sid)
+        except Exception as _e:
+            self.__log.warning(errmsg(_e))
+
+    def clear(self):
+        """Delete all stored scripts."""
+        for _script, _sid in list(self._script_cache.items()):
+            try:
+                self._pi.delete_script(_sid)
+            except Exception as _e:
+                self.__log.warning(errmsg(_e))
+            del self._script_cache[_script]
+
+    def _get_script_id(self, script: str) -> int | None:
+        """Get script id (store script if not cached)."""
+        _sid = self._script_cache.pop(script, None)
+        if _sid is not None:
+            # 最近使ったものとして、末尾に入れ直す
+            self._script_cache[script] = _sid
+            return _sid
+
+        # キャッシュがいっぱいなら、一番古いものを削除
+        while self._script_cache and len(self._script_cache) >= self.cache_n:
+            _old_script = next(iter(self._script_cache))
+            _old_sid = self._script_cache.pop(_old_script)
+            self._pi.delete_script(_old_sid)
+
+        _sid = self._pi.store_script(script.encode())
+        self.__log.debug("store_script(len=%s)=%s", len(script), _sid)
+        if _sid is None or _sid < 0:
+            return None
+
+        # 初期化(コンパイル)が終わるまで待つ
+        if not self._wait_status(_sid, self.SCRIPT_HALTED):
+            self._pi.delete_script(_sid)
+            return None
+
+        self._script_cache[script] = _sid
+        return _sid
+
+    def _wait_status(self, sid: int, status: int, timeout=1.0) -> bool:
+        """Wait until script status becomes `status`."""
+        _t_end = time.monotonic() + timeout
+        while True:
+            _status, _ = self._pi.script_status(sid)
+            if _status == status:
+                return True
+            if _status == self.SCRIPT_FAILED or _status < 0:
+                self.__log.warning("script_status(%s)=%s", sid, _status)
+                return False
+            if time.monotonic() > _t_end:
+                self.__log.warning("timeout: script_status=%s", _status)
+                return False
+            time.sleep(self.DEF_POLL_SEC)
@@ -0,0 +1,113 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""step_scheduler.py"""
+
+import threading
+import time
+from collections.abc import Callable
+
+from ..utils.mylogger import get_logger
+
+
+class StepScheduler:
+    """Deadline based step scheduler.
+
+    各ステップを、動作開始時刻からの絶対的な期限(monotonic clock)で実行する。
+
+    書き込みにかかった時間は、次の期限までの待ち時間で吸収されるので、
+    サーボ数が増えても、動作時間が`step_sec * ステップ数`から伸びない。
+
+    書き込みが遅れて、次のステップの期限も過ぎてしまった場合は、
+    期限切れのステップを飛ばして(まとめて)、最新のステップを送る。
+    最後のステップ(目標位置)は、必ず送る。
+
+    `cancel_event`がセットされると、次のステップを送らずに中断する。
+    ステップ間の待ちは`cancel_event.wait()`で行うので、
+    中断までの遅れは、最大でも1ステップの時間になる。
+    """
+
+    def __init__(self, debug=False):
+        """Constructor."""
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug("")
+
+    def run(
+        self,
+        rows: list,
+        step_sec: float,
+        write_func: Callable,
+        cancel_event: threading.Event | None = None,
+    ) -> dict:
+        """Run steps.
+
+        Args:
+            rows (list): ステップごとのデータ。
+            step_sec (float): 1ステップの時間(秒)。
+            write_func (Callable): `write_func(rows[i])`で書き込む関数。
+            cancel_event (threading.Event | None): 中断用のイベント。
+
+        Returns:
+            stats (dict): 動作ごとの統計
+                step_n: ステップ数
+                sent: 書き込んだステップ数
+                dropped: 遅れのため飛ばしたステップ数
+                max_overrun_sec: 期限からの最大の遅れ(秒)
+                mean_overrun_sec: 期限からの平均の遅れ(秒)
+                planned_sec: 予定の動作時間(秒)
+                elapsed_sec: 実際の動作時間(秒)
+                cancelled: 中断した場合は`True`
+        """
+        _step_n = len(rows)
+        _sent = 0
+        _dropped = 0
+        _overrun_max = 0.0
+        _overrun_sum = 0.0
+        _cancelled = False
+
+        _t0 = time.monotonic()
+        _i = 0
+        while _i < _step_n:
+            if cancel_event is not None and cancel_event.is_set():
+                _cancelled = True
+                break
+
+            _now = time.monotonic()
+
+            # 遅れて期限が過ぎたステップは飛ばす (最後のステップは必ず送る)
+            _due_i = int((_now - _t0) / step_sec) if step_sec > 0 else _i
+            _due_i = min(_due_i, _step_n - 1)
+            if _due_i > _i:
+                _dropped += _due_i - _i
+                _i = _due_i
+
+            _overrun = max(_now - (_t0 + _i * step_sec), 0.0)
+            _overrun_max = max(_overrun_max, _overrun)
+            _overrun_sum += _overrun
+
+            write_func(rows[_i])
+            _sent += 1
+            _i += 1
+
+            # 次の期限まで待つ
+            _wait_sec = _t0 + _i * step_sec - time.monotonic()
+            if _wait_sec > 0:
+                if cancel_event is None:
+                    time.sleep(_wait_sec)
+                elif cancel_event.wait(_wait_sec):
+                    _cancelled = _i < _step_n
+                    break
+
+        _stats = {
+            "step_n": _step_n,
+            "sent": _sent,
+            "dropped": _dropped,
+            "max_overrun_sec": _overrun_max,
+            "mean_overrun_sec": _overrun_sum / _sent if _sent else 0.0,
+            "planned_sec": step_sec * _step_n,
+            "elapsed_sec": time.monotonic() - _t0,
+            "cancelled": _cancelled,
+        }
+        self.__log.debug("stats=%s", _stats)
+        return _stats
@@ -0,0 +1,230 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""trajectory.py"""
+
+import math
+
+import numpy as np
+
+from ..utils.mylogger import get_logger
+from .calibrable_servo import CalibrableServo
+from .motion_profile import MotionProfile
+
+
+class TrajectoryPlanner:
+    """Vectorized trajectory planner for multiple servos.
+
+    全サーボ x 全ステップのパルス幅の行列を、NumPyの配列演算で一度に計算する。
+    各サーボのキャリブレーション(center を境にした2区間の直線)を使う。
+
+    実行側は、計算済みの行列を1行ずつ送信するだけでよいので、
+    サーボ数やステップ数が増えても、1ステップあたりのCPU時間は増えない。
+    """
+
+    def __init__(self, servos: list[CalibrableServo], debug=False):
+        """Constructor.
+
+        Args:
+            servos (list[CalibrableServo]): サーボのリスト。
+            debug (bool): デバッグフラグ
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug("servo_n=%s", len(servos))
+
+        self.servos = servos
+
+    def _calib_arrays(self):
+        """キャリブレーション値の配列を取得する。
+
+        キャリブレーションは実行中に変更されることがあるので、
+        計画のたびに読み出す(サーボ数に比例する処理で、ステップ数には依存しない)。
+
+        Returns:
+            (pulse_min, pulse_center, pulse_max, angle_factor)
+        """
+        _pmin = np.array([s.pulse_min for s in self.servos], dtype=float)
+        _pcenter = np.array(
+            [s.pulse_center for s in self.servos], dtype=float
+        )
+        _pmax = np.array([s.pulse_max for s in self.servos], dtype=float)
+        _factor = np.array([s.angle_factor for s in self.servos], dtype=float)
+        return _pmin, _pcenter, _pmax, _factor
+
+    def angles2pulses(self, angles) -> np.ndarray:
+        """Angles to pulses.
+
+        `CalibrableServo.deg2pulse()`の配列版。
+
+        Args:
+            angles (array_like): 最後の次元がサーボ数の角度の配列。
+
+        Returns:
+            np.ndarray: `angles`と同じ形の、パルス幅(int)の配列。
+        """
+        _pmin, _pcenter, _pmax, _factor = self._calib_arrays()
+
+        _deg = np.asarray(angles, dtype=float) * _factor
+        _d = np.where(
+            _deg >= CalibrableServo.ANGLE_CENTER,
+            _pmax - _pcenter,
+            _pcenter - _pmin,
+        )
+        _pulses = _d / CalibrableServo.ANGLE_MAX * _deg + _pcenter
+
+        # round()と同じく、偶数丸め
+        return np.rint(_pulses).astype(int)
+
+    def plan(
+        self,
+        start_angles: list[float],
+        target_angles: list[float],
+        step_n: int,
+        profile: str = MotionProfile.DEF_PROFILE,
+    ) -> np.ndarray:
+        """Plan trajectory.
+
+        Args:
+            start_angles (list[float]): 各サーボの開始角度。
+            target_angles (list[float]): 各サーボの目標角度(数値)。
+            step_n (int): ステップ数。
+            profile (str): モーションプロファイル (`MotionProfile`参照)。
+
+        Returns:
+            np.ndarray: shape=(step_n, servo_n) のパルス幅の行列。
+                1行目が最初のステップ、最終行が目標角度。
+        """
+        _start = np.asarray(start_angles, dtype=float)
+        _diffs = np.asarray(target_angles, dtype=float) - _start
+
+        _ratio = MotionProfile.table(profile, step_n)[:, np.newaxis]
+        _angles = _start + _diffs * _ratio
+        _angles = np.clip(
+            _angles, CalibrableServo.ANGLE_MIN, CalibrableServo.ANGLE_MAX
+        )
+
+        _pulse_matrix = self.angles2pulses(_angles)
+        self.__log.debug("pulse_matrix.shape=%s", _pulse_matrix.shape)
+        return _pulse_matrix
+
+    def plan_path(
+        self,
+        start_angles: list[float],
+        waypoints: list[list[float]],
+        move_secs: list[float],
+        step_n: int,
+        profile: str = MotionProfile.DEF_PROFILE,
+    ) -> np.ndarray:
+        """Plan one continuous trajectory through waypoints.
+
+        複数の目標角度(経由点)を、止まらずに通過する軌道を計画する。
+        経由点の間は直線で結び(区間ごとの時間は`move_secs`)、
+        時間軸全体に`profile`をかける。
+        加速・減速は、最初と最後だけで、途中の経由点では止まらない。
+
+        Args:
+            start_angles (list[float]): 各サーボの開始角度。
+            waypoints (list[list[float]]): 経由点(数値)のリスト。
+                最後の要素が、最終的な目標角度。
+            move_secs (list[float]): 各区間の時間(秒)。
+            step_n (int): 全体のステップ数。
+            profile (str): モーションプロファイル (`MotionProfile`参照)。
+
+        Returns:
+            np.ndarray: shape=(step_n, servo_n) のパルス幅の行列。
+                最終行が、最後の経由点。
+        """
+        _points = np.vstack(
+            [np.asarray(start_angles, dtype=float)]
+            + [np.asarray(_w, dtype=float) for _w in waypoints]
+        )
+        # 経由点を通過する時刻 (区間の時間は、正の値にする)
+        _knots = np.concatenate(
+            [[0.0], np.cumsum(np.maximum(np.asarray(move_secs), 1e-6))]
+        )
+
+        _t = MotionProfile.table(profile, step_n) * _knots[-1]
+        _angles = np.column_stack(
+            [
+                np.interp(_t, _knots, _points[:, _i])
+                for _i in range(_points.shape[1])
+            ]
+        )
+        _angles = np.clip(
+            _angles, CalibrableServo.ANGLE_MIN, CalibrableServo.ANGLE_MAX
+        )
+
+        _pulse_matrix = self.angles2pulses(_angles)
+        self.__log.debug("pulse_matrix.shape=%s", _pulse_matrix.shape)
+        return _pulse_matrix
+
+    def adaptive_step_n(
+        self,
+        start_angles: list[float],
+        target_angles: list[float],
+        move_sec: float,
+        frame_sec: float,
+        min_pulse_step: int = 0,
+    ) -> int:
+        """Choose step count.
+
+        サーボは、PWMの1フレーム(約20ms)に1回しかパルスを読まないので、
+        それより細かいステップは無駄になる。
+
+        ステップ数 = 動作時間 / PWMフレーム周期
+        `min_pulse_step`が指定されている場合は、さらに、
+        ステップ数 <= 最大のパルス変化量 / `min_pulse_step`
+        に制限する(小さな動きは、少ない書き込みで済ませる)。
+
+        Args:
+            start_angles (list[float]): 各サーボの開始角度。
+            target_angles (list[float]): 各サーボの目標角度(数値)。
+            move_sec (float): 動作時間(秒)。
+            frame_sec (float): PWMフレーム周期(秒)。
+            min_pulse_step (int): 1ステップの最小の有効なパルス変化量(us)。
+                0以下の場合は、使わない。
+
+        Returns:
+            int: ステップ数 (1以上)
+        """
+        return self.path_step_n(
+            [start_angles, target_angles], move_sec, frame_sec, min_pulse_step
+        )
+
+    def path_step_n(
+        self,
+        points: list[list[float]],
+        move_sec: float,
+        frame_sec: float,
+        min_pulse_step: int = 0,
+    ) -> int:
+        """Choose step count for a path (`adaptive_step_n()`参照).
+
+        Args:
+            points (list[list[float]]): 開始角度と経由点(数値)のリスト。
+            move_sec (float): 全体の動作時間(秒)。
+            frame_sec (float): PWMフレーム周期(秒)。
+            min_pulse_step (int): 1ステップの最小の有効なパルス変化量(us)。
+                経路に沿ったパルス変化量の合計で制限する。
+
+        Returns:
+            int: ステップ数 (1以上)
+        """
+        _step_n = max(math.ceil(move_sec / frame_sec - 1e-9), 1)
+
+        if min_pulse_step > 0:
+            _pulses = self.angles2pulses(
+                np.clip(
+                    points,
+                    CalibrableServo.ANGLE_MIN,
+                    CalibrableServo.ANGLE_MAX,
+                )
+            )
+            _max_diff = int(np.max(np.abs(np.diff(_pulses, axis=0)).sum(0)))
+            _step_n = min(
+                _step_n, max(math.ceil(_max_diff / min_pulse_step), 1)
+            )
+
+        self.__log.debug("step_n=%s", _step_n)
+        return _step_n
@@ -0,0 +1,216 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""cmd_future.py"""
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+from ..utils.mylogger import get_logger
+
+
+class CmdFuture:
+    """Completion future of a queued command.
+
+    キューに入れたコマンド1つ分の状態・時刻・結果を保持する。
+    `wait()`で、そのコマンドの完了だけを待つことができる。
+
+    状態:
+        queued -> running -> done
+        queued -> cancelled (実行前に破棄された)
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    CANCELLED = "cancelled"
+
+    def __init__(
+        self,
+        req_id: int | str,
+        method: str,
+        cmd: Any = None,
+        func: Callable[[], Any] | None = None,
+        gen: int = 0,
+    ):
+        """Constructor.
+
+        Args:
+            req_id (int | str): リクエストID。
+            method (str): コマンド名。
+            cmd (Any): 実行するコマンド(ワーカーが使う)。
+            func (Callable | None): 引数を束縛済みの、実行する関数。
+                None: ワーカーが`cmd`から実行する。
+            gen (int): キューに入れたときの中断の世代
+                (`MultiServo.cancel_gen`)。
+        """
+        self.id = req_id
+        self.method = method
+        self.cmd = cmd
+        self.func = func
+        self.gen = gen
+
+        self.state = self.QUEUED
+        self.enqueue_time: float = time.time()
+        self.start_time: float | None = None
+        self.end_time: float | None = None
+        self.result: Any = None
+        self.error: Any = None
+
+        self._done = threading.Event()
+
+    def set_running(self):
+        """実行開始"""
+        self.state = self.RUNNING
+        self.start_time = time.time()
+
+    def set_done(self, result: Any = None, error: Any = None):
+        """実行終了"""
+        self.result = result
+        self.error = error
+        self.state = self.DONE
+        self.end_time = time.time()
+        self._done.set()
+
+    def set_cancelled(self):
+        """実行前に破棄された(または、途中で中断された)"""
+        self.state = self.CANCELLED
+        self.end_time = time.time()
+        self._done.set()
+
+    @property
+    def finished(self) -> bool:
+        """`done`または`cancelled`"""
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """完了(または破棄)まで待つ。
+
+        Returns:
+            bool: タイムアウトした場合は`False`。
+        """
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> dict:
+        """状態をdictにする(JSONにできる値のみ)。
+
+        e.g.
+        {
+          "id": 3,
+          "method": "move",
+          "state": "done",
+          "enqueue_time": 1750000000.123,
+          "start_time": 1750000000.456,
+          "end_time": 1750000000.789,
+          "queue_sec": 0.333,
+          "exec_sec": 0.333,
+          "result": null,
+          "error": null
+        }
+        """
+        _queue_sec = None
+        if self.start_time is not None:
+            _queue_sec = self.start_time - self.enqueue_time
+        _exec_sec = None
+        if self.start_time is not None and self.end_time is not None:
+            _exec_sec = self.end_time - self.start_time
+
+        return {
+            "id": self.id,
+            "method": self.method,
+            "state": self.state,
+            "enqueue_time": self.enqueue_time,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "queue_sec": _queue_sec,
+            "exec_sec": _exec_sec,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class CmdFutureTable:
+    """ID -> CmdFuture のテーブル.
+
+    終わったものは、新しい順に`history_n`個だけ残す。
+
+    自動採番のIDと、クライアントが指定したIDは、同じテーブルに入る。
+    自動採番では、テーブルにあるIDを飛ばす。
+    指定したIDが、まだ終わっていないコマンドのIDと重なる場合は、
+    `ValueError`になる(終わったものは、置き換える)。
+    """
+
+    DEF_HISTORY_N = 256
+
+    def __init__(self, history_n: int = DEF_HISTORY_N, debug=False):
+        """Constructor."""
+        self.__debug = debug
+        self.__log = get_logger(self.__class__.__name__, self.__debug)
+        self.__log.debug("history_n=%s", history_n)
+
+        self.history_n = history_n
+
+        self._lock = threading.Lock()
+        self._futures: OrderedDict[int | str, CmdFuture] = OrderedDict()
+        self._id_counter = itertools.count(1)
+
+    def new(
+        self,
+        method: str,
+        cmd: Any = None,
+        req_id: int | str | None = None,
+        func: Callable[[], Any] | None = None,
+        gen: int = 0,
+    ) -> CmdFuture:
+        """Create and register new future.
+
+        Args:
+            method (str): コマンド名。
+            cmd (Any): 実行するコマンド。
+            req_id (int | str | None): None: 自動で採番する。
+            func (Callable | None): 引数を束縛済みの、実行する関数。
+            gen (int): 中断の世代 (`MultiServo.cancel_gen`)。
+
+        Raises:
+            ValueError: `req_id`のコマンドが、まだ終わっていない。
+        """
+        with self._lock:
+            if req_id is None:
+                req_id = next(self._id_counter)
+                while req_id in self._futures:
+                    req_id = next(self._id_counter)
+            else:
+                _old = self._futures.get(req_id)
+                if _old is not None and not _old.finished:
+                    raise ValueError(f"duplicate id: {req_id!r}")
+            _fut = CmdFuture(req_id, method, cmd, func, gen)
+            self._futures.pop(req_id, None)
+            self._futures[req_id] = _fut
+            self._evict()
+        return _fut
+
+    def get(self, req_id: int | str) -> CmdFuture | None:
+        """Get future (None: unknown id)."""
+        with self._lock:
+            return self._futures.get(req_id)
+
+    def _evict(self):
+        """古い、終わったものを削除する。"""
+        _n = len(self._futures) - self.history_n
+        if _n <= 0:
+            return
+        _finished = [_id for _id, _f in self._futures.items() if _f.finished]
+        for _id in _finished[:_n]:
+            del self._futures[_id]
+
+    def __contains__(self, req_id: object) -> bool:
+        with self._lock:
+            return req_id in self._futures
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._futures)
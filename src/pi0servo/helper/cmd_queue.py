@@ -0,0 +1,387 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""cmd_queue.py"""
+
+import queue
+import threading
+from collections import deque
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from ..utils.mylogger import get_logger
+
+
+class CmdQueue:
+    """Command queue for workers.
+
+    `queue.Queue`に似ているが、以下の点が異なる。
+
+    * `get()`は、タイムアウトなしでブロックできる。
+      `close()`されると、`None`を返すので、ポーリングが不要。
+    * `join()`にタイムアウトを指定できる。
+      キューが空になり、実行中のコマンドが終わった瞬間に戻る。
+    * `clear()`で、実行待ちのコマンドを、まとめて破棄できる。
+    * `busy`で、実行待ち・実行中のコマンドがあるかどうかがわかる。
+    * 優先度別のレーンがあり、`get()`は、優先度の高いレーンから取り出す。
+      (同じレーンの中は、FIFO)
+    * `coalesce_key`を指定すると、同じキーのコマンドが続けて`put()`された
+      場合に、実行待ちの古い方を新しい方で置き換える(latest-wins)。
+      キーが`None`のコマンドは、置き換えない(順序を保つ)。
+    * `maxsize`で、実行待ちのコマンド数の上限を指定できる。
+      上限に達したときの動作は、`policy`で選ぶ。
+        "block": 空きができるまで待つ (timeout: `queue.Full`)
+        "reject": `queue.Full`
+        "drop_oldest": 実行待ちの一番古いコマンドを破棄して、入れる
+        "drop_newest": 入れようとしたコマンドを破棄する
+      ただし、`PRIO_EMERGENCY`のコマンドは、どのpolicyでも必ず入れる
+      ("drop_oldest"では古いコマンドを破棄し、ほかは上限を超えて入れる)。
+
+    状態の変化は、すべて一つの`threading.Condition`で通知する。
+
+    使い方(ワーカー側):
+        while True:
+            cmd = cmdq.get()
+            if cmd is None:  # closed
+                break
+            try:
+                ...
+            finally:
+                cmdq.task_done()
+    """
+
+    # 優先度(レーン): 数値が小さいほど優先
+    PRIO_EMERGENCY = 0
+    PRIO_INTERACTIVE = 1
+    PRIO_BACKGROUND = 2
+
+    PRIORITY = {
+        "emergency": PRIO_EMERGENCY,
+        "interactive": PRIO_INTERACTIVE,
+        "background": PRIO_BACKGROUND,
+    }
+    DEF_PRIORITY = PRIO_INTERACTIVE
+
+    # 上限に達したときの動作
+    POLICY_BLOCK = "block"
+    POLICY_REJECT = "reject"
+    POLICY_DROP_OLDEST = "drop_oldest"
+    POLICY_DROP_NEWEST = "drop_newest"
+    POLICIES = (
+        POLICY_BLOCK,
+        POLICY_REJECT,
+        POLICY_DROP_OLDEST,
+        POLICY_DROP_NEWEST,
+    )
+    DEF_POLICY = POLICY_BLOCK
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        policy: str = DEF_POLICY,
+        coalesce_key: Callable[[Any], Hashable | None] | None = None,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            maxsize (int): 実行待ちのコマンド数の上限 (0以下: 無制限)。
+            policy (str): 上限に達したときの動作 (`POLICIES`)。
+            coalesce_key (Callable | None):
+                コマンド -> キー (None: 置き換えない)。
+                None: coalesce しない。
+
+        Raises:
+            ValueError: 不明な`policy`。
+        """
+        self.__debug = debug
+        self.__log = get_logger(self.__class__.__name__, self.__debug)
+        self.__log.debug(
+            "maxsize=%s, policy=%s, coalesce_key=%s",
+            maxsize,
+            policy,
+            coalesce_key,
+        )
+
+        if policy not in self.POLICIES:
+            raise ValueError(f"unknown policy: {policy!r}")
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.coalesce_key = coalesce_key
+
+        self._cond = threading.Condition()
+        self._lanes: list[deque] = [deque() for _ in self.PRIORITY]
+        self._unfinished = 0  # 実行待ち + 実行中
+        self._closed = False
+        self._coalesced = 0  # 置き換えられたコマンドの数
+        self._dropped = 0  # 上限に達して破棄したコマンドの数
+        self._high_water = 0  # 実行待ちのコマンド数の最大値
+
+    @classmethod
+    def priority(cls, name: str | int | None) -> int:
+        """Priority name to lane number.
+
+        Args:
+            name: "emergency", "interactive", "background", 数値, None
+
+        Returns:
+            int: レーン番号 (None: `DEF_PRIORITY`)
+
+        Raises:
+            ValueError: 不明な優先度。
+        """
+        if name is None:
+            return cls.DEF_PRIORITY
+        if isinstance(name, int) and name in cls.PRIORITY.values():
+            return name
+        if isinstance(name, str) and name.lower() in cls.PRIORITY:
+            return cls.PRIORITY[name.lower()]
+        raise ValueError(f"unknown priority: {name!r}")
+
+    def put(
+        self,
+        item: Any,
+        priority: int = DEF_PRIORITY,
+        timeout: float | None = None,
+    ) -> Any | None:
+        """Put item.
+
+        Args:
+            item (Any): コマンド。
+            priority (int): レーン番号 (`PRIO_*`)。
+            timeout (float | None): "block"の場合の待ち時間。
+                None: 無期限に待つ。
+
+        Returns:
+            Any | None: 破棄されたコマンド。
+                coalesce で置き換えられたもの、
+                "drop_oldest"で破棄したもの、
+                "drop_newest"の場合は、`item`自身。
+
+        Raises:
+            queue.Full: "reject"、または"block"でタイムアウトした。
+        """
+        _key_func = self.coalesce_key
+        _key = _key_func(item) if _key_func else None
+
+        with self._cond:
+            _lane = self._lanes[priority]
+
+            # 同じレーンの最後のコマンドと同じキーなら、置き換える
+            if _key is not None and _lane and _key_func(_lane[-1]) == _key:
+                _old = _lane[-1]
+                _lane[-1] = item
+                self._coalesced += 1
+                self._cond.notify_all()
+                self.__log.debug("coalesced: key=%s", _key)
+                return _old
+
+            _dropped = None
+            if self._is_full():
+                _dropped = self._on_full(item, priority, timeout)
+                if _dropped is item:
+                    return _dropped
+
+            _lane.append(item)
+            self._unfinished += 1
+            self._high_water = max(self._high_water, self._qsize())
+            self._cond.notify_all()
+            return _dropped
+
+    def _is_full(self) -> bool:
+        """Lock held."""
+        return self.maxsize > 0 and self._qsize() >= self.maxsize
+
+    def _on_full(
+        self, item: Any, priority: int, timeout: float | None
+    ) -> Any | None:
+        """上限に達したときの処理 (Lock held).
+
+        Returns:
+            Any | None: 破棄したコマンド (None: 空きができた)。
+        """
+        if (
+            priority == self.PRIO_EMERGENCY
+            and self.policy != self.POLICY_DROP_OLDEST
+        ):
+            # 待たず、捨てずに、上限を超えて入れる
+            self.__log.debug("emergency: over maxsize")
+            return None
+
+        if self.policy == self.POLICY_BLOCK:
+            self._cond.wait_for(
+                lambda: not self._is_full() or self._closed, timeout
+            )
+            if self._is_full():
+                raise queue.Full(f"queue full: maxsize={self.maxsize}")
+            return None
+
+        if self.policy == self.POLICY_REJECT:
+            raise queue.Full(f"queue full: maxsize={self.maxsize}")
+
+        self._dropped += 1
+
+        if self.policy == self.POLICY_DROP_OLDEST:
+            # 優先度が同じか低いレーンの、一番古いコマンドを破棄する
+            # (優先度の高いコマンドは、低いコマンドのために破棄しない)
+            for _lane in reversed(self._lanes[priority:]):
+                if _lane:
+                    _old = _lane.popleft()
+                    self._unfinished -= 1
+                    self.__log.debug("dropped oldest")
+                    return _old
+
+        # POLICY_DROP_NEWEST
+        self.__log.debug("dropped newest")
+        return item
+
+    def get(self, timeout: float | None = None) -> Any | None:
+        """Get item.
+
+        Args:
+            timeout (float | None): None: 無期限に待つ。
+
+        Returns:
+            item: タイムアウト、または`close()`された場合は`None`。
+        """
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: self._has_items() or self._closed, timeout
+            ):
+                return None
+            for _lane in self._lanes:
+                if _lane:
+                    # 空きを待っている`put()`に通知する
+                    self._cond.notify_all()
+                    return _lane.popleft()
+            return None
+
+    def get_while(self, pred: Callable[[Any], bool], max_n: int) -> list[Any]:
+        """Get following items without waiting (lookahead).
+
+        次に`get()`で取り出されるコマンドから順に、
+        `pred(item)`が真の間(最大`max_n`個)、まとめて取り出す。
+        取り出したコマンドごとに、`task_done()`を呼ぶこと。
+
+        Returns:
+            list: 取り出したコマンドのリスト (空の場合もある)。
+        """
+        with self._cond:
+            _items: list[Any] = []
+            _lane = next((_l for _l in self._lanes if _l), None)
+            while _lane and len(_items) < max_n and pred(_lane[0]):
+                _items.append(_lane.popleft())
+            if _items:
+                self._cond.notify_all()
+            return _items
+
+    def _has_items(self) -> bool:
+        """Lock held."""
+        return any(self._lanes)
+
+    def task_done(self):
+        """`get()`したコマンドの実行が終わったことを通知する。"""
+        with self._cond:
+            if self._unfinished > 0:
+                self._unfinished -= 1
+            self._cond.notify_all()
+
+    def clear(self) -> list:
+        """実行待ちのコマンドをすべて破棄する。
+
+        Returns:
+            list: 破棄したコマンドのリスト。
+        """
+        with self._cond:
+            _items = []
+            for _lane in self._lanes:
+                _items.extend(_lane)
+                _lane.clear()
+            self._unfinished -= len(_items)
+            self._cond.notify_all()
+        self.__log.debug("cleared %s items", len(_items))
+        return _items
+
+    def join(self, timeout: float | None = None) -> bool:
+        """実行待ち・実行中のコマンドがなくなるまで待つ。
+
+        Returns:
+            bool: タイムアウトした場合は`False`。
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._unfinished <= 0 or self._closed, timeout
+            )
+
+    def close(self):
+        """`get()`, `join()`で待っているスレッドを起こして、終了させる。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def qsize(self) -> int:
+        """Number of queued (not started) items."""
+        with self._cond:
+            return self._qsize()
+
+    def _qsize(self) -> int:
+        """Lock held."""
+        return sum(len(_lane) for _lane in self._lanes)
+
+    def lane_sizes(self) -> dict[str, int]:
+        """Number of queued items for each lane."""
+        with self._cond:
+            return {
+                _name: len(self._lanes[_prio])
+                for _name, _prio in self.PRIORITY.items()
+            }
+
+    def items(self) -> list:
+        """Queued (not started) items, in `get()` order."""
+        with self._cond:
+            return [_item for _lane in self._lanes for _item in _lane]
+
+    @property
+    def lock(self) -> threading.Condition:
+        """キューの状態を変える処理と排他する (再入可能)。
+
+        e.g. 取り出されていないコマンドだけに、何かをする:
+            with cmdq.lock:
+                for item in cmdq.items():
+                    ...
+        """
+        return self._cond
+
+    def empty(self) -> bool:
+        """Queue is empty."""
+        return self.qsize() == 0
+
+    @property
+    def busy(self) -> bool:
+        """実行待ち、または実行中のコマンドがある。"""
+        with self._cond:
+            return self._unfinished > 0
+
+    @property
+    def coalesced(self) -> int:
+        """coalesce で置き換えられたコマンドの数 (累計)."""
+        with self._cond:
+            return self._coalesced
+
+    @property
+    def dropped(self) -> int:
+        """上限に達して破棄したコマンドの数 (累計)."""
+        with self._cond:
+            return self._dropped
+
+    @property
+    def high_water(self) -> int:
+        """実行待ちのコマンド数の最大値 (high-water mark)."""
+        with self._cond:
+            return self._high_water
+
+    @property
+    def closed(self) -> bool:
+        """Closed flag."""
+        return self._closed
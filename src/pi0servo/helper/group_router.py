@@ -0,0 +1,231 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""group_router.py"""
+
+import json
+from collections.abc import Callable
+from typing import Any
+
+from ..utils.mylogger import get_logger
+from .cmd_queue import CmdQueue
+from .thread_worker import ThreadWorker
+
+
+class GroupRouter:
+    """Route JSON commands to independent servo groups.
+
+    サーボを名前つきのグループに分け、グループごとに`ThreadWorker`
+    (キューとスレッド)を持つ。
+    グループが違えば、コマンドは別々のキューで、同時に実行される
+    (例えば、腕の動作中でも、頭を動かせる)。
+
+    `separate_pi=True`の場合、グループごとに別の`pigpio.pi()`
+    (pigpiodへのソケット)を使うので、グループ間で通信の待ち時間が重なる。
+
+    コマンドは、"group"キーで、グループを指定する。
+        {"method": "move", "params": {"angles": [30, 0]}, "group": "arm"}
+
+    "group"がない場合は、最初のグループ(`default_group`)に送る。
+    ただし、`BROADCAST_METHODS`("estop"など)は、すべてのグループに送り、
+    "value"に、グループ名 -> 各グループの返り値 をまとめて返す。
+    (グループが1つだけの場合は、まとめずに、そのグループの返り値を返す)
+
+    コマンドのID(`status`, `await`)は、グループごとに採番されるので、
+    "group"をつけて問い合わせる。
+    """
+
+    KEY_GROUP = "group"
+    DEF_GROUP = "default"
+
+    # "group"がない場合に、すべてのグループに送るコマンド
+    BROADCAST_METHODS = (
+        ThreadWorker.CMD_ESTOP,
+        ThreadWorker.CMD_CANCEL,
+        ThreadWorker.CMD_WAIT,
+        ThreadWorker.CMD_QSIZE,
+        ThreadWorker.CMD_STATS,
+    )
+
+    def __init__(
+        self,
+        groups: dict[str, list[int]],
+        pi_factory: Callable[[], Any],
+        separate_pi=False,
+        coalesce=False,
+        queue_maxsize=0,
+        queue_policy=CmdQueue.DEF_POLICY,
+        lookahead=0,
+        use_script=False,
+        trust_daemon=False,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            groups (dict[str, list[int]]): グループ名 -> ピン番号のリスト。
+            pi_factory (Callable): `pigpio.pi`など、接続を作る関数。
+            separate_pi (bool): グループごとに、別の接続を使う。
+            coalesce, queue_maxsize, queue_policy, lookahead, use_script,
+            trust_daemon:
+                各グループの`ThreadWorker`のオプション。
+
+        Raises:
+            ValueError: グループがない、空のグループ、
+                同じピンが複数のグループにある。
+            ConnectionError: pigpiodに接続できない。
+        """
+        self.__debug = debug
+        self.__log = get_logger(self.__class__.__name__, self.__debug)
+        self.__log.debug("groups=%s, separate_pi=%s", groups, separate_pi)
+
+        if not groups:
+            raise ValueError("no groups")
+        _used: set[int] = set()
+        for _name, _pins in groups.items():
+            if not _pins:
+                raise ValueError(f"{_name}: no pins")
+            for _pin in _pins:
+                if abs(_pin) in _used:
+                    raise ValueError(f"{_name}: pin {_pin} in two groups")
+                _used.add(abs(_pin))
+
+        self.groups = groups
+        self.default_group = next(iter(groups))
+        self.separate_pi = separate_pi
+
+        self._pis: list = []
+        self.workers: dict[str, ThreadWorker] = {}
+        try:
+            for _name, _pins in groups.items():
+                if separate_pi or not self._pis:
+                    self._pis.append(self._connect(pi_factory))
+                self.workers[_name] = ThreadWorker(
+                    self._pis[-1],
+                    _pins,
+                    coalesce=coalesce,
+                    queue_maxsize=queue_maxsize,
+                    queue_policy=queue_policy,
+                    lookahead=lookahead,
+                    use_script=use_script,
+                    trust_daemon=trust_daemon,
+                    debug=self.__debug,
+                )
+        except Exception:
+            self._stop_pis()
+            raise
+
+    @staticmethod
+    def _connect(pi_factory: Callable[[], Any]):
+        """pigpiodに接続する。"""
+        _pi = pi_factory()
+        if not _pi.connected:
+            raise ConnectionError("pigpio daemon")
+        return _pi
+
+    @staticmethod
+    def parse_groups(specs: str | list[str]) -> dict[str, list[int]]:
+        """Parse group specs.
+
+        e.g.
+        "arm=17,18;head=27" or ["arm=17,18", "head=27"]
+        --> {"arm": [17, 18], "head": [27]}
+
+        Raises:
+            ValueError: 書式の誤り。
+        """
+        if isinstance(specs, str):
+            specs = specs.split(";")
+
+        _groups: dict[str, list[int]] = {}
+        for _spec in specs:
+            if not _spec.strip():
+                continue
+            _name, _sep, _pins = _spec.partition("=")
+            _name = _name.strip()
+            if not _sep or not _name:
+                raise ValueError(f"invalid group: {_spec!r}")
+            _groups[_name] = [
+                int(_p) for _p in _pins.split(",") if _p.strip()
+            ]
+        return _groups
+
+    def start(self):
+        """すべてのグループのスレッドを開始する。"""
+        for _worker in self.workers.values():
+            _worker.start()
+
+    def end(self):
+        """すべてのグループを終了して、接続を切る。"""
+        self.__log.debug("")
+        for _worker in self.workers.values():
+            _worker.end()
+        self._stop_pis()
+
+    def _stop_pis(self):
+        for _pi in self._pis:
+            _pi.stop()
+        self._pis = []
+
+    def worker(self, group: str | None = None) -> ThreadWorker:
+        """グループの`ThreadWorker` (None: `default_group`).
+
+        Raises:
+            KeyError: 不明なグループ。
+        """
+        return self.workers[group or self.default_group]
+
+    def send(self, cmd_data: str | dict) -> dict:
+        """Send command to the group.
+
+        Returns:
+            dict: `ThreadWorker.send()`の返り値。
+                "result"には、"group"(グループ名)を追加する。
+        """
+        self.__log.debug("cmd_data=%s", cmd_data)
+
+        _worker = self.worker()
+        try:
+            if isinstance(cmd_data, str):
+                cmd_json = json.loads(cmd_data)
+            else:
+                cmd_json = cmd_data
+        except json.JSONDecodeError:
+            cmd_json = None
+        if not isinstance(cmd_json, dict):
+            # エラーの処理は、`ThreadWorker`にまかせる
+            return _worker.send(cmd_data)
+
+        _group = cmd_json.get(self.KEY_GROUP)
+        if (
+            _group is None
+            and cmd_json.get("method") in self.BROADCAST_METHODS
+            and len(self.workers) > 1
+        ):
+            return self._broadcast(cmd_json, cmd_data)
+
+        _name = _group or self.default_group
+        if _name not in self.workers:
+            return _worker.mk_reply_error(
+                "INVALID_PARAM", f"Unknown group: {_name}", cmd_json
+            )
+
+        _ret = self.workers[_name].send(cmd_json)
+        if "result" in _ret:
+            _ret["result"][self.KEY_GROUP] = _name
+        return _ret
+
+    def _broadcast(self, cmd_json: dict, cmd_data: str | dict) -> dict:
+        """すべてのグループに送る。
+
+        e.g.
+        {"result": {"value": {"arm": {"result": ...}, "head": {...}},
+                    "request": {"method": "estop"}}}
+        """
+        _value = {
+            _name: _worker.send(cmd_json)
+            for _name, _worker in self.workers.items()
+        }
+        _ret = {"result": {"value": _value, "request": cmd_data}}
+        self.__log.debug("_ret=%s", _ret)
+        return _ret
@@ -1,16 +1,27 @@
 #
 # (c) 2025 Yoichi Tanibayashi
 #
-import json
+import functools
+import inspect
 import queue
 import threading
 import time
+from collections.abc import Callable
+from typing import Any
 
-from jsonrpc import Dispatcher, JSONRPCResponseManager
+from jsonrpc import Dispatcher
+from jsonrpc.exceptions import (
+    JSONRPCInvalidParams,
+    JSONRPCInvalidRequest,
+    JSONRPCServerError,
+)
 
+from ..core import modes
 from ..core.calibrable_servo import CalibrableServo
 from ..core.multi_servo import MultiServo
 from ..utils.mylogger import errmsg, get_logger
+from .cmd_future import CmdFuture, CmdFutureTable
+from .cmd_queue import CmdQueue
 
 
 class HandleNotqueued:
@@ -25,15 +36,34 @@ class HandleNotqueued:
         self.worker = worker
 
     def cancel(self) -> int:
-        """Cancel commands in queue."""
+        """Cancel commands in queue.
+
+        実行中の移動・sleepも中断する。
+        """
         self.__log.debug("")
-        _cancel_count = 0
-        while not self.worker.reqlist_q.empty():
-            _cancel_count += 1
-            _cmd = self.worker.reqlist_q.get()
-            self.__log.debug("%2d:%s", _cancel_count, _cmd)
+        _cancel_count = self.worker.clear_reqlist_q()
+        self.worker.mservo.cancel_move()
         return _cancel_count
 
+    def estop(self, mode: str = MultiServo.ESTOP_HOLD) -> dict:
+        """Emergency stop.
+
+        キューを空にして、実行中の移動を止め、
+        "hold": その位置に留める。
+        "off": すべてのサーボをオフにする。
+
+        Returns:
+            dict: {"mode": ..., "latency_sec": ..., "cancelled": ...}
+        """
+        _t0 = time.monotonic()
+        self.__log.debug("mode=%s", mode)
+        if mode not in MultiServo.ESTOP_MODES:
+            raise ValueError(f"invalid mode: {mode!r}")
+
+        _cancel_count = self.worker.clear_reqlist_q()
+        _ret = self.worker.mservo.estop(mode, _t0)
+        return {**_ret, "cancelled": _cancel_count}
+
     def qsize(self) -> int:
         """Queue size."""
         self.__log.debug("")
@@ -41,17 +71,102 @@ class HandleNotqueued:
         self.__log.debug("_qsize=%s", _qsize)
         return _qsize
 
-    def wait(self, wait_interval: float = 0.5):
-        """Wait worker."""
-        self.__log.debug(
-            "wait_interval=%s,qsize=%s", wait_interval, self.worker.qsize
-        )
-        while self.worker.is_busy:
-            self.__log.debug(
-                "waiting worker(busy, qsize=%s)..", self.worker.qsize
-            )
-            time.sleep(wait_interval)
-        return True
+    def coalesced(self) -> int:
+        """Number of coalesced (dropped) requests."""
+        self.__log.debug("")
+        return self.worker.coalesced
+
+    def queue_stats(self) -> dict:
+        """Queue statistics.
+
+        Returns:
+            dict:
+                qsize: 実行待ちのリクエスト(リスト)数 (depth)
+                high_water: qsizeの最大値 (high-water mark)
+                maxsize: 上限 (0: 無制限)
+                policy: 上限に達したときの動作
+                dropped: 上限に達して破棄したリクエスト数 (累計)
+                coalesced: coalesce で破棄したリクエスト数 (累計)
+        """
+        self.__log.debug("")
+        _q = self.worker.reqlist_q
+        return {
+            "qsize": _q.qsize(),
+            "high_water": _q.high_water,
+            "maxsize": _q.maxsize,
+            "policy": _q.policy,
+            "dropped": _q.dropped,
+            "coalesced": _q.coalesced,
+        }
+
+    def stats(self, reset: bool = False) -> dict:
+        """Servo write statistics.
+
+        Args:
+            reset: `True`の場合は、返した後で統計をリセットする。
+
+        Returns:
+            dict:
+                write: `MultiServo.write_stats`
+                    (送信数"written"と、同じ値のため送信しなかった数"skipped")
+                last_move: `MultiServo.last_move_stats`
+        """
+        self.__log.debug("reset=%s", reset)
+        _mservo = self.worker.mservo
+        _stats = {
+            "write": dict(_mservo.write_stats),
+            "last_move": dict(_mservo.last_move_stats),
+        }
+        if reset:
+            _mservo.reset_write_stats()
+        return _stats
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait worker.
+
+        最後のコマンドが終わった時点で、通知を受けて戻る。
+
+        Returns:
+            bool: タイムアウトした場合は`False`。
+        """
+        self.__log.debug("timeout=%s,qsize=%s", timeout, self.worker.qsize)
+        return self.worker.reqlist_q.join(timeout)
+
+    def status(self, id: int | str) -> dict:  # noqa: A002
+        """Status of queued request.
+
+        Args:
+            id: キューに入れたリクエストのID (キューイング時の返り値)
+
+        Returns:
+            dict: `CmdFuture.to_dict()`
+        """
+        self.__log.debug("id=%s", id)
+        return self._get_future(id).to_dict()
+
+    def await_(
+        self,
+        id: int | str,  # noqa: A002
+        timeout: float | None = None,
+    ) -> dict:
+        """Wait for queued request (JSON-RPC method name is "await").
+
+        そのリクエストが終わるまで(またはタイムアウトまで)待つ。
+
+        Returns:
+            dict: `CmdFuture.to_dict()`
+        """
+        self.__log.debug("id=%s,timeout=%s", id, timeout)
+        _fut = self._get_future(id)
+        _fut.wait(timeout)
+        return _fut.to_dict()
+
+    def _get_future(self, req_id: int | str) -> CmdFuture:
+        """Get future."""
+        _fut = self.worker.futures.get(req_id)
+        if _fut is None:
+            raise KeyError(f"unknown id: {req_id}")
+        return _fut
 
 
 class HandleQueue:
@@ -66,35 +181,45 @@ class HandleQueue:
         self.mservo = mservo
 
         self.param_move_sec = MultiServo.DEF_MOVE_SEC
-        self.param_step_n = MultiServo.DEF_STEP_N
+        self.param_step_n = None  # None: 自動
         self.param_interval_sec = 0.0
 
     def move_all_angles_sync(
-        self, angles: list[float], move_sec=None, step_n=None
+        self, angles: list[float], move_sec=None, step_n=None, profile=None
     ):
         """Move all angles sync."""
         self.__log.debug(
-            "angles=%s,move_sec=%s,step_n=%s", angles, move_sec, step_n
+            "angles=%s,move_sec=%s,step_n=%s,profile=%s",
+            angles,
+            move_sec,
+            step_n,
+            profile,
         )
         if move_sec is None:
             move_sec = self.param_move_sec
         if step_n is None:
             step_n = self.param_step_n
 
-        self.mservo.move_all_angles_sync(angles, move_sec, step_n)
+        self.mservo.move_all_angles_sync(angles, move_sec, step_n, profile)
 
         if self.param_interval_sec:
-            time.sleep(self.param_interval_sec)
+            self.mservo.wait_cancel(self.param_interval_sec)
+        return dict(self.mservo.last_move_stats)
 
     def move_all_angles_sync_relative(
-        self, angle_diffs: list[float], move_sec=None, step_n=None
+        self,
+        angle_diffs: list[float],
+        move_sec=None,
+        step_n=None,
+        profile=None,
     ):
         """Move all angles sync."""
         self.__log.debug(
-            "angle_diffs=%s,move_sec=%s,step_n=%s",
+            "angle_diffs=%s,move_sec=%s,step_n=%s,profile=%s",
             angle_diffs,
             move_sec,
             step_n,
+            profile,
         )
         if move_sec is None:
             move_sec = self.param_move_sec
@@ -102,16 +227,17 @@ class HandleQueue:
             step_n = self.param_step_n
 
         self.mservo.move_all_angles_sync_relative(
-            angle_diffs, move_sec, step_n
+            angle_diffs, move_sec, step_n, profile
         )
 
         if self.param_interval_sec:
-            time.sleep(self.param_interval_sec)
+            self.mservo.wait_cancel(self.param_interval_sec)
+        return dict(self.mservo.last_move_stats)
 
     def sleep(self, sec: float):
         """Sleep."""
         self.__log.debug("sec=%s", sec)
-        time.sleep(sec)
+        self.mservo.wait_cancel(sec)
         return True
 
     def move_sec(self, sec: float):
@@ -119,10 +245,18 @@ class HandleQueue:
         self.__log.debug("sec=%s", sec)
         self.param_move_sec = sec
 
-    def step_n(self, step_n: int):
-        """Set number steps."""
+    def step_n(self, step_n: int | None):
+        """Set number steps.
+
+        None または "auto" の場合は、自動。
+        """
         self.__log.debug("step_n=%s", step_n)
-        self.param_step_n = step_n
+        if step_n is None or str(step_n).lower() == modes.STEP_N_AUTO:
+            self.param_step_n = None
+            return
+        if int(step_n) < 1:
+            raise ValueError(f"invalid step_n: {step_n}")
+        self.param_step_n = int(step_n)
 
     def interval(self, sec: float):
         """Set interval sec."""
@@ -163,11 +297,32 @@ class HandleQueue:
 
 
 class JsonRpcWorker(threading.Thread):
-    """JSON RPC Worker."""
+    """JSON RPC Worker.
+
+    `coalesce=True`の場合、絶対位置のコマンド(`COALESCE_METHODS`)だけの
+    リクエストが、同じサーボに対して続けて送られると、
+    実行待ちの古い方を破棄して、新しい方だけを実行する(latest-wins)。
+
+    `queue_maxsize`で、実行待ちのリクエスト数に上限をつけることができる。
+    上限に達したときの動作は、`queue_policy`(`CmdQueue.POLICIES`)で選ぶ。
+    "reject"の場合は、キューに入れるはずだったコマンドの結果が、
+    エラー(`ERROR_QUEUE_FULL`)になる。
+    """
 
-    DEF_RECV_TIMEOUT = 0.2  # sec
     DEF_INTERVAL_SEC = 0.0  # sec
 
+    ERROR_QUEUE_FULL = -32001
+
+    # coalesce の対象(絶対位置のコマンド) -> 角度のパラメータ名
+    COALESCE_METHODS: dict[str, str] = {"move_all_angles_sync": "angles"}
+
+    # JSONコマンド(`ThreadWorker`, `StrCmdToJson`)のパラメータ名
+    # -> メソッドの引数名
+    PARAM_ALIASES: dict[str, dict[str, str]] = {
+        "step_n": {"n": "step_n"},
+        "set": {"servo": "servo_i"},
+    }
+
     def __init__(
         self,
         pi,
@@ -175,27 +330,54 @@ class JsonRpcWorker(threading.Thread):
         first_move=True,
         conf_file=CalibrableServo.DEF_CONF_FILE,
         flag_verbose=False,
+        coalesce=False,
+        queue_maxsize: int = 0,
+        queue_policy: str = CmdQueue.DEF_POLICY,
+        use_script=False,
+        trust_daemon=False,
         debug=False,
     ) -> None:
-        """Constructor."""
+        """Constructor.
+
+        `use_script`, `trust_daemon`は、`MultiServo`のオプション。
+        """
         super().__init__(daemon=True)
         self.__debug = debug
         self.__log = get_logger(self.__class__.__name__, self.__debug)
         self.__log.debug(
-            "pins=%s,first_move=%s,conf_file=%s,flag_verbose=%s",
+            "pins=%s,first_move=%s,conf_file=%s,flag_verbose=%s,coalesce=%s",
             pins,
             first_move,
             conf_file,
             flag_verbose,
+            coalesce,
+        )
+        self.__log.debug(
+            "queue_maxsize=%s,queue_policy=%s,use_script=%s,trust_daemon=%s",
+            queue_maxsize,
+            queue_policy,
+            use_script,
+            trust_daemon,
         )
 
         self.flag_verbose = flag_verbose
 
         self.mservo = MultiServo(
-            pi, pins, first_move, conf_file, debug=self.__debug
+            pi,
+            pins,
+            first_move,
+            conf_file,
+            use_script=use_script,
+            trust_daemon=trust_daemon,
+            debug=self.__debug,
         )
 
-        self.reqlist_q: queue.Queue = queue.Queue()
+        # キューには、リクエストごとの`CmdFuture`のリストを入れる
+        self.reqlist_q = CmdQueue(
+            queue_maxsize, queue_policy, debug=self.__debug
+        )
+        self.coalesce = coalesce
+        self.futures = CmdFutureTable(debug=self.__debug)
 
         # dispatcher for notqueued
         self.obj_notqueued = HandleNotqueued(self, debug=self.__debug)
@@ -204,6 +386,14 @@ class JsonRpcWorker(threading.Thread):
         )
         self.dispatcher_notqueued = Dispatcher()
         self.dispatcher_notqueued.add_object(self.obj_notqueued)
+        # "await"は予約語なので、メソッド名を指定して登録し直す
+        del self.dispatcher_notqueued[
+            f"{self.obj_notqueued_classname}.await_"
+        ]
+        self.dispatcher_notqueued.add_method(
+            self.obj_notqueued.await_,
+            name=f"{self.obj_notqueued_classname}.await",
+        )
 
         # dispatcher for queue
         self.obj_queue = HandleQueue(self.mservo, debug=self.__debug)
@@ -212,17 +402,28 @@ class JsonRpcWorker(threading.Thread):
         self.dispatcher_queue.add_object(self.obj_queue)
         self.queue_class_name = self.obj_queue.__class__.__name__.lower()
 
+        # メソッド名 -> シグネチャ (パラメータのチェック用、一度だけ作る)
+        self._signatures: dict[str, inspect.Signature] = {
+            _name: inspect.signature(_func)
+            for _dispatcher in (
+                self.dispatcher_notqueued,
+                self.dispatcher_queue,
+            )
+            for _name, _func in _dispatcher.items()
+        }
+
         # flags
         self._flag_active = False
-        self._flag_busy = False
 
         # default parameters
         self.move_sec = MultiServo.DEF_MOVE_SEC
-        self.step_n = MultiServo.DEF_STEP_N
+        self.step_n = None  # None: 自動
         self.interval_sec = self.DEF_INTERVAL_SEC
 
         # JSON-RPC ID
         self.rpc_id: int = 0
+        # `call()`中の、クライアントが指定したID (自動採番で飛ばす)
+        self._client_ids: set = set()
 
     def end(self):
         """End."""
@@ -231,6 +432,8 @@ class JsonRpcWorker(threading.Thread):
         # stop thread
         self._flag_active = False
         self.clear_reqlist_q()
+        self.mservo.cancel_move()
+        self.reqlist_q.close()
         self.join()
 
         # off all servo
@@ -263,8 +466,51 @@ class JsonRpcWorker(threading.Thread):
 
     @property
     def is_busy(self) -> bool:
-        """Busy flag."""
-        return self._flag_busy
+        """実行待ち、または実行中のコマンドがある。"""
+        return self.reqlist_q.busy
+
+    @property
+    def coalesce(self) -> bool:
+        """Coalescing mode."""
+        return self.reqlist_q.coalesce_key is not None
+
+    @coalesce.setter
+    def coalesce(self, flag: bool):
+        self.reqlist_q.coalesce_key = self._coalesce_key if flag else None
+
+    @property
+    def coalesced(self) -> int:
+        """Number of coalesced (dropped) requests."""
+        return self.reqlist_q.coalesced
+
+    def _coalesce_key(self, fut_list: list[CmdFuture]) -> tuple | None:
+        """Coalesce key of queued request list.
+
+        絶対位置のコマンド1つだけのリストは、(メソッド名, サーボの番号)。
+        それ以外は、None (置き換えない)。
+        """
+        if len(fut_list) != 1:
+            return None
+
+        _fut = fut_list[0]
+        _param_name = self.COALESCE_METHODS.get(_fut.method)
+        if _param_name is None:
+            return None
+
+        _params = _fut.cmd.get("params")
+        if isinstance(_params, dict):
+            _values = _params.get(_param_name)
+        elif isinstance(_params, list) and _params:
+            _values = _params[0]
+        else:
+            return None
+        if not isinstance(_values, list):
+            return None
+
+        return (
+            _fut.method,
+            tuple(_i for _i, _v in enumerate(_values) if _v is not None),
+        )
 
     def __del__(self):
         """Delete."""
@@ -273,14 +519,29 @@ class JsonRpcWorker(threading.Thread):
 
     def clear_reqlist_q(self):
         """Clear command queue."""
-        _count = 0
-        while not self.reqlist_q.empty():
-            _count += 1
-            _cmd = self.reqlist_q.get()
-            self.__log.debug("%2d:%s", _count, _cmd)
+        _fut_lists = self.reqlist_q.clear()
+        for _i, _fut_list in enumerate(_fut_lists):
+            for _fut in _fut_list:
+                _fut.set_cancelled()
+            self.__log.debug("%2d:%s", _i + 1, [f.cmd for f in _fut_list])
+
+        self.__log.debug("count=%s", len(_fut_lists))
+        return len(_fut_lists)
+
+    def _interrupt(self) -> int:
+        """実行中のリストだけを中断する (実行待ちのリストは残す)。
+
+        キューから取り出されていないリストの世代を、新しい世代にする。
 
-        self.__log.debug("count=%s", _count)
-        return _count
+        Returns:
+            int: 新しい中断の世代。
+        """
+        with self.reqlist_q.lock:
+            _gen = self.mservo.cancel_move()
+            for _fut_list in self.reqlist_q.items():
+                for _fut in _fut_list:
+                    _fut.gen = _gen
+        return _gen
 
     def mk_jsonrpc_req(self, cmd_dict: dict, method_prefix: str = "") -> dict:
         """Make JSON-RPC request.
@@ -313,13 +574,19 @@ class JsonRpcWorker(threading.Thread):
         }
 
         try:
-            # "id"
+            # "id": クライアント指定のIDは、そのまま使う
+            # (`rpc_id`は、自動採番用のカウンター(int)のまま)
             _req_id = cmd_dict.get("id")
-            if _req_id:
-                self.rpc_id = _req_id
-            else:
+            if not _req_id:
+                # クライアント指定のIDで使われているものは、飛ばす
                 self.rpc_id += 1
-            _jsonrpc_req_dict["id"] = self.rpc_id
+                while (
+                    self.rpc_id in self.futures
+                    or self.rpc_id in self._client_ids
+                ):
+                    self.rpc_id += 1
+                _req_id = self.rpc_id
+            _jsonrpc_req_dict["id"] = _req_id
 
             # "method"
             _method_name = cmd_dict.get("method")
@@ -329,6 +596,11 @@ class JsonRpcWorker(threading.Thread):
 
             # "params"
             _req_params = cmd_dict.get("params")
+            _aliases = self.PARAM_ALIASES.get(cmd_dict["method"])
+            if isinstance(_req_params, dict) and _aliases:
+                _req_params = {
+                    _aliases.get(_k, _k): _v for _k, _v in _req_params.items()
+                }
             if _req_params:
                 _jsonrpc_req_dict["params"] = _req_params
 
@@ -352,7 +624,15 @@ class JsonRpcWorker(threading.Thread):
         self.__log.debug("cmd_dict_list=%s", cmd_dict_list)
 
         _queue_jsonrpc_req_list = []  # キューイングすべきコマンドのリスト
+        _queued_result_list = []  # キューイングすべきコマンドの結果
         _result_list = []  # 結果リスト
+        _flag_preempt = False
+        _prio = CmdQueue.PRIO_BACKGROUND  # リスト内で最も高い優先度
+        self._client_ids = {
+            _c["id"]
+            for _c in cmd_dict_list
+            if isinstance(_c, dict) and isinstance(_c.get("id"), (int, str))
+        }
 
         for _cmd_dict in cmd_dict_list:
             self.__log.debug("_cmd_dict=%s", _cmd_dict)
@@ -365,7 +645,7 @@ class JsonRpcWorker(threading.Thread):
             _method_name = (
                 f"{self.obj_notqueued_classname}.{_cmd_dict['method']}"
             )
-            if _method_name in list(self.dispatcher_notqueued):
+            if _method_name in self.dispatcher_notqueued:
                 #
                 # キューに入れない処理
                 #
@@ -375,25 +655,44 @@ class JsonRpcWorker(threading.Thread):
                     _cmd_dict, self.obj_notqueued_classname
                 )
                 self.__log.debug("_jsonrpc_req_dict=%s", _jsonrpc_req_dict)
+                if not _jsonrpc_req_dict:
+                    _result = self._mk_invalid_request(_cmd_dict)
+                    _result_list.append(_result)
+                    self.__log.error("%s", _result)
+                    continue
 
                 # 実行
-                _ret = JSONRPCResponseManager.handle(
-                    json.dumps(_jsonrpc_req_dict), self.dispatcher_notqueued
+                _result_list.append(
+                    self._call_now(
+                        self.dispatcher_notqueued, _jsonrpc_req_dict
+                    )
                 )
-
-                if _ret and _ret.data:
-                    _result_list.append(_ret.data)
-                else:
-                    _result_list.append({})
-
                 continue
 
             _method_name = f"{self.obj_queue_classname}.{_cmd_dict['method']}"
-            if _method_name in list(self.dispatcher_queue):
+            if _method_name in self.dispatcher_queue:
                 #
                 # キューイングすべきコマンドの処理
                 #
-                _result_list.append({"result": "queued"})
+                try:
+                    _cmd_prio = CmdQueue.priority(_cmd_dict.get("priority"))
+                except ValueError as _e:
+                    _result = {"error": {"message": str(_e)}}
+                    _result_list.append(_result)
+                    self.__log.error("%s", _result)
+                    continue
+
+                # "preempt": 実行中・実行待ちのコマンドを破棄して、割り込む
+                _params = _cmd_dict.get("params")
+                if isinstance(_params, dict) and "preempt" in _params:
+                    _cmd_dict = {
+                        **_cmd_dict,
+                        "params": {
+                            k: v for k, v in _params.items() if k != "preempt"
+                        },
+                    }
+                    if _params["preempt"]:
+                        _flag_preempt = True
 
                 # method の prefix を変更して、
                 # JSON-RPCリクエスト形式に整える
@@ -401,10 +700,40 @@ class JsonRpcWorker(threading.Thread):
                     _cmd_dict, self.obj_queue_classname
                 )
                 # self.__log.debug("_jsonrpc_req_dict=%s", _jsonrpc_req_dict)
+                if not _jsonrpc_req_dict:
+                    _result = self._mk_invalid_request(_cmd_dict)
+                    _result_list.append(_result)
+                    self.__log.error("%s", _result)
+                    continue
+
+                # メソッドとパラメータを、キューに入れる前に解決しておく
+                # (ワーカーは、関数を呼び出すだけ)
+                try:
+                    _func = self._bind(
+                        self.dispatcher_queue, _jsonrpc_req_dict
+                    )
+                except TypeError as _e:
+                    _result = self._mk_response(
+                        _jsonrpc_req_dict["id"],
+                        error=self._mk_error(JSONRPCInvalidParams, _e),
+                    )
+                    _result_list.append(_result)
+                    self.__log.error("%s", _result)
+                    continue
+
+                _prio = min(_prio, _cmd_prio)
+
+                # IDは、`status`, `await`で使う
+                _queued_result = {
+                    "result": "queued",
+                    "id": _jsonrpc_req_dict["id"],
+                }
+                _result_list.append(_queued_result)
+                _queued_result_list.append(_queued_result)
 
                 # キューイングすべきコマンドをリストに追加する。
                 # キューイングは、あとでまとめて行う。
-                _queue_jsonrpc_req_list.append(_jsonrpc_req_dict)
+                _queue_jsonrpc_req_list.append((_jsonrpc_req_dict, _func))
                 continue
 
             #
@@ -427,11 +756,154 @@ class JsonRpcWorker(threading.Thread):
                 _queue_jsonrpc_req_list,
                 self.qsize,
             )
-            self.reqlist_q.put(_queue_jsonrpc_req_list)
+            # リクエストごとに、完了を待つための`CmdFuture`を作る。
+            # 終わっていないリクエストとIDが重なるものは、キューに入れない
+            _fut_list = []
+            _ok_result_list = []
+            for (_req, _func), _queued_result in zip(
+                _queue_jsonrpc_req_list, _queued_result_list, strict=True
+            ):
+                try:
+                    _fut = self.futures.new(
+                        _req["method"].split(".", 1)[-1],
+                        _req,
+                        _req["id"],
+                        _func,
+                    )
+                except ValueError as _e:
+                    del _queued_result["result"]
+                    _queued_result.update(
+                        self._mk_response(
+                            _req["id"],
+                            error=self._mk_error(JSONRPCInvalidParams, _e),
+                        )
+                    )
+                    self.__log.error("%s", _queued_result)
+                    continue
+                _fut_list.append(_fut)
+                _ok_result_list.append(_queued_result)
+
+            if _flag_preempt and _fut_list:
+                _count = self.obj_notqueued.cancel()
+                self.__log.debug("preempt: cancelled %s lists", _count)
+            elif _prio == CmdQueue.PRIO_EMERGENCY and _fut_list:
+                # 実行待ちのリストは残し、実行中の移動だけを中断する
+                self._interrupt()
+
+            # 中断の世代を記録して、この後に中断されたら実行しない
+            for _fut in _fut_list:
+                _fut.gen = self.mservo.cancel_gen
+
+            _old_list = None
+            try:
+                if _fut_list:
+                    _old_list = self.reqlist_q.put(_fut_list, _prio)
+            except queue.Full as _e:
+                self.__log.warning("%s", _e)
+                _old_list = _fut_list
+                for _queued_result in _ok_result_list:
+                    del _queued_result["result"]
+                    _queued_result["error"] = {
+                        "code": self.ERROR_QUEUE_FULL,
+                        "message": str(_e),
+                    }
+
+            if _old_list is not None:
+                # coalesce, drop_oldest, drop_newest, reject:
+                # 実行せずに破棄
+                for _fut in _old_list:
+                    _fut.set_cancelled()
 
         self.__log.debug("_result_list=%s", _result_list)
         return _result_list
 
+    def _bind(
+        self, dispatcher: Dispatcher, req_dict: dict
+    ) -> Callable[[], Any]:
+        """Resolve method and bind params.
+
+        Args:
+            dispatcher (Dispatcher): メソッドを探すディスパッチャ。
+            req_dict (dict): JSON-RPCリクエスト(`mk_jsonrpc_req()`)。
+
+        Returns:
+            Callable: 引数なしで呼び出せる関数。
+
+        Raises:
+            TypeError: パラメータが、メソッドの引数と合わない。
+        """
+        _method_name = req_dict["method"]
+        _params = req_dict.get("params") or []
+        _sig = self._signatures[_method_name]
+        if isinstance(_params, dict):
+            _bound = _sig.bind(**_params)
+        else:
+            _bound = _sig.bind(*_params)
+        return functools.partial(
+            dispatcher[_method_name], *_bound.args, **_bound.kwargs
+        )
+
+    def _call_now(self, dispatcher: Dispatcher, req_dict: dict) -> dict:
+        """Bind and invoke (not queued).
+
+        Returns:
+            dict: JSON-RPCレスポンス。
+        """
+        try:
+            _func = self._bind(dispatcher, req_dict)
+        except TypeError as _e:
+            return self._mk_response(
+                req_dict["id"], error=self._mk_error(JSONRPCInvalidParams, _e)
+            )
+        return self._invoke(_func, req_dict["id"])
+
+    def _invoke(self, func: Callable[[], Any], req_id: int | str) -> dict:
+        """Invoke bound function.
+
+        Returns:
+            dict: JSON-RPCレスポンス。
+        """
+        try:
+            _result = func()
+        except Exception as _e:
+            self.__log.error(errmsg(_e))
+            return self._mk_response(
+                req_id, error=self._mk_error(JSONRPCServerError, _e)
+            )
+        return self._mk_response(req_id, _result)
+
+    @staticmethod
+    def _mk_response(
+        req_id: int | str, result: Any = None, error: dict | None = None
+    ) -> dict:
+        """Make JSON-RPC 2.0 response."""
+        if error is not None:
+            return {"jsonrpc": "2.0", "error": error, "id": req_id}
+        return {"jsonrpc": "2.0", "result": result, "id": req_id}
+
+    @classmethod
+    def _mk_invalid_request(cls, cmd_dict: dict) -> dict:
+        """Make Invalid Request(-32600) response."""
+        return cls._mk_response(
+            cmd_dict.get("id"),
+            error=cls._mk_error(
+                JSONRPCInvalidRequest, ValueError(f"invalid: {cmd_dict}")
+            ),
+        )
+
+    @staticmethod
+    def _mk_error(err_class: type, e: Exception) -> dict:
+        """Make JSON-RPC error object (`JSONRPCResponseManager`と同じ形)."""
+        return {
+            "code": err_class.CODE,
+            "message": err_class.MESSAGE,
+            "data": {
+                "type": type(e).__name__,
+                "args": e.args,
+                "message": str(e),
+            },
+        }
+
     def run(self):
         """Run."""
         self.__log.debug("")
@@ -440,57 +912,59 @@ class JsonRpcWorker(threading.Thread):
 
         # メインループ
         while self._flag_active:
-            if self.qsize == 0:
-                self._flag_busy = False
-
             # キューからコマンド(リスト)を取り出す
-            try:
-                _req_dict_list = self.reqlist_q.get(
-                    timeout=self.DEF_RECV_TIMEOUT
-                )
-            except queue.Empty:
-                continue
-
-            if not _req_dict_list:
+            # (来るまで、または`end()`まで、ブロックして待つ)
+            _fut_list = self.reqlist_q.get()
+            if not _fut_list:
                 continue
 
             self.__log.info("qsize=%s", self.qsize)
 
-            self._flag_busy = True
+            try:
+                self._exec_req_list(_fut_list)
+            finally:
+                # `wait`で待っているスレッドに通知される
+                self.reqlist_q.task_done()
 
-            # コマンドリストの中のコマンドを順番に実行
-            for _req_dict in _req_dict_list:
-                self.__log.info(
-                    "req> %s%s",
-                    _req_dict.get("method"),
-                    _req_dict.get("params"),
-                )
+        self.__log.debug("done.")
 
-                ret = None
-                try:
-                    # ディスパッチ
-                    ret = JSONRPCResponseManager.handle(
-                        json.dumps(_req_dict), self.dispatcher_queue
-                    )
-                except Exception as e:
-                    self.__log.error(errmsg(e))
+    def _exec_req_list(self, fut_list: list[CmdFuture]):
+        """Execute JSON-RPC request list."""
+        # キューに入れた後に中断(cancel, preempt, estop)されたリストは
+        # 実行しない。世代が同じ場合だけ、中断状態を解除する
+        # (取り出してから解除するまでの中断も、取り消さない)。
+        if not self.mservo.clear_cancel(fut_list[0].gen):
+            self.__log.info("cancelled: %s", [_f.cmd for _f in fut_list])
+            for _fut in fut_list:
+                _fut.set_cancelled()
+            return
+
+        # コマンドリストの中のコマンドを順番に実行
+        for _fut in fut_list:
+            _req_dict = _fut.cmd
+
+            if self.mservo.cancel_event.is_set():
+                self.__log.info("cancelled: %s", _req_dict)
+                _fut.set_cancelled()
+                continue
 
-                if ret is None:
-                    # ???
-                    self.__log.warning("ret is %s", ret)
-                    continue
+            _fut.set_running()
+            self.__log.info(
+                "req> %s%s",
+                _req_dict.get("method"),
+                _req_dict.get("params"),
+            )
 
-                #
-                # ret is not None
-                #
-                self.__log.info(
-                    "ret>   result:%s, error:%s",
-                    ret.data.get("result"),
-                    ret.data.get("error"),
-                )
+            # 実行 (引数は、キューに入れる前に束縛済み)
+            _res = self._invoke(_fut.func, _fut.id)
+            _fut.set_done(_res.get("result"), _res.get("error"))
 
-                # インターバルが設定されている場合はsleep
-                if self.interval_sec > 0.0:
-                    time.sleep(self.interval_sec)
+            self.__log.info(
+                "ret>   result:%s, error:%s",
+                _res.get("result"),
+                _res.get("error"),
+            )
 
-        self.__log.debug("done.")
+            # インターバルが設定されている場合はsleep
+            if self.interval_sec > 0.0:
+                self.mservo.wait_cancel(self.interval_sec)
@@ -0,0 +1,600 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""shm_executor.py"""
+
+import itertools
+import json
+import multiprocessing
+import queue
+import struct
+import sys
+import threading
+from collections.abc import Callable
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any
+
+from ..utils.mylogger import errmsg, get_logger
+from .cmd_queue import CmdQueue
+from .group_router import GroupRouter
+from .thread_worker import ThreadWorker
+
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    """既存の共有メモリに接続する(子プロセス側)。
+
+    作成したプロセス(親)が`unlink()`するので、
+    子プロセスの終了時に、resource_tracker に削除させない。
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    _shm = shared_memory.SharedMemory(name)
+    resource_tracker.unregister(_shm._name, "shared_memory")  # type: ignore
+    return _shm
+
+
+class ShmRing:
+    """Single-producer / single-consumer ring buffer on shared memory.
+
+    固定長のスロットのリング。ロックは使わない。
+        head: 書き込み側だけが進める (次に書くスロット)
+        tail: 読み出し側だけが進める (次に読むスロット)
+
+    スロットを書き終えてから`head`を進めるので、
+    読み出し側は、`head`までのスロットを、ロックなしで読める。
+    インデックスは32bit(アラインされた4バイトの書き込み)なので、
+    32bitのOSでも、途中の値が見えることはない。
+
+    (注) Pythonからはメモリバリアを出せないので、書き込みの順序は、
+    CPUのストア順序に依存する。相手を起こすには、
+    `multiprocessing.Event`など(バリアを含む)を併用すること。
+
+    レイアウト:
+        [head: u32][tail: u32][pad ..64]
+        [len: u32][payload (slot_size - 4)] x slot_n
+    """
+
+    HEADER_SIZE = 64
+    DEF_SLOT_N = 64
+    DEF_SLOT_SIZE = 1024
+
+    _IDX = struct.Struct("<I")
+    _MASK = 0xFFFFFFFF
+
+    def __init__(
+        self,
+        name: str | None = None,
+        slot_n: int = DEF_SLOT_N,
+        slot_size: int = DEF_SLOT_SIZE,
+        create=False,
+    ):
+        """Constructor.
+
+        Args:
+            name (str | None): 共有メモリの名前 (None: 自動)。
+            slot_n (int): スロット数 (2のべき乗)。
+            slot_size (int): 1スロットのバイト数 (長さの4バイトを含む)。
+            create (bool): True: 作成する, False: 既存のものに接続する。
+
+        Raises:
+            ValueError: スロット数が2のべき乗でない、スロットが小さすぎる。
+        """
+        if slot_n <= 0 or slot_n & (slot_n - 1):
+            raise ValueError(f"slot_n must be a power of 2: {slot_n}")
+        if slot_size <= self._IDX.size:
+            raise ValueError(f"slot_size too small: {slot_size}")
+
+        self.slot_n = slot_n
+        self.slot_size = slot_size
+
+        if create:
+            self.shm = shared_memory.SharedMemory(
+                name, create=True, size=self.HEADER_SIZE + slot_n * slot_size
+            )
+            self.shm.buf[: self.HEADER_SIZE] = bytes(self.HEADER_SIZE)
+        elif name is None:
+            raise ValueError("name is required to attach")
+        else:
+            self.shm = _attach_shm(name)
+        self.name = self.shm.name
+
+    @property
+    def max_payload(self) -> int:
+        """1スロットに入るデータの最大バイト数."""
+        return self.slot_size - self._IDX.size
+
+    def _get(self, offset: int) -> int:
+        return self._IDX.unpack_from(self.shm.buf, offset)[0]
+
+    def _set(self, offset: int, value: int):
+        self._IDX.pack_into(self.shm.buf, offset, value & self._MASK)
+
+    def __len__(self) -> int:
+        """読み出せるスロットの数."""
+        return (self._get(0) - self._get(4)) & self._MASK
+
+    def push(self, data: bytes) -> bool:
+        """Write one slot (producer only).
+
+        Returns:
+            bool: `False`: いっぱいで書けなかった。
+
+        Raises:
+            ValueError: データが大きすぎる。
+        """
+        if len(data) > self.max_payload:
+            raise ValueError(
+                f"too large: {len(data)} > {self.max_payload} bytes"
+            )
+
+        _head = self._get(0)
+        if (_head - self._get(4)) & self._MASK >= self.slot_n:
+            return False
+
+        _off = self.HEADER_SIZE + (_head % self.slot_n) * self.slot_size
+        self._IDX.pack_into(self.shm.buf, _off, len(data))
+        _start = _off + self._IDX.size
+        self.shm.buf[_start : _start + len(data)] = data
+
+        # スロットを書き終えてから、公開する
+        self._set(0, _head + 1)
+        return True
+
+    def pop(self) -> bytes | None:
+        """Read one slot (consumer only).
+
+        Returns:
+            bytes | None: 空の場合は`None`。
+        """
+        _tail = self._get(4)
+        if _tail == self._get(0):
+            return None
+
+        _off = self.HEADER_SIZE + (_tail % self.slot_n) * self.slot_size
+        _len = self._IDX.unpack_from(self.shm.buf, _off)[0]
+        _start = _off + self._IDX.size
+        _data = bytes(self.shm.buf[_start : _start + _len])
+
+        # 読み終えてから、スロットを空ける
+        self._set(4, _tail + 1)
+        return _data
+
+    def close(self, unlink=False):
+        """共有メモリを閉じる (unlink: 作成した側が削除する)."""
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class ShmPulses:
+    """Current pulses on shared memory (seqlock).
+
+    書き込み側(1つ)は、`seq`を奇数にしてから書き、偶数に戻す。
+    読み出し側は、`seq`が偶数で、読む前後で変わらなければ、採用する。
+    どちらもロックを使わない。
+
+    レイアウト: [seq: u32][pulse: i32] x servo_n
+    """
+
+    _SEQ = struct.Struct("<I")
+
+    def __init__(self, name: str | None, servo_n: int, create=False):
+        """Constructor."""
+        self.servo_n = servo_n
+        self._pulses = struct.Struct(f"<{servo_n}i")
+
+        if create:
+            self.shm = shared_memory.SharedMemory(
+                name, create=True, size=self._SEQ.size + self._pulses.size
+            )
+            self.shm.buf[: self.shm.size] = bytes(self.shm.size)
+        elif name is None:
+            raise ValueError("name is required to attach")
+        else:
+            self.shm = _attach_shm(name)
+        self.name = self.shm.name
+
+    def write(self, pulses: list[int]):
+        """Publish pulses (writer only)."""
+        _seq = self._SEQ.unpack_from(self.shm.buf, 0)[0]
+        self._SEQ.pack_into(self.shm.buf, 0, (_seq + 1) & 0xFFFFFFFF)
+        self._pulses.pack_into(self.shm.buf, self._SEQ.size, *pulses)
+        self._SEQ.pack_into(self.shm.buf, 0, (_seq + 2) & 0xFFFFFFFF)
+
+    def read(self, retry_n: int = 100) -> list[int] | None:
+        """Read pulses.
+
+        Returns:
+            list[int] | None: 書き込み中が続いた場合は`None`。
+        """
+        for _ in range(retry_n):
+            _seq = self._SEQ.unpack_from(self.shm.buf, 0)[0]
+            if _seq & 1:
+                continue
+            _pulses = list(self._pulses.unpack_from(self.shm.buf, 4))
+            if self._SEQ.unpack_from(self.shm.buf, 0)[0] == _seq:
+                return _pulses
+        return None
+
+    def close(self, unlink=False):
+        """共有メモリを閉じる (unlink: 作成した側が削除する)."""
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _executor_main(
+    cmd_name: str,
+    reply_name: str,
+    pulse_name: str,
+    slot_n: int,
+    slot_size: int,
+    groups: dict[str, list[int]],
+    pi_factory: Callable[[], Any],
+    worker_opts: dict,
+    cmd_bell,
+    reply_bell,
+    stop_event,
+    publish_sec: float,
+    wait_workers: int,
+    debug: bool,
+):
+    """Executor process main.
+
+    コマンドのリングから読み出して、`GroupRouter`で実行し、
+    返り値を返信のリングに書く。
+    リングを読むループは、待たない:
+      * "estop"などの`CONTROL_METHODS`: すぐに返るので、その場で実行する。
+      * `wait`, `await`: コマンドごとに、別スレッドで実行する
+        (同時に`wait_workers`個まで。超えた場合は、"QUEUE_FULL"エラー)。
+      * そのほか(キューに入れるコマンド): 1つの別スレッドで、順に実行する
+        (キューが一杯のとき、"block"ポリシーでは、空くまで待つため)。
+    """
+    _log = get_logger(__name__, debug)
+    _cmd_ring = ShmRing(cmd_name, slot_n, slot_size)
+    _reply_ring = ShmRing(reply_name, slot_n, slot_size)
+    _servo_n = sum(len(_p) for _p in groups.values())
+    _pulses = ShmPulses(pulse_name, _servo_n)
+
+    _reply_lock = threading.Lock()  # 返信のリングの書き込み側は1つ
+
+    def _reply(seq: int, ret: dict):
+        _data = json.dumps({"seq": seq, "reply": ret}).encode()
+        if len(_data) > _reply_ring.max_payload:
+            _data = json.dumps(
+                {"seq": seq, "reply": {"error": ShmExecutor.err_too_large()}}
+            ).encode()
+        with _reply_lock:
+            while not _reply_ring.push(_data):
+                if stop_event.wait(0.001):
+                    return
+        reply_bell.set()
+
+    def _exec(router, seq: int, cmd: dict):
+        try:
+            _ret = router.send(cmd)
+        except Exception as _e:
+            _log.error(errmsg(_e))
+            _ret = ShmExecutor._mk_error("INTERNAL_ERROR", errmsg(_e))
+        _reply(seq, _ret)
+
+    # `wait`, `await`で待つスレッドの数に、上限をつける
+    _wait_slots = threading.BoundedSemaphore(wait_workers)
+
+    def _exec_wait(router, seq: int, cmd: dict):
+        try:
+            _exec(router, seq, cmd)
+        finally:
+            _wait_slots.release()
+
+    # キューに入れるコマンド: (seq, cmd), None: 終了
+    _enqueue_q: queue.SimpleQueue = queue.SimpleQueue()
+
+    def _enqueue_loop(router):
+        while (_item := _enqueue_q.get()) is not None:
+            _exec(router, *_item)
+
+    _stopped = threading.Event()
+
+    def _publish(router):
+        while not _stopped.wait(publish_sec):
+            _pulses.write(
+                [
+                    _p
+                    for _w in router.workers.values()
+                    for _p in _w.mservo.get_all_pulses()
+                ]
+            )
+
+    router = GroupRouter(groups, pi_factory, debug=debug, **worker_opts)
+    router.start()
+    _publisher = threading.Thread(target=_publish, args=(router,))
+    _publisher.start()
+    _enqueuer = threading.Thread(target=_enqueue_loop, args=(router,))
+    _enqueuer.start()
+    _log.debug("ready: groups=%s", groups)
+
+    try:
+        while not stop_event.is_set():
+            _data = _cmd_ring.pop()
+            if _data is None:
+                # 空になってから鳴らす(clear の後に書かれたものは、
+                # 次の`wait()`がすぐに戻るので、取りこぼさない)
+                cmd_bell.clear()
+                if not len(_cmd_ring):
+                    cmd_bell.wait(0.1)
+                continue
+
+            _msg = json.loads(_data)
+            _seq, _cmd = _msg["seq"], _msg["cmd"]
+            _method = _cmd.get("method") if isinstance(_cmd, dict) else None
+            if _method in ThreadWorker.CONTROL_METHODS:
+                _exec(router, _seq, _cmd)
+            elif _method in ThreadWorker.WAIT_METHODS:
+                if _wait_slots.acquire(blocking=False):
+                    threading.Thread(
+                        target=_exec_wait,
+                        args=(router, _seq, _cmd),
+                        daemon=True,
+                    ).start()
+                else:
+                    _reply(
+                        _seq,
+                        ShmExecutor._mk_error(
+                            "QUEUE_FULL",
+                            f"too many waiting requests: {wait_workers}",
+                        ),
+                    )
+            else:
+                _enqueue_q.put((_seq, _cmd))
+    finally:
+        _stopped.set()
+        _publisher.join()
+        _enqueue_q.put(None)
+        router.end()  # "block"で待っているコマンドも、戻る
+        _enqueuer.join()
+        _cmd_ring.close()
+        _reply_ring.close()
+        _pulses.close()
+        _log.debug("done")
+
+
+class ShmExecutor:
+    """Process-isolated motion executor.
+
+    サーボを動かす`ThreadWorker`(`GroupRouter`)を、別のプロセスで動かす。
+    API(HTTPの処理やJSONの解析)とGILを共有しないので、
+    APIの負荷がステップの時間に影響しない。
+
+    * コマンドと返り値は、共有メモリのリング(`ShmRing`)で受け渡す。
+    * 現在のパルス幅は、共有メモリ(`ShmPulses`)で公開される(`pulses`)。
+    * リングに書いたことは、`multiprocessing.Event`で相手に知らせる
+      (データ自体は、ロックなしで受け渡す)。
+
+    `send()`は、`ThreadWorker.send()`と同じ返り値を返す。
+    (どのスレッドから呼んでもよい)
+    """
+
+    DEF_PUBLISH_SEC = 0.02  # sec (PWM周期)
+    # 同時に待てる`wait`, `await`の数 (`JsonApi.WAIT_WORKERS`より多く)
+    DEF_WAIT_WORKERS = 32
+    START_METHOD = "spawn"  # スレッドのあるプロセスから fork しない
+
+    def __init__(
+        self,
+        groups: dict[str, list[int]],
+        pi_factory: Callable[[], Any],
+        slot_n: int = ShmRing.DEF_SLOT_N,
+        slot_size: int = ShmRing.DEF_SLOT_SIZE,
+        publish_sec: float = DEF_PUBLISH_SEC,
+        wait_workers: int = DEF_WAIT_WORKERS,
+        separate_pi=False,
+        coalesce=False,
+        queue_maxsize=0,
+        queue_policy=CmdQueue.DEF_POLICY,
+        lookahead=0,
+        use_script=False,
+        trust_daemon=False,
+        start_method: str = START_METHOD,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            groups (dict[str, list[int]]): グループ名 -> ピン番号のリスト。
+            pi_factory (Callable): 子プロセスで接続を作る関数
+                (spawnの場合は、pickleできること。e.g. `pigpio.pi`)。
+            slot_n, slot_size: リングのスロット数、バイト数。
+            publish_sec (float): パルス幅を公開する周期(秒)。
+            wait_workers (int): 同時に待てる`wait`, `await`の数。
+                超えた場合は、"QUEUE_FULL"エラーを返す。
+            separate_pi, coalesce, queue_maxsize, queue_policy, lookahead,
+            use_script, trust_daemon:
+                `GroupRouter`のオプション。
+            start_method (str): `multiprocessing`の開始方法。
+        """
+        self.__debug = debug
+        self.__log = get_logger(self.__class__.__name__, self.__debug)
+        self.__log.debug(
+            "groups=%s, slot_n=%s, slot_size=%s, start_method=%s",
+            groups,
+            slot_n,
+            slot_size,
+            start_method,
+        )
+
+        self.groups = groups
+        _servo_n = sum(len(_p) for _p in groups.values())
+
+        self._cmd_ring = ShmRing(None, slot_n, slot_size, create=True)
+        self._reply_ring = ShmRing(None, slot_n, slot_size, create=True)
+        self._pulses = ShmPulses(None, _servo_n, create=True)
+
+        _ctx = multiprocessing.get_context(start_method)
+        self._cmd_bell = _ctx.Event()
+        self._reply_bell = _ctx.Event()
+        self._stop_event = _ctx.Event()
+
+        self._process = _ctx.Process(
+            target=_executor_main,
+            args=(
+                self._cmd_ring.name,
+                self._reply_ring.name,
+                self._pulses.name,
+                slot_n,
+                slot_size,
+                groups,
+                pi_factory,
+                {
+                    "separate_pi": separate_pi,
+                    "coalesce": coalesce,
+                    "queue_maxsize": queue_maxsize,
+                    "queue_policy": queue_policy,
+                    "lookahead": lookahead,
+                    "use_script": use_script,
+                    "trust_daemon": trust_daemon,
+                },
+                self._cmd_bell,
+                self._reply_bell,
+                self._stop_event,
+                publish_sec,
+                wait_workers,
+                debug,
+            ),
+            daemon=True,
+        )
+
+        # 書き込み側は一つにする
+        self._send_lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+        # 返信の振り分け: seq -> [Event, reply]
+        self._waiting: dict[int, list] = {}
+        self._waiting_lock = threading.Lock()
+        self._reader = threading.Thread(
+            target=self._read_replies, daemon=True
+        )
+        self._active = False
+
+    @staticmethod
+    def err_too_large() -> dict:
+        """リングに入らない"""
+        return {
+            "code": ThreadWorker.ERROR_CODE["INVALID_REQUEST"],
+            "message": "too large for shared memory slot",
+        }
+
+    def start(self):
+        """子プロセスを開始する。"""
+        self.__log.debug("")
+        self._active = True
+        self._process.start()
+        self._reader.start()
+
+    def end(self):
+        """子プロセスを終了して、共有メモリを削除する。"""
+        self.__log.debug("")
+        if self._active:
+            self._active = False
+            self._stop_event.set()
+            self._cmd_bell.set()
+            self._reply_bell.set()
+            self._process.join()
+            self._reader.join()
+
+        with self._waiting_lock:
+            for _entry in self._waiting.values():
+                _entry[0].set()
+
+        self._cmd_ring.close(unlink=True)
+        self._reply_ring.close(unlink=True)
+        self._pulses.close(unlink=True)
+        self.__log.debug("done")
+
+    @property
+    def pulses(self) -> list[int] | None:
+        """現在のパルス幅 (全グループ, グループの順)."""
+        return self._pulses.read()
+
+    def send(
+        self, cmd_data: str | dict, timeout: float | None = None
+    ) -> dict:
+        """Send command to the executor process.
+
+        Args:
+            cmd_data (str | dict): JSONコマンド(`GroupRouter.send()`参照)。
+            timeout (float | None): 返り値を待つ時間(秒) (None: 無期限)。
+
+        Returns:
+            dict: `ThreadWorker.send()`の返り値。
+        """
+        if not self._process.is_alive():
+            return self._mk_error(
+                "INTERNAL_ERROR", "executor process is not running"
+            )
+
+        _seq = next(self._seq)
+        if isinstance(cmd_data, str):
+            try:
+                cmd_data = json.loads(cmd_data)
+            except json.JSONDecodeError as _e:
+                return self._mk_error("INVALID_JSON", str(_e))
+
+        _data = json.dumps({"seq": _seq, "cmd": cmd_data}).encode()
+        if len(_data) > self._cmd_ring.max_payload:
+            return {"error": self.err_too_large()}
+
+        _entry: list = [threading.Event(), None]
+        with self._waiting_lock:
+            self._waiting[_seq] = _entry
+
+        try:
+            with self._send_lock:
+                _pushed = self._cmd_ring.push(_data)
+            if not _pushed:
+                return self._mk_error(
+                    "QUEUE_FULL", "shared memory ring is full"
+                )
+            self._cmd_bell.set()
+
+            if not _entry[0].wait(timeout) or _entry[1] is None:
+                return self._mk_error("INTERNAL_ERROR", "no reply")
+            return _entry[1]
+
+        finally:
+            with self._waiting_lock:
+                self._waiting.pop(_seq, None)
+
+    @staticmethod
+    def _mk_error(code_key: str, message: str) -> dict:
+        return {
+            "error": {
+                "code": ThreadWorker.ERROR_CODE[code_key],
+                "message": message,
+            }
+        }
+
+    def _read_replies(self):
+        """返信を読み出して、待っている`send()`に渡す。"""
+        while self._active:
+            _data = self._reply_ring.pop()
+            if _data is None:
+                if not self._process.is_alive() and self._process.exitcode:
+                    self.__log.error("exitcode=%s", self._process.exitcode)
+                    break
+                self._reply_bell.wait(0.1)
+                self._reply_bell.clear()
+                continue
+
+            _msg = json.loads(_data)
+            with self._waiting_lock:
+                _entry = self._waiting.get(_msg["seq"])
+            if _entry is None:  # タイムアウトした
+                continue
+            _entry[1] = _msg["reply"]
+            _entry[0].set()
+
+        # 子プロセスが終わったら、待っている`send()`を起こす
+        with self._waiting_lock:
+            for _entry in self._waiting.values():
+                _entry[0].set()
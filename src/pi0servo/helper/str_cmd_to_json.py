@@ -4,13 +4,27 @@
 """cmd_to_json.py."""
 
 import json
+import threading
+from collections import OrderedDict
 from typing import Any
 
+from ..core import modes
 from ..utils.mylogger import errmsg, get_logger
 
 
 class StrCmdToJson:
-    """String Command to JSON."""
+    """String Command to JSON.
+
+    パラメータ名は、JSONコマンド(`ThreadWorker`, JSONCMD_SAMPLES.md)と同じ。
+    (`JsonRpcWorker`は、`JsonRpcWorker.PARAM_ALIASES`で読み替える)
+
+    `cache_size > 0`の場合、コマンド文字列("mv:30,.,c"など)ごとに、
+    変換結果を`cache_size`個まで覚えておく(LRU)。
+    ジョイスティックなどから、同じ文字列が繰り返し届く
+    サーバー側(`/str`)で、解析をくり返さない。
+    """
+
+    DEF_CACHE_SIZE = 256
 
     ANGLE_MIN = -90
     ANGLE_CENTER = 0
@@ -40,6 +54,8 @@ class StrCmdToJson:
         # wait
         "wa": "wait",
         "ww": "wait",
+        # emergency stop
+        "es": "estop",
     }
 
     # 'mv'コマンドの角度パラメータのエイリアスマッピング
@@ -56,11 +72,17 @@ class StrCmdToJson:
         "sx": "max",
     }
 
-    def __init__(self, debug=False):
+    def __init__(self, cache_size=0, debug=False):
         """constractor."""
         self.__debug = debug
         self.__log = get_logger(self.__class__.__name__, self.__debug)
-        self.__log.debug("")
+        self.__log.debug("cache_size=%s", cache_size)
+
+        self.cache_size = cache_size
+        # コマンド文字列 -> 変換結果
+        self._cache: OrderedDict[str, dict] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
 
     def _create_error_data(self, code_key: str, strcmd: str) -> dict:
         """Create error data."""
@@ -171,7 +193,13 @@ class StrCmdToJson:
                 if not cmd_param_str:
                     return self._create_error_data("INVALID_PARAM", cmd_str)
 
-                angles = self._parse_angles(cmd_param_str)
+                # e.g. "30,20:ease" --> "30,20", "ease"
+                _angle_str, _, _profile = cmd_param_str.partition(":")
+                _profile = _profile.strip().lower()
+                if _profile and _profile not in modes.PROFILES:
+                    return self._create_error_data("INVALID_PARAM", cmd_str)
+
+                angles = self._parse_angles(_angle_str)
                 # self.__log.debug("angles=%s", angles)
                 if angles is None:
                     return self._create_error_data(
@@ -179,6 +207,8 @@ class StrCmdToJson:
                     )
 
                 _cmd_data["params"] = {"angles": angles}
+                if _profile:
+                    _cmd_data["params"]["profile"] = _profile
 
             elif cmd_key == "mr":
                 if not cmd_param_str:
@@ -208,12 +238,14 @@ class StrCmdToJson:
 
             elif cmd_key == "st":
                 try:
-                    _n = int(cmd_param_str)
-                    if _n < 1:
-                        return self._create_error_data(
-                            "INVALID_PARAM", cmd_str
-                        )
-                    _cmd_data["params"] = {"step_n": _n}
+                    _n: int | str = cmd_param_str.strip().lower()
+                    if _n != modes.STEP_N_AUTO:
+                        _n = int(_n)
+                        if _n < 1:
+                            return self._create_error_data(
+                                "INVALID_PARAM", cmd_str
+                            )
+                    _cmd_data["params"] = {"n": _n}
                 except Exception as e:
                     self.__log.warning(errmsg(e))
                     return self._create_error_data("INVALID_PARAM", cmd_str)
@@ -244,7 +276,7 @@ class StrCmdToJson:
                 {
                   "method": "set",
                   "params": {
-                    "servo_i": 1,
+                    "servo": 1,
                     "target": "center"
                     "pulse": 1500
                   }
@@ -269,7 +301,7 @@ class StrCmdToJson:
                     )
 
                     _cmd_data["params"] = {
-                        "servo_i": servo_i,
+                        "servo": servo_i,
                         "target": target,
                         "pulse": pulse,
                     }
@@ -277,6 +309,16 @@ class StrCmdToJson:
                     self.__log.warning(errmsg(e))
                     return self._create_error_data("INVALID_PARAM", cmd_str)
 
+            elif cmd_key == "es":
+                # e.g. "es" --> hold, "es:off" --> off
+                _mode = cmd_param_str.strip().lower()
+                if _mode:
+                    if _mode not in modes.ESTOP_MODES:
+                        return self._create_error_data(
+                            "INVALID_PARAM", cmd_str
+                        )
+                    _cmd_data["params"] = {"mode": _mode}
+
             elif cmd_key in ["ca", "zz", "qs", "qq", "wa", "ww"]:
                 pass
 
@@ -287,13 +329,50 @@ class StrCmdToJson:
         self.__log.debug("_cmd_data=%s", _cmd_data)
         return _cmd_data
 
+    @staticmethod
+    def _copy_cmd(cmd_data: dict) -> dict:
+        """コマンドのコピー (`params`のdict, listもコピーする)"""
+        _params = cmd_data.get("params")
+        if not isinstance(_params, dict):
+            return dict(cmd_data)
+        return {
+            **cmd_data,
+            "params": {
+                _k: list(_v) if isinstance(_v, list) else _v
+                for _k, _v in _params.items()
+            },
+        }
+
+    def cmdstr_to_json_cached(self, cmd_str: str) -> dict:
+        """`cmdstr_to_json()`の結果を、キャッシュから返す。
+
+        返すのは、毎回新しいdict(変更しても、キャッシュは変わらない)。
+        """
+        if self.cache_size <= 0:
+            return self.cmdstr_to_json(cmd_str)
+
+        with self._cache_lock:
+            _cmd_data = self._cache.get(cmd_str)
+            if _cmd_data is not None:
+                self._cache.move_to_end(cmd_str)
+                self.cache_hits += 1
+                return self._copy_cmd(_cmd_data)
+
+        _cmd_data = self.cmdstr_to_json(cmd_str)
+
+        with self._cache_lock:
+            self._cache[cmd_str] = self._copy_cmd(_cmd_data)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return _cmd_data
+
     def cmdstr_to_jsonlist(self, cmd_line: str) -> list[dict]:
         """Command line to command string list."""
 
         _cmd_data_list = []
 
         for cmd_str in cmd_line.split():
-            _cmd_data = self.cmdstr_to_json(cmd_str)
+            _cmd_data = self.cmdstr_to_json_cached(cmd_str)
             # self.__log.debug("cmd_data=%s", _cmd_data)
 
             _cmd_data_list.append(_cmd_data)
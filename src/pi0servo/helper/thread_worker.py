@@ -6,9 +6,12 @@ import queue
 import threading
 import time
 
+from ..core import modes
 from ..core.calibrable_servo import CalibrableServo
 from ..core.multi_servo import MultiServo
-from ..utils.mylogger import get_logger
+from ..utils.mylogger import errmsg, get_logger
+from .cmd_future import CmdFuture, CmdFutureTable
+from .cmd_queue import CmdQueue
 
 
 class ThreadWorker(threading.Thread):
@@ -22,6 +25,28 @@ class ThreadWorker(threading.Thread):
 
     コマンドをキャンセルしたい場合は、`clear_cmdq()`で、
     キューに溜まっているコマンドをすべてキャンセルできる。
+
+    コマンドに"priority"("emergency", "interactive", "background")を
+    つけると、優先度別のレーンに入り、優先度の高いものから実行される。
+
+    "estop"(非常停止)は、キューを通さずに、`send()`の中で直接実行する。
+
+    `coalesce=True`の場合、同じサーボに対する絶対位置のコマンド
+    (`COALESCE_METHODS`)が続けて送られると、実行待ちの古い方を破棄して、
+    新しい方だけを実行する(latest-wins)。
+    相対移動やキャリブレーションなどのコマンドは、順序どおりに実行する。
+
+    `queue_maxsize`で、実行待ちのコマンド数に上限をつけることができる。
+    上限に達したときの動作は、`queue_policy`(`CmdQueue.POLICIES`)で選ぶ。
+    "reject"の場合は、"QUEUE_FULL"エラーを返す。
+
+    `lookahead`(N > 0)を指定すると、同期移動(`move`)を実行するときに、
+    続いて実行待ちになっている同期移動(最大N個)を先読みして、
+    途中で止まらない一つの軌道にまとめて動かす
+    (`MultiServo.move_all_angles_sync_path()`)。
+    `interval_sec`が0より大きい場合は、移動ごとに止まるので、まとめない。
+    途中で中断(cancel, estop)された場合、通過できなかった移動は
+    "cancelled"になる。
     """
 
     ERROR_CODE = {
@@ -31,11 +56,27 @@ class ThreadWorker(threading.Thread):
         "INVALID_PARAM": -32602,
         "INTERNAL_ERROR": -32603,
         "UNKOWN": -32000,
+        "QUEUE_FULL": -32001,
     }
 
     CMD_CANCEL = "cancel"
     CMD_QSIZE = "qsize"
     CMD_WAIT = "wait"
+    CMD_STATUS = "status"
+    CMD_AWAIT = "await"
+    CMD_ESTOP = "estop"
+    CMD_STATS = "stats"
+
+    # キューに入れず、待たずに返るコマンド
+    CONTROL_METHODS = (
+        CMD_ESTOP,
+        CMD_CANCEL,
+        CMD_QSIZE,
+        CMD_STATUS,
+        CMD_STATS,
+    )
+    # 終わるまで待つコマンド
+    WAIT_METHODS = (CMD_WAIT, CMD_AWAIT)
 
     # コマンド一覧(例)
     # コマンドチェックにも使う
@@ -54,7 +95,10 @@ class ThreadWorker(threading.Thread):
                 "angles": [30, None, "center"],
                 "move_sec": 0.2,
                 "step_n": 40,
+                "profile": "ease",
+                "preempt": True,
             },
+            "priority": "interactive",
         },
         {
             "method": "move_all_angles_sync_relative",
@@ -79,16 +123,30 @@ class ThreadWorker(threading.Thread):
         {"method": "set", "params": {"servo": 1, "target": "center"}},
         {"method": CMD_CANCEL, "params": {"comment": "special command"}},
         {"method": CMD_QSIZE, "params": {"comment": "special command"}},
-        {"method": CMD_WAIT, "params": {"comment": "special command"}},
+        {"method": CMD_WAIT, "params": {"timeout": 5.0}},
+        {"method": CMD_STATUS, "params": {"id": 1}},
+        {"method": CMD_AWAIT, "params": {"id": 1, "timeout": 5.0}},
+        {"method": CMD_ESTOP, "params": {"mode": "hold"}},
+        {"method": CMD_STATS, "params": {"reset": False}},
         {
             "method": "move_all_pulses_relative",
             "params": {"pulse_diffs": [200, -200, 0, 0]},
         },
     ]
 
+    # coalesce の対象(絶対位置のコマンド) -> (種類, パラメータ名)
+    COALESCE_METHODS: dict[str, tuple[str, str]] = {
+        "move": ("move_all_angles_sync", "angles"),
+        "move_all_angles_sync": ("move_all_angles_sync", "angles"),
+        "move_all_angles": ("move_all_angles", "angles"),
+        "move_all_pulses": ("move_all_pulses", "pulses"),
+    }
+
     DEF_RECV_TIMEOUT = 0.2  # sec
     DEF_INTERVAL_SEC = 0.0  # sec
 
+    STEP_N_AUTO = modes.STEP_N_AUTO  # `step_n`コマンド: 自動
+
     def __init__(
         self,
         pi,
@@ -98,38 +156,66 @@ class ThreadWorker(threading.Thread):
         move_sec: float | None = None,
         step_n: int | None = None,
         interval_sec: float = DEF_INTERVAL_SEC,
+        coalesce=False,
+        queue_maxsize: int = 0,
+        queue_policy: str = CmdQueue.DEF_POLICY,
+        lookahead: int = 0,
+        use_script=False,
+        trust_daemon=False,
         debug=False,
     ):
-        """Constructor."""
+        """Constructor.
+
+        `use_script`, `trust_daemon`は、`MultiServo`のオプション。
+        """
         super().__init__(daemon=True)
         self.__debug = debug
         self.__log = get_logger(self.__class__.__name__, self.__debug)
 
         self.mservo = MultiServo(
-            pi, pins, first_move, conf_file, debug=self.__debug
+            pi,
+            pins,
+            first_move,
+            conf_file,
+            use_script=use_script,
+            trust_daemon=trust_daemon,
+            debug=self.__debug,
         )
         if move_sec is None:
             self.move_sec = MultiServo.DEF_MOVE_SEC
         else:
             self.move_sec = move_sec
 
-        if step_n is None:
-            self.step_n = MultiServo.DEF_STEP_N
-        else:
-            self.step_n = step_n
+        # None: ステップ数は自動 (MultiServo.move_all_angles_sync()参照)
+        self.step_n = step_n
 
         self.interval_sec = interval_sec
 
         self.__log.debug(
-            "move_sec=%s, step_n=%s, interval_sec=%s",
+            "move_sec=%s, step_n=%s, interval_sec=%s, coalesce=%s",
             move_sec,
             step_n,
             interval_sec,
+            coalesce,
+        )
+        self.__log.debug(
+            "queue_maxsize=%s, queue_policy=%s", queue_maxsize, queue_policy
+        )
+        self.__log.debug(
+            "lookahead=%s, use_script=%s, trust_daemon=%s",
+            lookahead,
+            use_script,
+            trust_daemon,
         )
 
-        self._cmdq: queue.Queue[dict] = queue.Queue()
+        # 先読みして、まとめて動かす同期移動の最大数 (0: 先読みしない)
+        self.lookahead = lookahead
+
+        # キューには、コマンドごとの`CmdFuture`を入れる
+        self._cmdq = CmdQueue(queue_maxsize, queue_policy, debug=self.__debug)
+        self.coalesce = coalesce
+        self._futures = CmdFutureTable(debug=self.__debug)
         self._active = False
-        self._busy_flag = False
 
         self._cmd_list = []
         for _c in self.CMD_SAMPLES_ALL:
@@ -163,6 +249,8 @@ class ThreadWorker(threading.Thread):
         if self._active:
             self._active = False
             self.clear_cmdq()
+            self.mservo.cancel_move()
+            self._cmdq.close()
             self.join()
 
         # off all servo
@@ -193,6 +281,52 @@ class ThreadWorker(threading.Thread):
         """Size of command queue."""
         return self._cmdq.qsize()
 
+    @property
+    def coalesce(self) -> bool:
+        """Coalescing mode."""
+        return self._cmdq.coalesce_key is not None
+
+    @coalesce.setter
+    def coalesce(self, flag: bool):
+        self._cmdq.coalesce_key = self._coalesce_key if flag else None
+
+    @property
+    def coalesced(self) -> int:
+        """Number of coalesced (dropped) commands."""
+        return self._cmdq.coalesced
+
+    def _coalesce_key(self, fut: CmdFuture) -> tuple | None:
+        """Coalesce key of queued command.
+
+        絶対位置のコマンドは、(種類, 動かすサーボの番号)。
+        それ以外は、None (置き換えない)。
+
+        e.g.
+        {"method": "move", "params": {"angles": [30, None, 0]}}
+        --> ("move_all_angles_sync", (0, 2))
+        """
+        _cmd = fut.cmd
+        _method = self.COALESCE_METHODS.get(_cmd.get("method"))
+        if _method is None:
+            return None
+
+        _params = _cmd.get("params")
+        if not isinstance(_params, dict):
+            return None
+        _values = _params.get(_method[1])
+        if not isinstance(_values, list):
+            return None
+
+        return (
+            _method[0],
+            tuple(_i for _i, _v in enumerate(_values) if _v is not None),
+        )
+
+    @property
+    def _busy_flag(self) -> bool:
+        """実行待ち、または実行中のコマンドがある。"""
+        return self._cmdq.busy
+
     def __del__(self):
         """del"""
         self._active = False
@@ -200,19 +334,47 @@ class ThreadWorker(threading.Thread):
 
     def clear_cmdq(self):
         """clear command queue"""
-        _count = 0
-        while not self._cmdq.empty():
-            _count += 1
-            _cmd = self._cmdq.get()
-            self.__log.debug("%2d:%s", _count, _cmd)
+        _futs = self._cmdq.clear()
+        for _i, _fut in enumerate(_futs):
+            _fut.set_cancelled()
+            self.__log.debug("%2d:%s", _i + 1, _fut.cmd)
 
-        self.__log.debug("count=%s", _count)
-        return _count
+        self.__log.debug("count=%s", len(_futs))
+        return len(_futs)
+
+    def _interrupt(self) -> int:
+        """実行中のコマンドだけを中断する (実行待ちのコマンドは残す)。
+
+        キューから取り出されていないコマンドの世代を、新しい世代にする。
+        取り出された(実行中、または実行直前の)コマンドだけが、
+        古い世代のまま残り、中断される。
+
+        Returns:
+            int: 新しい中断の世代。
+        """
+        with self._cmdq.lock:
+            _gen = self.mservo.cancel_move()
+            for _f in self._cmdq.items():
+                _f.gen = _gen
+        return _gen
 
     def mk_reply_result(
-        self, result: int | str | dict | None, req: str | dict
+        self,
+        result: int | str | dict | None,
+        req: str | dict,
+        req_id: int | str | None = None,
     ) -> dict:
-        """Make reply JSON string."""
+        """Make reply JSON string.
+
+        `req_id`: キューに入れたコマンドのID (`status`, `await`で使う)
+
+        キューの状態:
+            qsize: 実行待ちのコマンド数 (depth)
+            busy_flag: 実行待ち、または実行中のコマンドがある
+            high_water: qsizeの最大値 (high-water mark)
+            dropped: 上限に達して破棄したコマンド数 (累計)
+            coalesced: coalesce で破棄したコマンド数 (累計)
+        """
         self.__log.debug("result=%s", result)
 
         reply = {
@@ -220,9 +382,14 @@ class ThreadWorker(threading.Thread):
                 "value": result,
                 "qsize": self.qsize,
                 "busy_flag": self._busy_flag,
+                "high_water": self._cmdq.high_water,
+                "dropped": self._cmdq.dropped,
+                "coalesced": self.coalesced,
                 "request": req,
             }
         }
+        if req_id is not None:
+            reply["result"]["id"] = req_id
         self.__log.debug("reply=%s", reply)
         return reply
 
@@ -246,6 +413,7 @@ class ThreadWorker(threading.Thread):
 
     def send(self, cmd_data: str | dict) -> dict:
         """Send cmd_data(JSON)"""
+        _t0 = time.monotonic()  # "estop"の遅れの基準
         self.__log.debug("cmd_data=%s", cmd_data)
         try:
             if isinstance(cmd_data, str):
@@ -279,8 +447,13 @@ class ThreadWorker(threading.Thread):
 
             # コマンドごとの処理
             # キューに入れない特別な処理を先に行う
+            if cmd_name == self.CMD_ESTOP:  # 非常停止 (最優先)
+                return self._estop(cmd_json, cmd_data, _t0)
+
             if cmd_name == self.CMD_CANCEL:  # キャンセル
+                # キューを空にして、実行中の移動・sleepも中断する
                 _count = self.clear_cmdq()
+                self.mservo.cancel_move()
                 _ret = self.mk_reply_result(_count, cmd_data)
                 self.__log.debug("%s: _ret=%s", cmd_name, _ret)
                 return _ret
@@ -292,18 +465,67 @@ class ThreadWorker(threading.Thread):
 
             if cmd_name == self.CMD_WAIT:  # Wait
                 # すべてのコマンドが終了するまで待つ
-                while self._busy_flag or self.qsize > 0:
-                    self.__log.debug("waiting..")
-                    time.sleep(0.3)
+                # (最後のコマンドが終わった時点で、通知される)
+                # `timeout`を過ぎたら、終わっていなくても返る
+                # (返り値の"busy_flag"で分かる)
+                _params = cmd_json.get("params") or {}
+                self._cmdq.join(_params.get("timeout"))
                 _ret = self.mk_reply_result(self.qsize, cmd_data)
                 self.__log.debug("%s: _ret=%s", cmd_name, _ret)
                 return _ret
 
-            # 通常のコマンドは、コマンドキューに入れる。
-            self._cmdq.put(cmd_json)
+            if cmd_name in (self.CMD_STATUS, self.CMD_AWAIT):
+                return self._reply_status(cmd_name, cmd_json, cmd_data)
+
+            if cmd_name == self.CMD_STATS:  # 統計
+                return self._stats(cmd_json, cmd_data)
+
+            try:
+                _prio = CmdQueue.priority(cmd_json.get("priority"))
+            except ValueError as _e:
+                return self.mk_reply_error("INVALID_PARAM", str(_e), cmd_json)
+
+            # 通常のコマンドは、IDをつけて、コマンドキューに入れる。
+            # "id"が指定されていれば、それを使う
+            # (終わっていないコマンドのIDと重なる場合は、何もせずにエラー)。
+            try:
+                _fut = self._futures.new(
+                    cmd_name, cmd_json, cmd_json.get("id")
+                )
+            except ValueError as _e:
+                return self.mk_reply_error("INVALID_PARAM", str(_e), cmd_json)
+
+            # "preempt": 実行中・実行待ちのコマンドを破棄して、割り込む。
+            # 実行中の移動は次のステップの前で止まり、
+            # 新しい目標への軌道は、その時点の位置から計画し直される。
+            _params = cmd_json.get("params")
+            if isinstance(_params, dict) and _params.get("preempt"):
+                _count = self.clear_cmdq()
+                self.mservo.cancel_move()
+                self.__log.debug("preempt: cancelled %s commands", _count)
+
+            elif _prio == CmdQueue.PRIO_EMERGENCY:
+                # 実行待ちのコマンドは残し、実行中の移動だけを中断する
+                self._interrupt()
+
+            # 中断の世代を記録して、この後に中断されたら実行しない。
+            _fut.gen = self.mservo.cancel_gen
+            try:
+                _old = self._cmdq.put(_fut, _prio)
+            except queue.Full as _e:
+                _fut.set_cancelled()
+                return self.mk_reply_error("QUEUE_FULL", str(_e), cmd_json)
+            if _old is not None:
+                # coalesce, drop_oldest, drop_newest: 実行せずに破棄
+                _old.set_cancelled()
             self.__log.debug(
-                "cmd_json=%s, qsize=%s", cmd_json, self._cmdq.qsize()
+                "id=%s, prio=%s, cmd_json=%s, qsize=%s",
+                _fut.id,
+                _prio,
+                cmd_json,
+                self._cmdq.qsize(),
             )
+            return self.mk_reply_result(None, cmd_data, _fut.id)
 
         except Exception as _e:
             self.__log.error("%s: %s", type(_e).__name__, _e)
@@ -311,14 +533,101 @@ class ThreadWorker(threading.Thread):
         _ret = self.mk_reply_result(None, cmd_data)
         return _ret
 
+    def _estop(self, cmd_json: dict, cmd_data: str | dict, t0: float) -> dict:
+        """`estop`コマンドの処理.
+
+        e.g.
+        {"method": "estop", "params": {"mode": "off"}}
+
+        キューを空にして、実行中の移動を止め、
+        "hold": その位置に留める (default)。
+        "off": すべてのサーボをオフにする。
+
+        結果の"value":
+        {
+          "mode": "off",
+          "latency_sec": 0.0003,  # send()を呼んでから停止するまで
+          "cancelled": 3  # 破棄したコマンド数
+        }
+        """
+        _params = cmd_json.get("params") or {}
+        _mode = _params.get("mode", self.mservo.ESTOP_HOLD)
+        if _mode not in self.mservo.ESTOP_MODES:
+            return self.mk_reply_error(
+                "INVALID_PARAM", f"invalid mode: {_mode!r}", cmd_json
+            )
+
+        _count = self.clear_cmdq()
+        _value = dict(self.mservo.estop(_mode, t0))
+        _value["cancelled"] = _count
+
+        _ret = self.mk_reply_result(_value, cmd_data)
+        self.__log.debug("%s: _ret=%s", self.CMD_ESTOP, _ret)
+        return _ret
+
+    def _stats(self, cmd_json: dict, cmd_data: str | dict) -> dict:
+        """`stats`コマンドの処理.
+
+        e.g.
+        {"method": "stats", "params": {"reset": true}}
+
+        結果の"value":
+        {
+          "write": {"written": 120, "skipped": 40},  # MultiServo.write_stats
+          "last_move": {"step_n": 25, ...}  # MultiServo.last_move_stats
+        }
+        `reset`が`true`の場合は、返した後で統計をリセットする。
+        """
+        _params = cmd_json.get("params") or {}
+        _value = {
+            "write": dict(self.mservo.write_stats),
+            "last_move": dict(self.mservo.last_move_stats),
+        }
+        if _params.get("reset"):
+            self.mservo.reset_write_stats()
+
+        _ret = self.mk_reply_result(_value, cmd_data)
+        self.__log.debug("%s: _ret=%s", self.CMD_STATS, _ret)
+        return _ret
+
+    def _reply_status(
+        self, cmd_name: str, cmd_json: dict, cmd_data: str | dict
+    ) -> dict:
+        """`status`, `await`コマンドの処理.
+
+        e.g.
+        {"method": "status", "params": {"id": 3}}
+        {"method": "await", "params": {"id": 3, "timeout": 5.0}}
+
+        `await`は、そのコマンドが終わるまで(またはタイムアウトまで)待つ。
+        結果の"value"は、`CmdFuture.to_dict()`。
+        """
+        _params = cmd_json.get("params") or {}
+        _req_id = _params.get("id")
+        _fut = self._futures.get(_req_id)
+        if _fut is None:
+            return self.mk_reply_error(
+                "INVALID_PARAM", f"Unknown id: {_req_id}", cmd_json
+            )
+
+        if cmd_name == self.CMD_AWAIT:
+            _fut.wait(_params.get("timeout"))
+
+        _ret = self.mk_reply_result(_fut.to_dict(), cmd_data, _fut.id)
+        self.__log.debug("%s: _ret=%s", cmd_name, _ret)
+        return _ret
+
     def recv(self, timeout=DEF_RECV_TIMEOUT):
-        """Receive command form queue."""
-        try:
-            _cmd_data = self._cmdq.get(timeout=timeout)
-        except queue.Empty:
-            _cmd_data = ""
+        """Receive command form queue.
 
-        return _cmd_data
+        Args:
+            timeout (float | None): None: コマンドが来るまで待つ。
+        """
+        _fut = self._cmdq.get(timeout=timeout)
+        if _fut is None:
+            return ""
+
+        return _fut.cmd
 
     def _handle_move_all_angles_sync(self, cmd: dict):
         """Handle move_all_angles_sync().
@@ -329,7 +638,9 @@ class ThreadWorker(threading.Thread):
           "params:": {
             "angles": [30, None, -30, 0],
             "move_sec": 0.2,  # optional
-            "step_n": 40  # optional
+            "step_n": 40,  # optional
+            "profile": "ease",  # optional
+            "preempt": true  # optional (send()で処理)
           }
         }
         """
@@ -342,17 +653,21 @@ class ThreadWorker(threading.Thread):
             _step_n = _params.get("step_n")
             if _step_n is None:
                 _step_n = self.step_n
+            _profile = _params.get("profile")
 
         except Exception as _e:
             self.__log.error("%s: %s", type(_e).__name__, _e)
             return
 
-        self.mservo.move_all_angles_sync(_angles, _move_sec, _step_n)
+        self.mservo.move_all_angles_sync(
+            _angles, _move_sec, _step_n, _profile
+        )
         self._sleep_interval()
+        return dict(self.mservo.last_move_stats)
 
     def _handle_move_a_a_s_r(self, cmd: dict):
         """Alias of _handle_move_all_angles_sync_relative()."""
-        self._handle_move_all_angles_sync_relative(cmd)
+        return self._handle_move_all_angles_sync_relative(cmd)
 
     def _handle_move_all_angles_sync_relative(self, cmd: dict):
         """Handle move_all_angles_sync_relative().
@@ -363,7 +678,8 @@ class ThreadWorker(threading.Thread):
           "params": {
             "angle_diffs": [10, -10, 0, 0],
             "move_sec": 0.2,  # optional
-            "step_n": 40  # optional
+            "step_n": 40,  # optional
+            "profile": "ease"  # optional
           }
         }
         """
@@ -376,14 +692,16 @@ class ThreadWorker(threading.Thread):
             _step_n = _params.get("step_n")
             if _step_n is None:
                 _step_n = self.step_n
+            _profile = _params.get("profile")
         except Exception as _e:
             self.__log.error("%s: %s", type(_e).__name__, _e)
             return
 
         self.mservo.move_all_angles_sync_relative(
-            _angle_diffs, _move_sec, _step_n
+            _angle_diffs, _move_sec, _step_n, _profile
         )
         self._sleep_interval()
+        return dict(self.mservo.last_move_stats)
 
     def _handle_move_all_angles(self, cmd: dict):
         """Handle move_all_angles().
@@ -476,10 +794,21 @@ class ThreadWorker(threading.Thread):
             "n": 40
           }
         }
+
+        * "n"の代わりに、"step_n"も使える。
+        * null または "auto" の場合は、自動。
+        * それ以外は、1以上の整数 (0などはエラーで、変更しない)
         """
         try:
             _params = cmd["params"]
-            self.step_n = int(_params["n"])
+            _n = _params["n"] if "n" in _params else _params["step_n"]
+            if _n is None or str(_n).lower() == self.STEP_N_AUTO:
+                self.step_n = None
+            else:
+                _n = int(_n)
+                if _n < 1:
+                    raise ValueError(f"invalid step_n: {_n}")
+                self.step_n = _n
             self.__log.debug("step_n=%s", self.step_n)
         except Exception as _e:
             self.__log.error("%s: %s", type(_e).__name__, _e)
@@ -518,7 +847,8 @@ class ThreadWorker(threading.Thread):
             _sec = float(_params["sec"])
             self.__log.debug("sleep: %s sec", _sec)
             if _sec > 0.0:
-                time.sleep(_sec)
+                # cancelで中断できるように
+                self.mservo.wait_cancel(_sec)
         except Exception as _e:
             self.__log.error("%s: %s", type(_e).__name__, _e)
 
@@ -526,7 +856,7 @@ class ThreadWorker(threading.Thread):
         """sleep interval"""
         if self.interval_sec > 0:
             self.__log.debug("sleep interval_sec: %s sec", self.interval_sec)
-            time.sleep(self.interval_sec)
+            self.mservo.wait_cancel(self.interval_sec)
 
     def _handle_move_pulse_relative(self, cmd: dict):
         """Handle move pulse relative.
@@ -593,9 +923,97 @@ class ThreadWorker(threading.Thread):
 
         handler = self._command_handlers.get(_cmd_str)
         if handler:
-            handler(cmd_data)
-        else:
-            self.__log.error("unknown command: %s", cmd_data)
+            return handler(cmd_data)
+
+        self.__log.error("unknown command: %s", cmd_data)
+        return None
+
+    def _path_params(self, cmd: dict) -> dict | None:
+        """まとめて動かせる同期移動のパラメータ.
+
+        ステップ数が自動の`move`(`move_all_angles_sync`)だけが対象。
+
+        Returns:
+            dict | None: パラメータ (None: 対象外)。
+        """
+        if cmd.get("method") not in ("move", "move_all_angles_sync"):
+            return None
+        _params = cmd.get("params")
+        if not isinstance(_params, dict):
+            return None
+        if not isinstance(_params.get("angles"), list):
+            return None
+        if _params.get("step_n") is not None or self.step_n is not None:
+            return None
+        return _params
+
+    def _get_lookahead(self, fut: CmdFuture) -> list[CmdFuture]:
+        """続いて実行待ちになっている同期移動を取り出す。
+
+        プロファイルと中断の世代が同じものだけをまとめる。
+        """
+        if self.lookahead <= 0:
+            return []
+        if self.interval_sec > 0:
+            # 移動ごとに`interval_sec`止まる必要がある
+            return []
+
+        _params = self._path_params(fut.cmd)
+        if _params is None:
+            return []
+        _profile = _params.get("profile")
+
+        def _pred(_f: CmdFuture) -> bool:
+            if _f.gen != fut.gen:
+                return False
+            _p = self._path_params(_f.cmd)
+            return _p is not None and _p.get("profile") == _profile
+
+        return self._cmdq.get_while(_pred, self.lookahead)
+
+    def _exec_path(self, futs: list[CmdFuture]) -> tuple[dict, int]:
+        """Execute merged moves.
+
+        複数の同期移動を、途中で止まらない一つの軌道として動かす。
+
+        Returns:
+            tuple[dict, int]:
+                移動の統計(`MultiServo.last_move_stats`)と、
+                通過できた移動の数(中断されなければ`len(futs)`)。
+        """
+        _waypoints = []
+        _move_secs = []
+        for _f in futs:
+            _params = _f.cmd["params"]
+            _waypoints.append(_params["angles"])
+            _move_sec = _params.get("move_sec")
+            _move_secs.append(
+                self.move_sec if _move_sec is None else _move_sec
+            )
+        _profile = futs[0].cmd["params"].get("profile")
+        self.__log.debug(
+            "ids=%s, move_secs=%s", [_f.id for _f in futs], _move_secs
+        )
+
+        _t0 = time.monotonic()
+        self.mservo.move_all_angles_sync_path(
+            _waypoints, _move_secs, None, _profile
+        )
+        _result = dict(self.mservo.last_move_stats)
+        if not self.mservo.cancel_event.is_set():
+            return _result, len(futs)
+
+        # 中断された: 経過時間までに通過した移動だけを、終わったとする
+        _elapsed = time.monotonic() - _t0
+        _n_done = 0
+        _sec = 0.0
+        for _move_sec in _move_secs:
+            _sec += _move_sec
+            if _sec > _elapsed:
+                break
+            _n_done += 1
+        self.__log.debug("interrupted: n_done=%s", _n_done)
+        return _result, _n_done
 
     def run(self):
         """run"""
@@ -604,18 +1022,46 @@ class ThreadWorker(threading.Thread):
         self._active = True
 
         while self._active:
-            if self.qsize == 0:
-                self._busy_flag = False
-            _cmd_data = self.recv()
-            if not _cmd_data:
+            # コマンドが来るまで(または`end()`まで)、ブロックして待つ
+            _fut = self._cmdq.get()
+            if _fut is None:
+                continue
+
+            # キューに入れた後に中断(cancel, preempt, estop)されたコマンドは
+            # 実行しない。世代が同じ場合だけ、中断状態を解除する
+            # (取り出してから解除するまでの中断も、取り消さない)。
+            if not self.mservo.clear_cancel(_fut.gen):
+                self.__log.debug("cancelled: id=%s", _fut.id)
+                _fut.set_cancelled()
+                self._cmdq.task_done()
                 continue
-            self._busy_flag = True
 
-            self.__log.debug("qsize=%s", self._cmdq.qsize())
+            # 続く同期移動を先読みして、まとめて実行する
+            _futs = [_fut, *self._get_lookahead(_fut)]
+
+            self.__log.debug(
+                "id=%s, n=%s, qsize=%s", _fut.id, len(_futs), self.qsize
+            )
+            for _f in _futs:
+                _f.set_running()
             try:
-                self._dispatch_cmd(_cmd_data)
+                if len(_futs) > 1:
+                    _result, _n_done = self._exec_path(_futs)
+                else:
+                    _result, _n_done = self._dispatch_cmd(_fut.cmd), 1
+                for _f in _futs[:_n_done]:
+                    _f.set_done(_result)
+                for _f in _futs[_n_done:]:
+                    _f.set_cancelled()
 
             except Exception as _e:
                 self.__log.error("%s: %s", type(_e).__name__, _e)
+                for _f in _futs:
+                    _f.set_done(error=errmsg(_e))
+
+            finally:
+                # `wait`, `await`で待っているスレッドに通知される
+                for _ in _futs:
+                    self._cmdq.task_done()
 
         self.__log.debug("done")
@@ -3,29 +3,154 @@
 #
 """API Client."""
 
+import asyncio
 import json
+import socket
+import threading
+from concurrent.futures import Future
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
 
 from pi0servo import get_logger
 
 
+class _UnixHTTPConnection(HTTPConnection):
+    """HTTP connection over a Unix domain socket."""
+
+    def __init__(self, *args, uds_path: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.uds_path = uds_path
+
+    def _new_conn(self) -> socket.socket:
+        _sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        _sock.settimeout(self.timeout)
+        _sock.connect(self.uds_path)
+        return _sock
+
+
+class _UnixHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _UnixHTTPConnection
+
+
+class UnixSocketAdapter(HTTPAdapter):
+    """`requests`のアダプター: URLのホストではなく、
+    Unixドメインソケット(`uds_path`)に接続する。
+    """
+
+    def __init__(self, uds_path: str, pool_maxsize=1):
+        self.uds_path = uds_path
+        self._pool = _UnixHTTPConnectionPool(
+            "localhost", maxsize=pool_maxsize, uds_path=uds_path
+        )
+        super().__init__(pool_connections=1, pool_maxsize=pool_maxsize)
+
+    def get_connection_with_tls_context(
+        self, request, verify, proxies=None, cert=None
+    ):
+        return self._pool
+
+    def get_connection(self, url, proxies=None):
+        """requests < 2.32.2"""
+        return self._pool
+
+    def close(self):
+        self._pool.close()
+        super().close()
+
+
 class ApiClient:
     """API Client.
 
     POST method
+
+    `keep_alive=True`: `requests.Session`で接続を使い回す
+    (コマンドごとに、TCPの接続をしない)。
+
+    `uds`: 同じホストの`api-server --uds`に、Unixドメインソケットで送る
+    (TCPを通さない。`keep_alive`になる)。`url`のパス("/cmd")は使う。
+
+    `submit()`: コマンドをためて、JSON配列として、まとめて送る
+    (`/cmd`は配列を受け付ける)。
+    `batch_max`個たまるか、最初のコマンドから`batch_sec`秒たつと送る。
+    どちらも0の場合は、`flush()`を呼んだときに送る。
     """
 
     DEF_URL = "http://localhost:8000/cmd"
     HEADERS = {"content-type": "application/json"}
+    DEF_TIMEOUT = 10.0  # sec
 
-    def __init__(self, url=DEF_URL, debug=False) -> None:
-        """Constractor."""
+    def __init__(
+        self,
+        url=DEF_URL,
+        keep_alive=False,
+        batch_max=0,
+        batch_sec=0.0,
+        timeout=DEF_TIMEOUT,
+        pool_size=1,
+        uds: str | None = None,
+        debug=False,
+    ) -> None:
+        """Constractor.
+
+        Args:
+            url (str): `/cmd`のURL。
+            keep_alive (bool): 接続を使い回す。
+            batch_max (int): `submit()`で、この数たまったら送る(0: 無制限)。
+            batch_sec (float): `submit()`で、この時間がたったら送る
+                (0: 時間では送らない)。
+            timeout (float): 1回のPOSTのタイムアウト(秒)。
+            pool_size (int): 使い回す接続の数
+                (複数のスレッドから、同時に送る場合)。
+            uds (str | None): Unixドメインソケットのパス。
+        """
         self._debug = debug
         self.__log = get_logger(self.__class__.__name__, self._debug)
-        self.__log.debug("url=%s", url)
+        self.__log.debug("url=%s, keep_alive=%s", url, keep_alive)
+        self.__log.debug("uds=%s", uds)
+        self.__log.debug("batch_max=%s, batch_sec=%s", batch_max, batch_sec)
 
         self.url = url
+        self.timeout = timeout
+        self.batch_max = batch_max
+        self.batch_sec = batch_sec
+
+        self.uds = uds
+
+        self._session: requests.Session | None = None
+        if keep_alive or uds:
+            self._session = requests.Session()
+            self._session.headers.update(self.HEADERS)
+            _adapter: HTTPAdapter
+            if uds:
+                _adapter = UnixSocketAdapter(uds, max(pool_size, 1))
+            else:
+                _adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=max(pool_size, 1)
+                )
+            self._session.mount("http://", _adapter)
+            self._session.mount("https://", _adapter)
+
+        self._batch: list[tuple[dict, Future]] = []
+        self._batch_lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # 送る順番を守る
+        self._timer: threading.Timer | None = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+    def close(self):
+        """ためたコマンドを送って、接続を閉じる。"""
+        self.__log.debug("")
+        self.flush()
+        if self._session is not None:
+            self._session.close()
+            self._session = None
 
     def mk_result_json(
         self,
@@ -53,9 +178,17 @@ class ApiClient:
             post_data = json.dumps(data_json)
             self.__log.debug("post_data=%a", post_data)
 
-            res = requests.post(
-                self.url, data=post_data, headers=self.HEADERS, timeout=10
-            )
+            if self._session is not None:
+                res = self._session.post(
+                    self.url, data=post_data, timeout=self.timeout
+                )
+            else:
+                res = requests.post(
+                    self.url,
+                    data=post_data,
+                    headers=self.HEADERS,
+                    timeout=self.timeout,
+                )
             self.__log.debug("res=%s", json.dumps(res.json()))
             return res.json()
 
@@ -68,3 +201,108 @@ class ApiClient:
             _msg = f"{type(_e).__name__}: {_e}"
             self.__log.error(_msg)
             return self.mk_result_json("ERR", data_json, _msg)
+
+    def submit(self, cmd: dict) -> Future:
+        """コマンドをためる (batch).
+
+        Returns:
+            Future: 送った後に、このコマンドの返り値(dict)になる。
+        """
+        _fut: Future = Future()
+        with self._batch_lock:
+            self._batch.append((cmd, _fut))
+            _full = self.batch_max > 0 and len(self._batch) >= self.batch_max
+            if not _full and self.batch_sec > 0 and self._timer is None:
+                self._timer = threading.Timer(self.batch_sec, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if _full:
+            self.flush()
+        return _fut
+
+    def flush(self) -> int:
+        """ためたコマンドを、JSON配列として、まとめて送る。
+
+        Returns:
+            int: 送ったコマンドの数。
+        """
+        with self._flush_lock:
+            with self._batch_lock:
+                _items, self._batch = self._batch, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not _items:
+                return 0
+
+            self.__log.debug("flush %s commands", len(_items))
+            _ret = self.post([_cmd for _cmd, _ in _items])
+
+        if isinstance(_ret, list) and len(_ret) == len(_items):
+            for (_, _fut), _res in zip(_items, _ret, strict=True):
+                _fut.set_result(_res)
+        else:
+            # 1つだけの場合は、配列ではなく、そのまま返る
+            # (エラーの場合は、すべてのコマンドに同じ返り値)
+            for _, _fut in _items:
+                _fut.set_result(_ret)
+        return len(_items)
+
+
+class AsyncApiClient:
+    """API Client (asyncio).
+
+    `await post()`を、同時にいくつも送れる(`asyncio.gather()`など)。
+    POSTは、接続を使い回す`ApiClient`で、別のスレッドから送る。
+    同時に送る数は、`max_inflight`まで。
+    """
+
+    DEF_MAX_INFLIGHT = 8
+
+    def __init__(
+        self,
+        url=ApiClient.DEF_URL,
+        max_inflight=DEF_MAX_INFLIGHT,
+        timeout=ApiClient.DEF_TIMEOUT,
+        uds: str | None = None,
+        debug=False,
+    ) -> None:
+        """Constractor."""
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug("url=%s, max_inflight=%s", url, max_inflight)
+
+        self.max_inflight = max_inflight
+        self._client = ApiClient(
+            url,
+            keep_alive=True,
+            timeout=timeout,
+            pool_size=max_inflight,
+            uds=uds,
+            debug=self._debug,
+        )
+        self._sem = asyncio.Semaphore(max_inflight)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_exc):
+        self.close()
+
+    @property
+    def url(self) -> str:
+        """`/cmd`のURL"""
+        return self._client.url
+
+    def close(self):
+        """接続を閉じる。"""
+        self._client.close()
+
+    async def post(self, data_json) -> dict:
+        """Send command(s).
+
+        返り値は、`ApiClient.post()`と同じ。
+        """
+        async with self._sem:
+            return await asyncio.to_thread(self._client.post, data_json)
@@ -3,50 +3,266 @@
 #
 """pi0servo JSON API Server."""
 
+import asyncio
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from typing import Any
 
 import pigpio
-from fastapi import Body, FastAPI, Request
+from fastapi import Body, FastAPI, Request, WebSocket, WebSocketDisconnect
 
-from pi0servo import ThreadWorker, get_logger
+from pi0servo import StrCmdToJson, ThreadWorker, errmsg, get_logger
+from pi0servo.helper.cmd_future import CmdFuture
+from pi0servo.helper.cmd_queue import CmdQueue
+from pi0servo.helper.group_router import GroupRouter
+from pi0servo.helper.shm_executor import ShmExecutor
+from pi0servo.web.udp_pose import UdpPoseServer
 
 
 class JsonApi:
     """Main class for Web Application"""
 
-    def __init__(self, pins, debug=False):
-        """constractor"""
+    # すぐに返るコマンド:
+    # 専用のスレッドで実行する
+    # (`wait`などで、ほかのスレッドが埋まっていても、止められるように)
+    CONTROL_METHODS = ThreadWorker.CONTROL_METHODS
+    CONTROL_WORKERS = 2
+
+    # 終わるまで待つコマンド:
+    # 専用のスレッドで、`WAIT_SLICE_SEC`ずつ待つ
+    # (スレッドを長い時間ふさがない)
+    WAIT_METHODS = ThreadWorker.WAIT_METHODS
+    WAIT_WORKERS = 16
+    WAIT_SLICE_SEC = 1.0
+
+    def __init__(
+        self,
+        pins,
+        coalesce=False,
+        queue_maxsize=0,
+        queue_policy=CmdQueue.DEF_POLICY,
+        lookahead=0,
+        use_script=False,
+        trust_daemon=False,
+        groups: dict[str, list[int]] | None = None,
+        separate_pi=False,
+        isolate=False,
+        udp_port: int | None = None,
+        udp_host="0.0.0.0",
+        debug=False,
+    ):
+        """constractor
+
+        `pins`は"default"グループになる。
+        `groups`(グループ名 -> ピン番号)を指定すると、
+        グループごとに別のキューで、同時に動かせる(`GroupRouter`)。
+        `isolate=True`の場合、サーボを動かすワーカーを別のプロセスで動かし、
+        共有メモリでコマンドを受け渡す(`ShmExecutor`)。
+        `udp_port`を指定すると、UDPで姿勢のフレームを受け付ける
+        (`UdpPoseServer`)。フレームを latest-wins で実行するため、
+        coalesce モードになる。
+        `use_script=True`の場合、同期移動の軌道を、
+        pigpioのスクリプトとしてデーモン側で再生する(`MultiServo`)。
+        `trust_daemon=True`の場合、現在のパルス幅を、毎回pigpiodから読み出す
+        (ほかのプロセスもサーボを動かす場合)。
+        """
         self._debug = debug
         self.__log = get_logger(self.__class__.__name__, self._debug)
 
         self.pins = pins
 
-        self.__log.debug("pins=%s", self.pins)
+        self.__log.debug("pins=%s, coalesce=%s", self.pins, coalesce)
+        self.__log.debug(
+            "queue_maxsize=%s, queue_policy=%s", queue_maxsize, queue_policy
+        )
+        self.__log.debug("lookahead=%s, use_script=%s", lookahead, use_script)
+        self.__log.debug("trust_daemon=%s", trust_daemon)
+        self.__log.debug("groups=%s, separate_pi=%s", groups, separate_pi)
+        self.__log.debug("isolate=%s", isolate)
+        self.__log.debug("udp_host=%s, udp_port=%s", udp_host, udp_port)
+
+        if udp_port is not None and not coalesce:
+            self.__log.info("UDP pose frames: coalesce mode")
+            coalesce = True
+
+        _groups: dict[str, list[int]] = {}
+        if self.pins:
+            _groups[GroupRouter.DEF_GROUP] = list(self.pins)
+        _groups.update(groups or {})
+
+        _router_class = ShmExecutor if isolate else GroupRouter
+        self.router: GroupRouter | ShmExecutor = _router_class(
+            _groups,
+            pigpio.pi,
+            separate_pi=separate_pi,
+            coalesce=coalesce,
+            queue_maxsize=queue_maxsize,
+            queue_policy=queue_policy,
+            lookahead=lookahead,
+            use_script=use_script,
+            trust_daemon=trust_daemon,
+            debug=self._debug,
+        )
+        self.router.start()
+
+        self._control_pool = ThreadPoolExecutor(
+            self.CONTROL_WORKERS, thread_name_prefix="control"
+        )
+        self._wait_pool = ThreadPoolExecutor(
+            self.WAIT_WORKERS, thread_name_prefix="wait"
+        )
+
+        # `/str`, `/ws`の文字列コマンド用 (同じ文字列の解析結果を使い回す)
+        self.str_parser = StrCmdToJson(
+            cache_size=StrCmdToJson.DEF_CACHE_SIZE, debug=self._debug
+        )
+
+        self.udp_server: UdpPoseServer | None = None
+        if udp_port is not None:
+            try:
+                self.udp_server = UdpPoseServer(
+                    self.router.send,
+                    {_name: len(_pins) for _name, _pins in _groups.items()},
+                    udp_host,
+                    udp_port,
+                    debug=self._debug,
+                )
+            except Exception:
+                self.router.end()
+                self._shutdown_pools()
+                raise
+            self.udp_server.start()
 
-        self.pi = pigpio.pi()
-        if not self.pi.connected:
-            raise ConnectionError("pigpio daemon")
-
-        self.thr_worker = ThreadWorker(self.pi, self.pins, debug=self._debug)
-        self.thr_worker.start()
         self.__log.info("Ready")
 
+    @property
+    def thr_worker(self) -> ThreadWorker | None:
+        """`ThreadWorker` of the default group (None: isolated)."""
+        if isinstance(self.router, ShmExecutor):
+            return None
+        return self.router.worker()
+
     def end(self):
         """end"""
-        self.thr_worker.end()
+        if self.udp_server is not None:
+            self.udp_server.end()
+        self.router.end()
+        self._shutdown_pools()
         self.__log.info("done")
 
+    def _shutdown_pools(self):
+        """`router.end()`の後 (待っているコマンドは、もう返っている)"""
+        self._control_pool.shutdown(wait=False, cancel_futures=True)
+        self._wait_pool.shutdown(wait=False, cancel_futures=True)
+
     def send_cmdjson(self, cmdjson: dict) -> dict:
-        """send JSON command to thread worker"""
+        """send JSON command to thread worker (routed by "group")"""
         self.__log.debug("cmdjson=%s", cmdjson)
 
-        _res: dict = self.thr_worker.send(cmdjson)
+        _res: dict = self.router.send(cmdjson)
 
         return _res
 
+    def send_cmdlist(self, cmd_list: list[dict]) -> list[dict]:
+        """send JSON commands in order (blocking)"""
+        _res = []
+        for _c in cmd_list:
+            _res1: dict = self.send_cmdjson(_c)
+            self.__log.debug("_c=%s, _res1=%s", _c, _res1)
+            _res.append(_res1)
+        return _res
+
+    async def send_cmdjson_async(self, cmdjson: dict) -> dict:
+        """send JSON command without blocking the event loop
+
+        * `CONTROL_METHODS`: 専用のスレッドで実行する。
+        * `WAIT_METHODS`: 専用のスレッドで、少しずつ待つ。
+        * そのほか: 共有のスレッドで実行する
+          (キューが一杯のとき、"block"ポリシーでは、空くまで待つ)。
+        """
+        _method = cmdjson.get("method") if isinstance(cmdjson, dict) else None
+        _loop = asyncio.get_running_loop()
+
+        if _method in self.CONTROL_METHODS:
+            return await _loop.run_in_executor(
+                self._control_pool, self.send_cmdjson, cmdjson
+            )
+
+        if _method in self.WAIT_METHODS:
+            return await self._send_wait(cmdjson)
+
+        return await asyncio.to_thread(self.send_cmdjson, cmdjson)
+
+    async def send_cmdlist_async(self, cmd_list: list[dict]) -> list[dict]:
+        """send JSON commands in order without blocking the event loop"""
+        _res = []
+        for _c in cmd_list:
+            _res1: dict = await self.send_cmdjson_async(_c)
+            self.__log.debug("_c=%s, _res1=%s", _c, _res1)
+            _res.append(_res1)
+        return _res
+
+    async def _send_wait(self, cmdjson: dict) -> dict:
+        """`wait`, `await`.
+
+        `"timeout"`が指定されていれば、そのまま送る。
+        指定されていなければ、`WAIT_SLICE_SEC`のタイムアウトで、
+        終わるまで繰り返す。
+        """
+        _loop = asyncio.get_running_loop()
+        _params = cmdjson.get("params") or {}
+        if not isinstance(_params, dict) or "timeout" in _params:
+            return await _loop.run_in_executor(
+                self._wait_pool, self.send_cmdjson, cmdjson
+            )
+
+        _slice = {
+            **cmdjson,
+            "params": {**_params, "timeout": self.WAIT_SLICE_SEC},
+        }
+        while True:
+            _ret = await _loop.run_in_executor(
+                self._wait_pool, self.send_cmdjson, _slice
+            )
+            if self.wait_finished(cmdjson["method"], _ret):
+                break
+
+        _result = _ret.get("result")
+        if isinstance(_result, dict) and "request" in _result:
+            _result["request"] = cmdjson
+        return _ret
+
+    @classmethod
+    def wait_finished(cls, method: str, reply: dict) -> bool:
+        """`wait`, `await`の返り値から、終わったかどうかを調べる。
+
+        エラーは、終わったとする。
+        """
+        _result = reply.get("result") if isinstance(reply, dict) else None
+        if not isinstance(_result, dict):
+            return True
+
+        _value = _result.get("value")
+        if method == ThreadWorker.CMD_AWAIT:
+            if not isinstance(_value, dict):
+                return True
+            return _value.get("state") in (
+                CmdFuture.DONE,
+                CmdFuture.CANCELLED,
+            )
+
+        if "busy_flag" in _result:
+            return not _result["busy_flag"]
+
+        # グループ名ごとの返り値 (`GroupRouter`のブロードキャスト)
+        if isinstance(_value, dict):
+            return all(
+                cls.wait_finished(method, _r) for _r in _value.values()
+            )
+        return True
+
 
 # --- FastAPI Lifespan Management ---
 @asynccontextmanager
@@ -54,16 +270,51 @@ async def lifespan(app: FastAPI):
     """Lifespan manager for the application"""
 
     # --- get options from envron variables ---
-    pins_str = str(os.getenv("PI0SERVO_PINS"))
-    pins = [int(p.strip()) for p in pins_str.split(",")]
+    pins_str = os.getenv("PI0SERVO_PINS", "")
+    pins = [int(p.strip()) for p in pins_str.split(",") if p.strip()]
 
     debug_str = os.getenv("PI0SERVO_DEBUG", "0")
     debug = debug_str == "1"
 
-    log = get_logger(__name__, debug)
-    log.debug("pins=%s, debug=%s", pins, debug)
+    coalesce = os.getenv("PI0SERVO_COALESCE", "0") == "1"
+    queue_maxsize = int(os.getenv("PI0SERVO_QUEUE_MAX", "0"))
+    queue_policy = os.getenv("PI0SERVO_QUEUE_POLICY", CmdQueue.DEF_POLICY)
+    lookahead = int(os.getenv("PI0SERVO_LOOKAHEAD", "0"))
+    use_script = os.getenv("PI0SERVO_USE_SCRIPT", "0") == "1"
+    trust_daemon = os.getenv("PI0SERVO_TRUST_DAEMON", "0") == "1"
+    groups = GroupRouter.parse_groups(os.getenv("PI0SERVO_GROUPS", ""))
+    separate_pi = os.getenv("PI0SERVO_SEPARATE_PI", "0") == "1"
+    isolate = os.getenv("PI0SERVO_ISOLATE", "0") == "1"
+    udp_port_str = os.getenv("PI0SERVO_UDP_PORT", "")
+    udp_port = int(udp_port_str) if udp_port_str else None
+    udp_host = os.getenv("PI0SERVO_UDP_HOST", "0.0.0.0")
 
-    app.state.json_app = JsonApi(pins, debug=debug)
+    log = get_logger(__name__, debug)
+    log.debug("pins=%s, coalesce=%s, debug=%s", pins, coalesce, debug)
+    log.debug(
+        "queue_maxsize=%s, queue_policy=%s", queue_maxsize, queue_policy
+    )
+    log.debug("lookahead=%s, use_script=%s", lookahead, use_script)
+    log.debug("trust_daemon=%s", trust_daemon)
+    log.debug("groups=%s, separate_pi=%s", groups, separate_pi)
+    log.debug("isolate=%s", isolate)
+    log.debug("udp_host=%s, udp_port=%s", udp_host, udp_port)
+
+    app.state.json_app = JsonApi(
+        pins,
+        coalesce=coalesce,
+        queue_maxsize=queue_maxsize,
+        queue_policy=queue_policy,
+        lookahead=lookahead,
+        use_script=use_script,
+        trust_daemon=trust_daemon,
+        groups=groups,
+        separate_pi=separate_pi,
+        isolate=isolate,
+        udp_port=udp_port,
+        udp_host=udp_host,
+        debug=debug,
+    )
     app.state.debug = debug
 
     yield
@@ -90,6 +341,7 @@ async def exec_cmd(
     """execute commands.
 
     JSON配列を受け取り、コマンドを実行する。
+    各コマンドは、"group"キーで、グループを指定できる。
     """
     debug = request.app.state.debug
     _log = get_logger(__name__, debug)
@@ -101,14 +353,221 @@ async def exec_cmd(
     else:
         cmd_list = cmd
 
-    _json_app = request.app.state.json_app
-    _res = []
-    for c in cmd_list:
-        _res1: dict = _json_app.send_cmdjson(c)
-        _log.debug("c=%s, _res1=%s", json.dumps(c), json.dumps(_res1))
-        _res.append(_res1)
+    # `wait`, `await`などは、終わるまでブロックするので、
+    # イベントループではなく、別のスレッドで実行する
+    # (長い移動の間も、ほかのクライアントに応答できる)
+    _json_app: JsonApi = request.app.state.json_app
+    _res = await _json_app.send_cmdlist_async(cmd_list)
 
     _log.debug("_res=%s", json.dumps(_res))
     if len(_res) == 1:
         return _res[0]
     return _res
+
+
+@app.post("/str")
+async def exec_str(request: Request):
+    """execute string commands.
+
+    本体(text/plain)の文字列コマンド(e.g. "mv:30,.,c ms:0.5")を、
+    サーバーでJSONコマンドにして、実行する。
+    JSONより短く、JSONライブラリのないマイコンからも送れる。
+
+    返り値は、コマンドごとの返り値の配列。
+    """
+    debug = request.app.state.debug
+    _log = get_logger(__name__, debug)
+
+    _body = await request.body()
+    _cmd_line = _body.decode("utf-8", errors="replace")
+    _log.debug("cmd_line=%a", _cmd_line)
+
+    _json_app: JsonApi = request.app.state.json_app
+    _cmd_list = _json_app.str_parser.cmdstr_to_jsonlist(_cmd_line)
+    _res = await _json_app.send_cmdlist_async(_cmd_list)
+
+    _log.debug("_res=%s", json.dumps(_res))
+    return _res
+
+
+# --- WebSocket ---
+def parse_ws_message(
+    text: str, parser: StrCmdToJson
+) -> tuple[list[dict], bool]:
+    """WebSocketのメッセージを、コマンドのリストにする。
+
+    JSONのコマンド(dict)、その配列、または文字列コマンド。
+
+    Returns:
+        (コマンドのリスト, 1つのdictだったか)
+    """
+    try:
+        _data = json.loads(text)
+    except json.JSONDecodeError:
+        # JSONでなければ、文字列コマンド (e.g. "mv:30,0 sl:0.5")
+        return parser.cmdstr_to_jsonlist(text), False
+
+    if isinstance(_data, dict):
+        return [_data], True
+    if isinstance(_data, list):
+        return [
+            _c
+            if isinstance(_c, dict)
+            else {"error": "INVALID_REQUEST", "data": _c}
+            for _c in _data
+        ], False
+    return [{"error": "INVALID_REQUEST", "data": _data}], True
+
+
+@app.websocket("/ws")
+async def ws_cmd(websocket: WebSocket):
+    """streaming control.
+
+    1つの接続で、コマンドを続けて送り、返り値と完了イベントを受け取る。
+    (コマンドごとに、HTTPの接続・ヘッダーの処理をしなくてよい)
+
+    受信: JSONのコマンド, その配列, または文字列コマンド("mv:30,0 sl:0.5")
+    送信:
+      * メッセージごとに、返り値(`/cmd`と同じ。配列には配列)。
+      * キューに入れたコマンドが終わると、完了イベント:
+        {"event": "done", "id": 3, "group": "default",
+         "value": {"state": "done", ...}}  # CmdFuture.to_dict()
+
+    `/ws?events=0`: 完了イベントを送らない。
+
+    メッセージは受け取った順に実行するが、制御コマンド
+    (estop, cancel, qsize, status)だけのメッセージは、
+    "wait"などを待たずにすぐ実行する(返り値が先に届くことがある)。
+    """
+    await ws_session(websocket, str_only=False)
+
+
+@app.websocket("/ws/str")
+async def ws_str(websocket: WebSocket):
+    """streaming control with string commands.
+
+    `/ws`と同じだが、メッセージはすべて文字列コマンド
+    (`/str`と同じ。返り値は、いつも配列)。
+    JSONとして読める文字列も、JSONとしては扱わない。
+    """
+    await ws_session(websocket, str_only=True)
+
+
+async def ws_session(websocket: WebSocket, str_only: bool):
+    """`/ws`, `/ws/str`の接続を処理する。"""
+    await websocket.accept()
+
+    debug = websocket.app.state.debug
+    _log = get_logger(__name__, debug)
+    _json_app: JsonApi = websocket.app.state.json_app
+    _events = websocket.query_params.get("events", "1") != "0"
+    _log.debug("str_only=%s, events=%s", str_only, _events)
+
+    _send_lock = asyncio.Lock()
+
+    async def _send(data):
+        async with _send_lock:
+            await websocket.send_text(json.dumps(data))
+
+    async def _watch(group: str, ids: asyncio.Queue):
+        """グループのコマンドは順に終わるので、IDの順に完了を待つ。"""
+        while True:
+            _id = await ids.get()
+            _ret = await _json_app.send_cmdjson_async(
+                {
+                    "method": ThreadWorker.CMD_AWAIT,
+                    "params": {"id": _id},
+                    "group": group,
+                }
+            )
+            _value = _ret.get("result", {}).get("value")
+            await _send(
+                {"event": "done", "id": _id, "group": group, "value": _value}
+            )
+
+    _watchers: dict[str, tuple[asyncio.Queue, asyncio.Task]] = {}
+
+    def _watch_reply(cmd: dict, reply: dict):
+        """キューに入れたコマンドだけを待つ。
+
+        `status`, `await`の返り値にも"id"があるが、
+        キューに入れたものではないので、待たない(イベントが重複する)。
+        """
+        if cmd.get("method") in (
+            ThreadWorker.CMD_STATUS,
+            ThreadWorker.CMD_AWAIT,
+        ):
+            return
+        _result = reply.get("result")
+        if not isinstance(_result, dict) or "id" not in _result:
+            return
+        _group = _result.get("group", "")
+        if _group not in _watchers:
+            _ids: asyncio.Queue = asyncio.Queue()
+            _watchers[_group] = (
+                _ids,
+                asyncio.create_task(_watch(_group, _ids)),
+            )
+        _watchers[_group][0].put_nowait(_result["id"])
+
+    async def _handle(cmd_list: list[dict], single: bool):
+        """1つのメッセージのコマンドを実行して、返り値を送る。"""
+        try:
+            _res = await _json_app.send_cmdlist_async(cmd_list)
+            _log.debug("_res=%s", _res)
+
+            if _events:
+                for _c, _r in zip(cmd_list, _res, strict=True):
+                    _watch_reply(_c, _r)
+            await _send(_res[0] if single and _res else _res)
+        except asyncio.CancelledError:
+            raise
+        except Exception as _e:
+            _log.error(errmsg(_e))
+
+    async def _run_ordered(msgs: asyncio.Queue):
+        """制御コマンド以外のメッセージは、受け取った順に実行する。"""
+        while True:
+            _cmd_list, _single = await msgs.get()
+            await _handle(_cmd_list, _single)
+
+    def _is_control(cmd_list: list[dict]) -> bool:
+        return bool(cmd_list) and all(
+            isinstance(_c, dict)
+            and _c.get("method") in _json_app.CONTROL_METHODS
+            for _c in cmd_list
+        )
+
+    # 受信ループは、コマンドの実行を待たない
+    # ("wait"や、キューが空くのを待っている間も、"estop"などを受け付ける)
+    _ordered: asyncio.Queue = asyncio.Queue()
+    _tasks: set[asyncio.Task] = {asyncio.create_task(_run_ordered(_ordered))}
+
+    try:
+        while True:
+            _text = await websocket.receive_text()
+            if str_only:
+                _cmd_list = _json_app.str_parser.cmdstr_to_jsonlist(_text)
+                _single = False
+            else:
+                _cmd_list, _single = parse_ws_message(
+                    _text, _json_app.str_parser
+                )
+
+            if _is_control(_cmd_list):
+                # 制御コマンドだけのメッセージは、すぐに実行する
+                # (先に送ったメッセージより、先に返ることがある)
+                _task = asyncio.create_task(_handle(_cmd_list, _single))
+                _tasks.add(_task)
+                _task.add_done_callback(_tasks.discard)
+            else:
+                _ordered.put_nowait((_cmd_list, _single))
+
+    except WebSocketDisconnect:
+        _log.debug("disconnected")
+
+    finally:
+        for _task in list(_tasks):
+            _task.cancel()
+        for _ids, _task in _watchers.values():
+            _task.cancel()
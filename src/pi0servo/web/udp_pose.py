@@ -0,0 +1,354 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""udp_pose.py
+
+UDPで、姿勢(全サーボの目標)のフレームを受け渡す。
+
+フレーム (little endian):
+
+    offset  size  内容
+    0       2     magic: b"PS"
+    2       1     flags: bit0 = 1 の場合パルス幅、0 の場合角度
+    3       1     group: グループの番号 (0: 最初のグループ)
+    4       4     seq: 通し番号 (uint32, 送るごとに増やす)
+    8       4     mask: 値のあるサーボ (uint32, bit i = サーボ i)
+    12      2*n   values: int16 x マスクのビットの数 (サーボの番号順)
+                  角度は 1/100 度 (ANGLE_SCALE)、パルス幅は us
+"""
+
+import select
+import socket
+import struct
+import threading
+import time
+from collections.abc import Callable
+
+from ..utils.mylogger import get_logger
+
+MAGIC = b"PS"
+FLAG_PULSES = 0x01
+ANGLE_SCALE = 100  # 1/100 度
+HEADER = struct.Struct("<2sBBII")
+MAX_SERVO_N = 32  # maskのビット数
+SEQ_MOD = 1 << 32
+
+DEF_PORT = 8001
+
+
+def encode_pose(
+    seq: int, values: list[float | None], group=0, pulses=False
+) -> bytes:
+    """Encode a pose frame.
+
+    Args:
+        seq (int): 通し番号。
+        values (list[float | None]): 角度(度)、またはパルス幅(us)。
+            None: そのサーボは動かさない。
+        group (int): グループの番号。
+        pulses (bool): `values`はパルス幅。
+
+    Raises:
+        ValueError: サーボの数、値の範囲の誤り。
+    """
+    if len(values) > MAX_SERVO_N:
+        raise ValueError(f"too many servos: {len(values)}")
+
+    _mask = 0
+    _ints: list[int] = []
+    for _i, _v in enumerate(values):
+        if _v is None:
+            continue
+        _mask |= 1 << _i
+        _ints.append(round(_v if pulses else _v * ANGLE_SCALE))
+
+    try:
+        return HEADER.pack(
+            MAGIC,
+            FLAG_PULSES if pulses else 0,
+            group,
+            seq % SEQ_MOD,
+            _mask,
+        ) + struct.pack(f"<{len(_ints)}h", *_ints)
+    except struct.error as _e:
+        raise ValueError(f"invalid frame: {_e}") from _e
+
+
+def decode_pose(data: bytes) -> tuple[int, int, bool, list[float | None]]:
+    """Decode a pose frame.
+
+    Returns:
+        (group, seq, pulses, values)
+        values: サーボの番号順。マスクにないサーボは None。
+
+    Raises:
+        ValueError: フレームの誤り。
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("short frame")
+    _magic, _flags, _group, _seq, _mask = HEADER.unpack_from(data)
+    if _magic != MAGIC:
+        raise ValueError(f"bad magic: {_magic!r}")
+
+    _n = _mask.bit_count()
+    if len(data) != HEADER.size + 2 * _n:
+        raise ValueError(f"bad length: {len(data)}")
+    _ints = struct.unpack_from(f"<{_n}h", data, HEADER.size)
+
+    _pulses = bool(_flags & FLAG_PULSES)
+    _values: list[float | None] = [None] * _mask.bit_length()
+    _it = iter(_ints)
+    for _i in range(len(_values)):
+        if _mask >> _i & 1:
+            _v = next(_it)
+            _values[_i] = _v if _pulses else _v / ANGLE_SCALE
+    return _group, _seq, _pulses, _values
+
+
+class UdpPoseServer(threading.Thread):
+    """UDP pose-frame listener.
+
+    ジョイスティックなどの遠隔操作用。HTTPやWebSocketと違って、
+    1つのフレームが遅れても、後のフレームは待たされない。
+
+    受け取ったフレームは、絶対位置のコマンド
+    (`move_all_angles`または`move_all_pulses`, "interactive"レーン)
+    にして、`send_func`(`GroupRouter.send`など)に渡す。
+    ワーカーを coalesce モードにすれば、実行待ちのコマンドは、
+    新しいフレームで置き換えられる(latest-wins)。
+
+    次のフレームは、捨てる:
+      * 送り元・グループごとに、前のフレームより`seq`が古い
+        (順番が入れ替わった)。
+        ただし、`reset_sec`秒以上フレームがなければ、どの`seq`も受け付ける
+        (送る側の再起動)。
+      * ソケットに、同じグループの新しいフレームが届いている(古い)。
+    """
+
+    RECV_TIMEOUT = 0.2  # sec
+    MAX_FRAME = HEADER.size + 2 * MAX_SERVO_N
+    PRIORITY = "interactive"
+
+    def __init__(
+        self,
+        send_func: Callable[[dict], dict],
+        groups: dict[str, int],
+        host="0.0.0.0",
+        port=DEF_PORT,
+        reset_sec=1.0,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            send_func (Callable): JSONコマンド(dict)を送る関数。
+            groups (dict[str, int]): グループ名 -> サーボの数
+                (フレームの"group"は、この順番)。
+            host, port: 受け付けるアドレス (port=0: 空いているポート)。
+            reset_sec (float): この時間フレームがなければ、`seq`を忘れる。
+        """
+        super().__init__(daemon=True)
+
+        self.__debug = debug
+        self.__log = get_logger(self.__class__.__name__, self.__debug)
+        self.__log.debug("groups=%s, host=%s, port=%s", groups, host, port)
+
+        self._send_func = send_func
+        self.group_names = list(groups)
+        self.servo_n = list(groups.values())
+        self.reset_sec = reset_sec
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self._sock.setblocking(False)
+        self.address = self._sock.getsockname()
+
+        # (送り元, グループ) -> (seq, 受け取った時刻)
+        # `reset_sec`秒ごとに、古くなったものを削除する
+        self._last: dict[tuple, tuple[int, float]] = {}
+        self._pruned_at = 0.0
+        self._active = False
+
+        self.received = 0
+        self.dispatched = 0
+        self.dropped_old = 0  # 順番が入れ替わった
+        self.dropped_stale = 0  # 新しいフレームで置き換えた
+        self.invalid = 0
+
+    @property
+    def stats(self) -> dict:
+        """受け取ったフレームの数など"""
+        return {
+            "received": self.received,
+            "dispatched": self.dispatched,
+            "dropped_old": self.dropped_old,
+            "dropped_stale": self.dropped_stale,
+            "invalid": self.invalid,
+        }
+
+    def end(self):
+        """終了する。"""
+        self.__log.debug("stats=%s", self.stats)
+        self._active = False
+        if self.is_alive():
+            self.join()
+        self._sock.close()
+
+    def run(self):
+        """受信ループ"""
+        self.__log.info("listening on %s", self.address)
+        self._active = True
+        while self._active:
+            try:
+                _ready, _, _ = select.select(
+                    [self._sock], [], [], self.RECV_TIMEOUT
+                )
+                if not _ready:
+                    continue
+                _data, _addr = self._sock.recvfrom(self.MAX_FRAME)
+            except BlockingIOError:
+                continue
+            except OSError as _e:
+                self.__log.warning("%s: %s", type(_e).__name__, _e)
+                break
+
+            # 届いているフレームをすべて読み、グループごとに最新のものだけ送る
+            _latest: dict[str, dict] = {}
+            while True:
+                _cmd = self.accept(_data, _addr, time.monotonic())
+                if _cmd is not None:
+                    if _cmd["group"] in _latest:
+                        self.dropped_stale += 1
+                    _latest[_cmd["group"]] = _cmd
+                try:
+                    _data, _addr = self._sock.recvfrom(self.MAX_FRAME)
+                except BlockingIOError:
+                    break
+
+            for _cmd in _latest.values():
+                self._dispatch(_cmd)
+
+    def accept(self, data: bytes, addr, now: float) -> dict | None:
+        """フレームを、コマンドにする。
+
+        Returns:
+            dict | None: JSONコマンド。None: 捨てるフレーム。
+        """
+        self.received += 1
+        try:
+            _group, _seq, _pulses, _values = decode_pose(data)
+            _name = self.group_names[_group]
+        except (ValueError, IndexError) as _e:
+            self.invalid += 1
+            self.__log.debug("%s: invalid frame: %s", addr, _e)
+            return None
+
+        _servo_n = self.servo_n[_group]
+        if len(_values) > _servo_n:
+            self.invalid += 1
+            self.__log.debug("%s: mask exceeds %s servos", addr, _servo_n)
+            return None
+        _values += [None] * (_servo_n - len(_values))
+
+        if now - self._pruned_at >= self.reset_sec:
+            self._prune(now)
+
+        _key = (addr, _group)
+        _last = self._last.get(_key)
+        if _last is not None and now - _last[1] < self.reset_sec:
+            _diff = (_seq - _last[0]) % SEQ_MOD
+            if _diff == 0 or _diff >= SEQ_MOD // 2:
+                self.dropped_old += 1
+                return None
+        self._last[_key] = (_seq, now)
+
+        if _pulses:
+            _method, _param = "move_all_pulses", "pulses"
+        else:
+            _method, _param = "move_all_angles", "angles"
+        return {
+            "method": _method,
+            "params": {_param: _values},
+            "group": _name,
+            "priority": self.PRIORITY,
+        }
+
+    def _prune(self, now: float):
+        """`reset_sec`秒以上フレームのない送り元を忘れる。
+
+        (送り元のポートは、再起動のたびに変わるので、溜まり続ける)
+        """
+        self._last = {
+            _key: _last
+            for _key, _last in self._last.items()
+            if now - _last[1] < self.reset_sec
+        }
+        self._pruned_at = now
+
+    def _dispatch(self, cmd: dict):
+        try:
+            _ret = self._send_func(cmd)
+        except Exception as _e:
+            self.__log.error("%s: %s", type(_e).__name__, _e)
+            return
+        self.dispatched += 1
+        if "error" in _ret:
+            self.__log.warning("%s", _ret["error"])
+
+
+class UdpPoseSender:
+    """UDP pose-frame sender.
+
+    `send()`ごとに`seq`を増やして、1つのフレームを送る(返り値はない)。
+    """
+
+    def __init__(
+        self,
+        host="localhost",
+        port=DEF_PORT,
+        group=0,
+        pulses=False,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            host, port: `UdpPoseServer`のアドレス。
+            group (int): グループの番号 (`--group`を指定した順, 0: 最初)。
+            pulses (bool): 角度ではなく、パルス幅を送る。
+        """
+        self.__debug = debug
+        self.__log = get_logger(self.__class__.__name__, self.__debug)
+        self.__log.debug("host=%s, port=%s, group=%s", host, port, group)
+
+        self.group = group
+        self.pulses = pulses
+        self.seq = 0
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.connect((host, port))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+    def close(self):
+        """ソケットを閉じる。"""
+        self._sock.close()
+
+    def send(self, values: list[float | None]) -> int:
+        """Send a pose.
+
+        Args:
+            values: 角度(度)、またはパルス幅(us)。None: 動かさない。
+
+        Returns:
+            int: 送ったフレームの`seq`。
+        """
+        self.seq = (self.seq + 1) % SEQ_MOD
+        self._sock.send(
+            encode_pose(self.seq, values, self.group, self.pulses)
+        )
+        return self.seq
@@ -105,3 +105,33 @@ class TestPiServo:
         """offのテスト"""
         pi_servo.off()
         pi_servo.pi.set_servo_pulsewidth.assert_called_with(PIN, PiServo.OFF)
+
+    def test_get_pulse_shadow(self, pi_servo):
+        """move_pulse後のget_pulseは、pigpiodに問い合わせないこと"""
+        pi_servo.move_pulse(1600)
+        assert pi_servo.get_pulse() == 1600
+        pi_servo.pi.get_servo_pulsewidth.assert_not_called()
+
+        pi_servo.off()
+        assert pi_servo.get_pulse() == PiServo.OFF
+        pi_servo.pi.get_servo_pulsewidth.assert_not_called()
+
+    def test_get_pulse_trust_daemon(self, pi_servo):
+        """trust_daemon=Trueの場合は、毎回pigpiodから読み出すこと"""
+        pi_servo.trust_daemon = True
+        pi_servo.pi.get_servo_pulsewidth.return_value = 1700
+
+        pi_servo.move_pulse(1600)
+        assert pi_servo.get_pulse() == 1700
+        assert pi_servo.get_pulse() == 1700
+        assert pi_servo.pi.get_servo_pulsewidth.call_count == 2
+
+    def test_resync(self, pi_servo):
+        """resyncのテスト"""
+        pi_servo.move_pulse(1600)
+        pi_servo.pi.get_servo_pulsewidth.return_value = 1400
+
+        assert pi_servo.resync() == 1400
+        assert pi_servo.last_pulse == 1400
+        assert pi_servo.get_pulse() == 1400
+        pi_servo.pi.get_servo_pulsewidth.assert_called_once_with(PIN)
@@ -198,3 +198,27 @@ class TestCalibrableServoRefactored:
         pulse = self.PULSE_MIN - 100
         servo.move_pulse(pulse, forced=True)
         servo.pi.set_servo_pulsewidth.assert_called_with(PIN, pulse)
+
+    @pytest.mark.parametrize(
+        ("pulse", "forced", "expected_pulse_calc"),
+        [
+            (1000, False, "1000"),
+            (100, False, "self.PULSE_MIN"),
+            (2450, False, "self.PULSE_MAX"),
+            (550, True, "550"),
+            (100, True, "PiServo.MIN"),
+        ],
+    )
+    def test_clip_pulse(self, servo, pulse, forced, expected_pulse_calc):
+        """clip_pulseのテスト"""
+        self._setup_servo_calibration(servo)
+        expected_pulse = eval(expected_pulse_calc)
+        assert servo.clip_pulse(pulse, forced) == expected_pulse
+
+    def test_angle2pulse(self, servo):
+        """angle2pulseのテスト"""
+        self._setup_servo_calibration(servo)
+        assert servo.angle2pulse("max") == self.PULSE_MAX
+        assert servo.angle2pulse(-100) == self.PULSE_MIN
+        assert servo.angle2pulse("invalid_string") is None
+        servo.pi.set_servo_pulsewidth.assert_not_called()
@@ -1,4 +1,5 @@
-from unittest.mock import patch
+import time
+from unittest.mock import MagicMock, patch
 
 import pytest
 
@@ -9,6 +10,11 @@ PINS = [22, 27]
 CONF_FILE = "test_multi_servo_conf.json"
 
 
+def a2p(angle: float) -> int:
+    """テスト用の角度→パルス幅変換 (1度 = 10us)"""
+    return int(round(1500 + angle * 10))
+
+
 @pytest.fixture
 def mock_calibrable_servo(mocker):
     """
@@ -61,6 +67,34 @@ def mock_calibrable_servo(mocker):
         type(s).POS_MIN = mocker.PropertyMock(return_value="min")
         type(s).POS_CENTER = mocker.PropertyMock(return_value="center")
 
+        # キャリブレーション値: 1度 = 10us (a2p()と同じ)
+        s.pulse_min = 600
+        s.pulse_center = 1500
+        s.pulse_max = 2400
+        s.angle_factor = 1
+
+        # angle2pulse(), clip_pulse(), move_pulse() は、
+        # a2p()を使って、本物と同じように振る舞わせる。
+        # move_pulse()は、シャドウ(last_pulse)を更新する。
+        s.last_pulse = None
+
+        def _angle2pulse(angle, _s=s):
+            _str_angles = {"max": 90.0, "min": -90.0, "center": 0.0}
+            if angle is None:
+                angle = _s.get_angle()
+            elif isinstance(angle, str):
+                if angle not in _str_angles:
+                    return None
+                angle = _str_angles[angle]
+            return a2p(max(min(angle, 90.0), -90.0))
+
+        def _move_pulse(pulse, forced=False, _s=s):
+            _s.last_pulse = pulse
+
+        s.angle2pulse.side_effect = _angle2pulse
+        s.clip_pulse.side_effect = lambda pulse, forced=False: pulse
+        s.move_pulse.side_effect = _move_pulse
+
     # mock_csが呼び出されるたびに、servosリストから順に
     # モックインスタンスを返すように設定する。
     mock_cs.side_effect = servos
@@ -99,7 +133,7 @@ class TestMultiServo:
         """
         MultiServoの初期化テスト。
         first_move=Trueの場合に、各サーボが正しく初期化され、
-        move_angle(0)が呼び出されることを確認する。
+        0度の位置に動かされることを確認する。
         """
         pi = mocker_pigpio()
         # mock_calibrable_servoフィクスチャから、
@@ -109,7 +143,7 @@ class TestMultiServo:
 
         # first_move=TrueでMultiServoを初期化する。
         # これにより、内部でCalibrableServoのインスタンスが生成され、
-        # 各サーボのmove_angle(0)が呼び出されるはず。
+        # 各サーボが0度の位置に動かされるはず。
         MultiServo(pi, PINS, first_move=True, conf_file=CONF_FILE, debug=True)
 
         # CalibrableServoがPINSの数だけ呼び出されたことを確認する。
@@ -117,13 +151,13 @@ class TestMultiServo:
         # 各ピンに対してCalibrableServoが正しく呼び出されたことを確認する。
         for pin in PINS:
             mock_class.assert_any_call(
-                pi, pin, conf_file=CONF_FILE, debug=False
+                pi, pin, conf_file=CONF_FILE, debug=False, trust_daemon=False
             )
 
-        # first_move=Trueなので、各サーボのmove_angle(0)が
-        # 呼ばれたことを確認する。
+        # first_move=Trueなので、各サーボが0度のパルス幅に
+        # 動かされたことを確認する。
         for servo_mock in mock_instances:
-            servo_mock.move_angle.assert_called_with(0)
+            servo_mock.move_pulse.assert_called_with(a2p(0), False)
 
     def test_off(self, multi_servo):
         """
@@ -162,8 +196,49 @@ class TestMultiServo:
         ms, mock_instances = multi_servo
         target_angles = [30, -45]
         ms.move_all_angles(target_angles)
-        mock_instances[0].move_angle.assert_called_with(30)
-        mock_instances[1].move_angle.assert_called_with(-45)
+        mock_instances[0].move_pulse.assert_called_with(a2p(30), False)
+        mock_instances[1].move_pulse.assert_called_with(a2p(-45), False)
+
+    def test_move_all_angles_dirty_check(self, multi_servo):
+        """
+        move_all_anglesのテスト（同じパルス幅は送信しない）。
+        """
+        ms, mock_instances = multi_servo
+        ms.move_all_angles([30, -45])
+        ms.move_all_angles([30, -40])
+        ms.move_all_angles([30, -40])
+
+        assert mock_instances[0].move_pulse.call_count == 1
+        assert mock_instances[1].move_pulse.call_count == 2
+        assert ms.write_stats == {"written": 3, "skipped": 3}
+
+        ms.reset_write_stats()
+        assert ms.write_stats == {"written": 0, "skipped": 0}
+
+    def test_move_all_angles_no_dirty_check(self, multi_servo):
+        """
+        move_all_anglesのテスト（dirty_check=False）。
+        """
+        ms, mock_instances = multi_servo
+        ms.dirty_check = False
+        ms.move_all_angles([30, -45])
+        ms.move_all_angles([30, -45])
+
+        assert mock_instances[0].move_pulse.call_count == 2
+        assert mock_instances[1].move_pulse.call_count == 2
+        assert ms.write_stats == {"written": 4, "skipped": 0}
+
+    def test_move_all_pulses_dirty_check(self, multi_servo):
+        """
+        move_all_pulsesのテスト（同じパルス幅とNoneは送信しない）。
+        """
+        ms, mock_instances = multi_servo
+        ms.move_all_pulses([1500, 1600])
+        ms.move_all_pulses([1500, None])
+
+        assert mock_instances[0].move_pulse.call_count == 1
+        assert mock_instances[1].move_pulse.call_count == 1
+        assert ms.write_stats == {"written": 2, "skipped": 1}
 
     def test_get_all_angles(self, multi_servo):
         """
@@ -199,6 +274,15 @@ class TestMultiServo:
         mock_instances[0].get_pulse.assert_called_once()
         mock_instances[1].get_pulse.assert_called_once()
 
+    def test_resync(self, multi_servo):
+        """
+        resyncのテスト。
+        """
+        ms, mock_instances = multi_servo
+        mock_instances[0].resync.return_value = 1500
+        mock_instances[1].resync.return_value = 1600
+        assert ms.resync() == [1500, 1600]
+
     def test_move_pulse(self, multi_servo):
         """
         move_pulseのテスト。
@@ -258,7 +342,7 @@ class TestMultiServo:
         assert ms._validate_angle_list([10, 20, 30]) is True  # 3要素
         # 指定された角度の要素数が多すぎる場合は無視されるだけでOK
 
-    @patch("time.sleep")
+    @patch("threading.Event.wait", return_value=False)
     def test_move_all_angles_sync_relative(self, mock_sleep, multi_servo):
         """
         move_all_angles_sync_relativeのテスト。
@@ -278,39 +362,45 @@ class TestMultiServo:
             angle_diffs, move_sec=move_sec, step_n=steps
         )
 
-        assert mock_instances[0].move_angle.call_count == steps
-        assert mock_instances[1].move_angle.call_count == steps
+        assert mock_instances[0].move_pulse.call_count == steps
+        assert mock_instances[1].move_pulse.call_count == steps
 
         for i in range(steps):
             # 途中の角度が線形補間されていることを確認
             expected_angle0 = (
                 start_angles[0] + angle_diffs[0] * (i + 1) / steps
             )
-            mock_instances[0].move_angle.assert_any_call(expected_angle0)
+            mock_instances[0].move_pulse.assert_any_call(
+                a2p(expected_angle0), False
+            )
 
             expected_angle1 = (
                 start_angles[1] + angle_diffs[1] * (i + 1) / steps
             )
-            mock_instances[1].move_angle.assert_any_call(expected_angle1)
+            mock_instances[1].move_pulse.assert_any_call(
+                a2p(expected_angle1), False
+            )
 
         # 最後の呼び出しは目標角度になっているはず
-        mock_instances[0].move_angle.assert_called_with(
-            start_angles[0] + angle_diffs[0]
+        mock_instances[0].move_pulse.assert_called_with(
+            a2p(start_angles[0] + angle_diffs[0]), False
         )
-        mock_instances[1].move_angle.assert_called_with(
-            start_angles[1] + angle_diffs[1]
+        mock_instances[1].move_pulse.assert_called_with(
+            a2p(start_angles[1] + angle_diffs[1]), False
         )
 
+        # 各ステップの後に、次の期限まで待つ
         assert mock_sleep.call_count == steps
-        mock_sleep.assert_called_with(move_sec / steps)
+        assert ms.last_move_stats["sent"] == steps
+        assert ms.last_move_stats["planned_sec"] == pytest.approx(move_sec)
 
-    @patch("time.sleep")
+    @patch("threading.Event.wait", return_value=False)
     def test_move_all_angles_sync(self, mock_sleep, multi_servo):
         """
         move_all_angles_syncメソッドのテスト。
         複数のサーボが指定された角度まで同期して滑らかに動くことを確認する。
-        time.sleepをモックすることで、テストの実行時間を短縮し、
-        実際の時間経過を待たずにテストを完了させる。
+        ステップ間の待ち(中断用イベントのwait())をモックすることで、
+        テストの実行時間を短縮し、実際の時間経過を待たずにテストを完了させる。
         """
         ms, mock_instances = multi_servo
 
@@ -328,9 +418,9 @@ class TestMultiServo:
             target_angles, move_sec=move_sec, step_n=steps
         )
 
-        # 各サーボのmove_angleがsteps回呼び出されたことを確認する。
-        assert mock_instances[0].move_angle.call_count == steps
-        assert mock_instances[1].move_angle.call_count == steps
+        # 各サーボのmove_pulseがsteps回呼び出されたことを確認する。
+        assert mock_instances[0].move_pulse.call_count == steps
+        assert mock_instances[1].move_pulse.call_count == steps
 
         # 各ステップでの角度が線形補間されていることを確認する。
         for i in range(steps):
@@ -338,24 +428,36 @@ class TestMultiServo:
                 start_angles[0]
                 + (target_angles[0] - start_angles[0]) * (i + 1) / steps
             )
-            mock_instances[0].move_angle.assert_any_call(expected_angle0)
+            mock_instances[0].move_pulse.assert_any_call(
+                a2p(expected_angle0), False
+            )
 
             expected_angle1 = (
                 start_angles[1]
                 + (target_angles[1] - start_angles[1]) * (i + 1) / steps
             )
-            mock_instances[1].move_angle.assert_any_call(expected_angle1)
+            mock_instances[1].move_pulse.assert_any_call(
+                a2p(expected_angle1), False
+            )
 
         # 最後の呼び出しが目標角度であることを確認する。
-        mock_instances[0].move_angle.assert_called_with(target_angles[0])
-        mock_instances[1].move_angle.assert_called_with(target_angles[1])
+        mock_instances[0].move_pulse.assert_called_with(
+            a2p(target_angles[0]), False
+        )
+        mock_instances[1].move_pulse.assert_called_with(
+            a2p(target_angles[1]), False
+        )
 
-        # time.sleepがsteps回呼び出され、
-        # 正しい引数で呼び出されたことを確認する。
+        # 待ちがsteps回呼び出されたことを確認する。
+        # 待ちはモックなので時間が進まず、
+        # 最後の待ち時間は、ほぼmove_secになる(期限は動作開始からの絶対時刻)。
         assert mock_sleep.call_count == steps
-        mock_sleep.assert_called_with(move_sec / steps)
+        assert mock_sleep.call_args.args[0] == pytest.approx(
+            move_sec, abs=0.05
+        )
+        assert ms.last_move_stats["dropped"] == 0
 
-    @patch("time.sleep")
+    @patch("threading.Event.wait", return_value=False)
     def test_move_all_angles_sync_str_none(self, mock_sleep, multi_servo):
         """
         move_all_angles_syncのテスト（文字列とNoneを含む）。
@@ -371,21 +473,30 @@ class TestMultiServo:
         ms.move_all_angles_sync(target_angles, step_n=steps)
 
         # "max"が角度90.0に変換される
-        mock_instances[0].move_angle.assert_called_with(90.0)
-        assert mock_instances[0].move_angle.call_count == steps
+        mock_instances[0].move_pulse.assert_called_with(a2p(90.0), False)
+        assert mock_instances[0].move_pulse.call_count == steps
 
         # Noneは現在の角度維持
-        mock_instances[1].move_angle.assert_called_with(start_angles[1])
-        assert mock_instances[1].move_angle.call_count == steps
+        # 同じパルス幅なので、最初の1回以外は送信されない
+        mock_instances[1].move_pulse.assert_called_with(
+            a2p(start_angles[1]), False
+        )
+        assert mock_instances[1].move_pulse.call_count == 1
+        assert ms.write_stats == {
+            "written": steps + 1,
+            "skipped": steps - 1,
+        }
 
         # サーボ0の途中の角度が線形補間されていることを確認
         for i in range(steps):
             expected_angle = (
                 start_angles[0] + (90.0 - start_angles[0]) * (i + 1) / steps
             )
-            mock_instances[0].move_angle.assert_any_call(expected_angle)
+            mock_instances[0].move_pulse.assert_any_call(
+                a2p(expected_angle), False
+            )
 
-    @patch("time.sleep")
+    @patch("threading.Event.wait", return_value=False)
     def test_move_all_angles_sync_invalid_str(self, mock_sleep, multi_servo):
         """
         move_all_angles_syncの不正な文字列引数に対するテスト。
@@ -401,12 +512,14 @@ class TestMultiServo:
         ms.move_all_angles_sync(target_angles, step_n=steps)
 
         # "invalid"は現在の角度維持
-        mock_instances[0].move_angle.assert_called_with(start_angles[0])
-        assert mock_instances[0].move_angle.call_count == steps
+        mock_instances[0].move_pulse.assert_called_once_with(
+            a2p(start_angles[0]), False
+        )
 
         # Noneは現在の角度維持
-        mock_instances[1].move_angle.assert_called_with(start_angles[1])
-        assert mock_instances[1].move_angle.call_count == steps
+        mock_instances[1].move_pulse.assert_called_once_with(
+            a2p(start_angles[1]), False
+        )
 
     def test_move_all_angles_sync_direct(self, multi_servo):
         """
@@ -416,5 +529,303 @@ class TestMultiServo:
         target_angles = [30, -45]
         ms.move_all_angles_sync(target_angles, step_n=1)
 
-        mock_instances[0].move_angle.assert_called_once_with(30)
-        mock_instances[1].move_angle.assert_called_once_with(-45)
+        mock_instances[0].move_pulse.assert_called_once_with(a2p(30), False)
+        mock_instances[1].move_pulse.assert_called_once_with(a2p(-45), False)
+
+    @patch("threading.Event.wait", return_value=False)
+    def test_move_all_angles_sync_adaptive(self, mock_sleep, multi_servo):
+        """
+        move_all_angles_syncのテスト（step_n=None: 自動）。
+        ステップ数は、動作時間 / PWMフレーム周期 になる。
+        """
+        ms, mock_instances = multi_servo
+
+        ms.move_all_angles_sync([30, -45], move_sec=0.2)
+
+        assert ms.last_move_stats["step_n"] == 10
+        assert mock_instances[0].move_pulse.call_count == 10
+        mock_instances[0].move_pulse.assert_called_with(a2p(30), False)
+        mock_instances[1].move_pulse.assert_called_with(a2p(-45), False)
+
+    @patch("threading.Event.wait", return_value=False)
+    def test_move_all_angles_sync_adaptive_min_pulse_step(
+        self, mock_sleep, multi_servo
+    ):
+        """
+        move_all_angles_syncのテスト（min_pulse_step）。
+        小さな動きは、少ないステップで動かす。
+        """
+        ms, mock_instances = multi_servo
+        ms.min_pulse_step = 20
+
+        # 最大 60us の変化 -> 3ステップ
+        ms.move_all_angles_sync([6, -3], move_sec=1.0)
+
+        assert ms.last_move_stats["step_n"] == 3
+        mock_instances[0].move_pulse.assert_called_with(a2p(6), False)
+
+    @patch("threading.Event.wait", return_value=False)
+    def test_move_all_angles_sync_profile(self, mock_sleep, multi_servo):
+        """
+        move_all_angles_syncのテスト（profile）。
+        途中のステップはプロファイルに従い、最後は目標角度になる。
+        """
+        ms, mock_instances = multi_servo
+
+        ms.move_all_angles_sync([90, -90], step_n=10, profile="ease")
+
+        calls = mock_instances[0].move_pulse.call_args_list
+        assert len(calls) == 10
+        # ease: 最初のステップは、linear(9度)より小さい
+        assert calls[0].args[0] < a2p(9)
+        assert calls[-1].args == (a2p(90), False)
+
+    def test_move_all_angles_sync_invalid_profile(self, multi_servo):
+        """
+        move_all_angles_syncのテスト（不明なprofile）。
+        """
+        ms, mock_instances = multi_servo
+
+        ms.move_all_angles_sync([90, -90], step_n=10, profile="bouncy")
+
+        mock_instances[0].move_pulse.assert_not_called()
+
+    @patch("threading.Event.wait", return_value=False)
+    def test_move_all_angles_sync_cancel(self, mock_sleep, multi_servo):
+        """
+        move_all_angles_syncのテスト（cancel_move）。
+        ステップの間で中断され、その時点の位置に留まる。
+        """
+        ms, mock_instances = multi_servo
+
+        def _move_pulse(pulse, forced=False, _s=mock_instances[0]):
+            _s.last_pulse = pulse
+            if mock_instances[0].move_pulse.call_count == 3:
+                ms.cancel_move()  # 別スレッドからの中断の代わり
+
+        mock_instances[0].move_pulse.side_effect = _move_pulse
+
+        ms.move_all_angles_sync([90, -90], step_n=10)
+
+        assert mock_instances[0].move_pulse.call_count == 3
+        assert mock_instances[0].last_pulse == a2p(27)
+        assert ms.last_move_stats["cancelled"] is True
+
+        # clear_cancel()までは、動かない
+        ms.move_all_angles_sync([0, 0], step_n=10)
+        assert mock_instances[0].move_pulse.call_count == 3
+
+        # 中断した位置から、計画し直す
+        ms.clear_cancel()
+        mock_instances[0].get_angle.return_value = 27.0
+        ms.move_all_angles_sync([0, 0], step_n=3)
+        assert [
+            c.args[0] for c in mock_instances[0].move_pulse.call_args_list[3:]
+        ] == [a2p(18), a2p(9), a2p(0)]
+
+    def test_clear_cancel_gen(self, multi_servo):
+        """世代が古い場合は、中断状態を解除しない"""
+        ms, _ = multi_servo
+        _gen = ms.cancel_gen
+
+        assert ms.cancel_move() == _gen + 1
+        assert ms.clear_cancel(_gen) is False
+        assert ms.cancel_event.is_set()
+
+        assert ms.clear_cancel(_gen + 1) is True
+        assert not ms.cancel_event.is_set()
+
+        ms.estop()
+        assert ms.cancel_gen == _gen + 2
+
+    def test_wait_cancel(self, multi_servo):
+        """wait_cancel()は、cancel_move()ですぐに戻る"""
+        ms, _ = multi_servo
+
+        assert ms.wait_cancel(0.01) is False
+        ms.cancel_move()
+        assert ms.wait_cancel(10) is True
+
+    @patch("threading.Event.wait", return_value=False)
+    def test_move_all_angles_sync_path(self, mock_sleep, multi_servo):
+        """
+        move_all_angles_sync_pathのテスト。
+        経由点を止まらずに通過し、最後の経由点で終わる。
+        """
+        ms, mock_instances = multi_servo
+
+        ms.move_all_angles_sync_path(
+            [[30, None], [None, "min"]], [0.1, 0.1], step_n=4
+        )
+
+        # None は、一つ前の経由点の角度
+        # (パルスが変わらないステップは、書き込まない)
+        assert [
+            c.args[0] for c in mock_instances[0].move_pulse.call_args_list
+        ] == [a2p(15), a2p(30)]
+        assert [
+            c.args[0] for c in mock_instances[1].move_pulse.call_args_list
+        ] == [a2p(0), a2p(-45), a2p(-90)]
+        assert ms.last_move_stats["step_n"] == 4
+
+    @patch("threading.Event.wait", return_value=False)
+    def test_move_all_angles_sync_path_auto(self, mock_sleep, multi_servo):
+        """move_all_angles_sync_pathのテスト（ステップ数は自動）"""
+        ms, _ = multi_servo
+
+        ms.move_all_angles_sync_path([[30, 0], [0, 0]], [0.2, 0.3])
+
+        # 合計0.5秒 / PWMフレーム周期0.02秒
+        assert ms.last_move_stats["step_n"] == 25
+
+    def test_move_all_angles_sync_path_invalid(self, multi_servo):
+        """move_all_angles_sync_pathのテスト（不正な引数）"""
+        ms, mock_instances = multi_servo
+
+        ms.move_all_angles_sync_path([[30, 0], [0, 0]], [0.2])
+        ms.move_all_angles_sync_path([[30, 0]], [0.2], profile="xxx")
+        mock_instances[0].move_pulse.assert_not_called()
+
+    @patch("threading.Event.wait", return_value=False)
+    def test_estop_off(self, mock_sleep, multi_servo):
+        """
+        estop("off")のテスト。
+        実行中の移動を止めて、すべてのサーボをオフにする。
+        """
+        ms, mock_instances = multi_servo
+        ms._script_player.stop = MagicMock()
+        results = []
+
+        def _move_pulse(pulse, forced=False, _s=mock_instances[0]):
+            _s.last_pulse = pulse
+            if mock_instances[0].move_pulse.call_count == 3:
+                results.append(ms.estop("off"))  # 別スレッドからの代わり
+
+        mock_instances[0].move_pulse.side_effect = _move_pulse
+
+        ms.move_all_angles_sync([90, -90], step_n=10)
+
+        # 書き込み中のステップ(全サーボ)の後は、書き込まない
+        assert mock_instances[0].move_pulse.call_count == 3
+        assert mock_instances[1].move_pulse.call_count == 2
+        for servo_mock in mock_instances:
+            servo_mock.off.assert_called_once()
+        ms._script_player.stop.assert_called_once()
+
+        assert results[0]["mode"] == "off"
+        assert results[0]["latency_sec"] >= 0.0
+
+        # clear_cancel()までは、動かない
+        ms.move_all_pulses([1000, 2000])
+        assert mock_instances[0].move_pulse.call_count == 3
+
+    def test_estop_hold(self, multi_servo):
+        """estop("hold")は、サーボをオフにしない"""
+        ms, mock_instances = multi_servo
+
+        _ret = ms.estop(t0=time.monotonic() - 1.0)
+        assert _ret["mode"] == "hold"
+        assert _ret["latency_sec"] >= 1.0  # t0からの時間
+        assert ms.cancel_event.is_set()
+        for servo_mock in mock_instances:
+            servo_mock.off.assert_not_called()
+
+    def test_estop_invalid_mode(self, multi_servo):
+        """estop()のテスト（不正なモード）"""
+        ms, _ = multi_servo
+
+        with pytest.raises(ValueError, match="invalid mode"):
+            ms.estop("xxx")
+        assert not ms.cancel_event.is_set()
+
+    @patch("threading.Event.wait", return_value=False)
+    def test_move_all_angles_sync_script_cancel(
+        self, mock_sleep, multi_servo
+    ):
+        """
+        move_all_angles_syncのテスト（use_script=True, 中断）。
+        中断した場合は、位置をデーモンから読み直す。
+        """
+        ms, mock_instances = multi_servo
+        ms.use_script = True
+
+        def _play(*args):
+            ms.cancel_move()
+            return True
+
+        ms._script_player.play = _play
+
+        ms.move_all_angles_sync([30, -45], step_n=10)
+
+        mock_instances[0].resync.assert_called_once()
+        mock_instances[1].resync.assert_called_once()
+
+    @patch("threading.Event.wait", return_value=False)
+    def test_move_all_angles_sync_script(self, mock_sleep, multi_servo):
+        """
+        move_all_angles_syncのテスト（use_script=True）。
+        スクリプトで再生できた場合は、Pythonのループで動かさない。
+        """
+        ms, mock_instances = multi_servo
+        ms.use_script = True
+        ms._script_player.play = lambda pins, rows, step_sec, cancel_event: (
+            True
+        )
+
+        ms.move_all_angles_sync([30, -45], step_n=10)
+
+        mock_instances[0].move_pulse.assert_not_called()
+        mock_instances[1].move_pulse.assert_not_called()
+
+        # シャドウは、最後のステップのパルス幅になる
+        assert mock_instances[0].last_pulse == 1800
+        assert mock_instances[1].last_pulse == 1050
+
+        # 統計は、スクリプトで再生したことと、時間だけ
+        assert ms.last_move_stats["script"] is True
+        assert ms.last_move_stats["step_n"] == 10
+        assert ms.last_move_stats["cancelled"] is False
+
+        # 時間をかけずに動かした場合は、前の統計を残さない
+        ms.move_all_angles_sync([0, 0], step_n=1)
+        assert ms.last_move_stats == {}
+
+    @patch("pi0servo.core.step_scheduler.time.monotonic", return_value=0.0)
+    @patch("threading.Event.wait", return_value=False)
+    def test_move_all_angles_sync_script_fallback(
+        self, mock_sleep, mock_clock, multi_servo
+    ):
+        """
+        move_all_angles_syncのテスト（use_script=True, フォールバック）。
+        (時計を止めて、GCなどの遅れでステップが飛ばないようにする)
+        """
+        ms, mock_instances = multi_servo
+        ms.use_script = True
+        ms._script_player.play = lambda pins, rows, step_sec, cancel_event: (
+            False
+        )
+
+        ms.move_all_angles_sync([30, -45], step_n=10)
+
+        assert mock_instances[0].move_pulse.call_count == 10
+        mock_instances[0].move_pulse.assert_called_with(a2p(30), False)
+        mock_instances[1].move_pulse.assert_called_with(a2p(-45), False)
+
+    @patch("threading.Event.wait", return_value=False)
+    def test_move_all_angles_sync_script_error(self, mock_sleep, multi_servo):
+        """
+        move_all_angles_syncのテスト（use_script=True, 再生開始後の失敗）。
+        フォールバックせず、位置をデーモンから読み直して、エラーにする。
+        """
+        ms, mock_instances = multi_servo
+        ms.use_script = True
+        ms._script_player.play = MagicMock(
+            side_effect=RuntimeError("script 3 did not finish")
+        )
+
+        with pytest.raises(RuntimeError, match="did not finish"):
+            ms.move_all_angles_sync([30, -45], step_n=10)
+
+        mock_instances[0].move_pulse.assert_not_called()
+        mock_instances[0].resync.assert_called_once()
+        mock_instances[1].resync.assert_called_once()
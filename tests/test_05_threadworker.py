@@ -24,6 +24,11 @@ def mocker_multiservo():
         "pi0servo.helper.thread_worker.MultiServo"
     ) as mock_mservo_constructor:
         mock_mservo_instance = MagicMock(spec=MultiServo)
+        mock_mservo_instance.cancel_gen = 0
+        mock_mservo_instance.last_move_stats = {}
+        mock_mservo_instance.cancel_event = threading.Event()
+        mock_mservo_instance.ESTOP_HOLD = MultiServo.ESTOP_HOLD
+        mock_mservo_instance.ESTOP_MODES = MultiServo.ESTOP_MODES
         mock_mservo_constructor.return_value = mock_mservo_instance
         yield mock_mservo_constructor
 
@@ -79,10 +84,24 @@ class TestThreadWorker:
         self._wait_for_mock_call(mservo_instance.move_all_angles_sync)
 
         mservo_instance.move_all_angles_sync.assert_called_once_with(
-            [30, None, "center"], 0.2, 40
+            [30, None, "center"], 0.2, 40, None
         )
         assert thread_worker.qsize == 0
 
+    def test_send_move_profile(self, thread_worker):
+        """moveコマンドのテスト (profile)"""
+        mservo_instance = thread_worker.mservo
+        cmd = {
+            "method": "move",
+            "params": {"angles": [30, -30], "profile": "ease"},
+        }
+        thread_worker.send(cmd)
+        self._wait_for_mock_call(mservo_instance.move_all_angles_sync)
+
+        mservo_instance.move_all_angles_sync.assert_called_once_with(
+            [30, -30], thread_worker.move_sec, thread_worker.step_n, "ease"
+        )
+
     def test_send_move_all_pulses(self, thread_worker):
         """move_all_pulsesコマンドのテスト"""
         mservo_instance = thread_worker.mservo
@@ -132,21 +151,18 @@ class TestThreadWorker:
         assert "Invalid command" in reply_json["error"]["message"]
         assert thread_worker.qsize == 0
 
-    @patch("time.sleep")
-    def test_handle_sleep(self, mock_sleep, thread_worker, mocker):
-        """_handle_sleepのテスト"""
-        # _cmdq.getをモックして、コマンドが処理されるのを待つ
-        mock_cmdq_get = mocker.patch.object(thread_worker._cmdq, "get")
+    def test_handle_sleep(self, thread_worker):
+        """_handle_sleepのテスト
+
+        sleepは、cancelで中断できるように、mservo.wait_cancel()で待つ。
+        """
+        mservo_instance = thread_worker.mservo
 
         cmd = {"method": "sleep", "params": {"sec": 0.1}}
         thread_worker.send(cmd)
-        # _wait_for_mock_callがmock_sleepを呼ばないように、
-        # ダミーのsleep_funcを渡す
-        self._wait_for_mock_call(
-            mock_cmdq_get, sleep_func=lambda x: None
-        )  # コマンドが処理されるのを待つ
+        self._wait_for_mock_call(mservo_instance.wait_cancel)
 
-        mock_sleep.assert_called_once_with(0.1)
+        mservo_instance.wait_cancel.assert_called_once_with(0.1)
         assert thread_worker.qsize == 0
 
     def test_clear_cmdq(self, thread_worker):
@@ -171,6 +187,367 @@ class TestThreadWorker:
 
         assert reply["result"]["value"] == 2  # 2つのコマンドがクリアされた
         assert thread_worker.qsize == 0
+        # 実行中の移動も中断する
+        thread_worker.mservo.cancel_move.assert_called_once()
+
+    def test_send_preempt(self, thread_worker, mocker):
+        """preemptを指定すると、実行待ちのコマンドを破棄して割り込む"""
+        mocker.patch.object(thread_worker, "_dispatch_cmd")
+        thread_worker.send({"method": "sleep", "params": {"sec": 10}})
+        thread_worker.send({"method": "move", "params": {"angles": [0]}})
+
+        cmd = {"method": "move", "params": {"angles": [30], "preempt": True}}
+        thread_worker.send(cmd)
+
+        thread_worker.mservo.cancel_move.assert_called_once()
+        assert thread_worker.qsize <= 1
+
+        # 割り込んだコマンドが実行される
+        start_time = time.time()
+        while time.time() - start_time < 1.0:
+            _call = thread_worker._dispatch_cmd.call_args
+            if _call and _call.args[0] == cmd:
+                break
+            time.sleep(0.01)
+        assert thread_worker._dispatch_cmd.call_args.args[0] == cmd
+
+    def test_run_clear_cancel(self, thread_worker):
+        """コマンドを実行する前に、中断状態を解除する"""
+        thread_worker.send({"method": "move", "params": {"angles": [0]}})
+        self._wait_for_mock_call(thread_worker.mservo.move_all_angles_sync)
+
+        thread_worker.mservo.clear_cancel.assert_called()
+
+    def test_send_reply_id(self, thread_worker):
+        """キューに入れたコマンドには、IDがつくこと"""
+        cmd = {"method": "move", "params": {"angles": [0]}}
+        id1 = thread_worker.send(cmd)["result"]["id"]
+        id2 = thread_worker.send(cmd)["result"]["id"]
+        assert id1 != id2
+
+        # "id"を指定した場合は、それを使う
+        cmd_id = {"method": "move", "params": {"angles": [0]}, "id": "abc"}
+        assert thread_worker.send(cmd_id)["result"]["id"] == "abc"
+
+    def test_send_await_status(self, thread_worker):
+        """await, statusコマンドのテスト"""
+        mservo_instance = thread_worker.mservo
+        mservo_instance.move_all_angles_sync.side_effect = lambda *args: (
+            time.sleep(0.1)
+        )
+        cmd = {"method": "move", "params": {"angles": [30]}}
+        req_id = thread_worker.send(cmd)["result"]["id"]
+
+        reply = thread_worker.send(
+            {"method": thread_worker.CMD_AWAIT, "params": {"id": req_id}}
+        )
+        status = reply["result"]["value"]
+        assert status["id"] == req_id
+        assert status["method"] == "move"
+        assert status["state"] == "done"
+        assert status["enqueue_time"] <= status["start_time"]
+        assert status["start_time"] <= status["end_time"]
+        assert status["exec_sec"] == pytest.approx(0.1, abs=0.05)
+
+        reply = thread_worker.send(
+            {"method": thread_worker.CMD_STATUS, "params": {"id": req_id}}
+        )
+        assert reply["result"]["value"] == status
+
+    def test_send_await_timeout(self, thread_worker):
+        """awaitのタイムアウトと、cancelされたコマンドの状態"""
+        release = threading.Event()
+        _mservo = thread_worker.mservo
+        _mservo.move_all_angles_sync.side_effect = lambda *_: release.wait(2)
+        cmd = {"method": "move", "params": {"angles": [30]}}
+        id1 = thread_worker.send(cmd)["result"]["id"]
+        id2 = thread_worker.send(cmd)["result"]["id"]
+
+        reply = thread_worker.send(
+            {"method": "await", "params": {"id": id1, "timeout": 0.05}}
+        )
+        assert reply["result"]["value"]["state"] == "running"
+
+        thread_worker.send({"method": thread_worker.CMD_CANCEL})
+        release.set()
+        reply = thread_worker.send({"method": "await", "params": {"id": id2}})
+        assert reply["result"]["value"]["state"] == "cancelled"
+
+    def test_send_status_unknown_id(self, thread_worker):
+        """statusコマンドのテスト (不明なID)"""
+        reply = thread_worker.send({"method": "status", "params": {"id": 99}})
+        assert (
+            reply["error"]["code"]
+            == thread_worker.ERROR_CODE["INVALID_PARAM"]
+        )
+
+    def test_send_estop(self, thread_worker):
+        """estopコマンドは、キューを通さずに、すぐに実行される"""
+        release = threading.Event()
+        _mservo = thread_worker.mservo
+        _mservo.move_all_angles_sync.side_effect = lambda *_: release.wait(2)
+        thread_worker.mservo.estop.return_value = {
+            "mode": "off",
+            "latency_sec": 0.001,
+        }
+        cmd = {"method": "move", "params": {"angles": [30]}}
+        thread_worker.send(cmd)
+        self._wait_for_mock_call(thread_worker.mservo.move_all_angles_sync)
+        thread_worker.send(cmd)
+        thread_worker.send(cmd)
+
+        reply = thread_worker.send(
+            {"method": thread_worker.CMD_ESTOP, "params": {"mode": "off"}}
+        )
+        release.set()
+
+        value = reply["result"]["value"]
+        assert value["mode"] == "off"
+        assert value["latency_sec"] == 0.001
+        assert value["cancelled"] == 2
+        assert thread_worker.qsize == 0
+
+        _args = thread_worker.mservo.estop.call_args.args
+        assert _args[0] == "off"
+        assert _args[1] <= time.monotonic()  # send()を呼んだ時刻
+
+    def test_send_estop_invalid_mode(self, thread_worker):
+        """estopコマンドのテスト (不正なモード)"""
+        reply = thread_worker.send(
+            {"method": "estop", "params": {"mode": "xxx"}}
+        )
+        assert (
+            reply["error"]["code"]
+            == thread_worker.ERROR_CODE["INVALID_PARAM"]
+        )
+        thread_worker.mservo.estop.assert_not_called()
+
+    def test_send_priority(self, thread_worker):
+        """優先度の高いコマンドが、先に実行される"""
+        release = threading.Event()
+        order = []
+
+        def _move(angles, *args):
+            order.append(angles[0])
+            release.wait(2)
+
+        thread_worker.mservo.move_all_angles_sync.side_effect = _move
+
+        def _cmd(angle, prio=None):
+            _c = {"method": "move", "params": {"angles": [angle]}}
+            if prio:
+                _c["priority"] = prio
+            return _c
+
+        thread_worker.send(_cmd(0))
+        self._wait_for_mock_call(thread_worker.mservo.move_all_angles_sync)
+
+        thread_worker.send(_cmd(1, "background"))
+        thread_worker.send(_cmd(2))
+        thread_worker.send(_cmd(3, "emergency"))
+
+        # emergencyは、実行中の移動も中断する
+        thread_worker.mservo.cancel_move.assert_called_once()
+
+        release.set()
+        thread_worker.send({"method": thread_worker.CMD_WAIT})
+        assert order == [0, 3, 2, 1]
+
+    def test_send_invalid_priority(self, thread_worker):
+        """不正な優先度"""
+        cmd = {"method": "move", "params": {"angles": [0]}, "priority": "x"}
+        reply = thread_worker.send(cmd)
+        assert (
+            reply["error"]["code"]
+            == thread_worker.ERROR_CODE["INVALID_PARAM"]
+        )
+        assert thread_worker.qsize == 0
+
+    def test_send_coalesce(self, thread_worker):
+        """coalesce: 同じサーボへの絶対位置のコマンドは、最新だけを実行"""
+        release = threading.Event()
+        thread_worker.mservo.move_all_angles.side_effect = lambda *_: (
+            release.wait(2)
+        )
+        thread_worker.coalesce = True
+
+        def _mv(angles):
+            return {"method": "move_all_angles", "params": {"angles": angles}}
+
+        thread_worker.send(_mv([0, 0]))
+        self._wait_for_mock_call(thread_worker.mservo.move_all_angles)
+
+        id1 = thread_worker.send(_mv([10, 10]))["result"]["id"]
+        thread_worker.send(_mv([20, 20]))
+        thread_worker.send(_mv([30, None]))  # サーボが違う
+        rel = {"method": "move_pulse_relative", "params": {"servo_i": 0}}
+        thread_worker.send(rel)  # 相対移動は、置き換えない
+        thread_worker.send(rel)
+        reply = thread_worker.send(_mv([40, None]))
+
+        assert reply["result"]["coalesced"] == 1
+        assert thread_worker.coalesced == 1
+        assert thread_worker.qsize == 5
+        reply = thread_worker.send(
+            {"method": "status", "params": {"id": id1}}
+        )
+        assert reply["result"]["value"]["state"] == "cancelled"
+
+        release.set()
+        thread_worker.send({"method": thread_worker.CMD_WAIT})
+        assert [
+            c.args[0]
+            for c in thread_worker.mservo.move_all_angles.call_args_list
+        ] == [[0, 0], [20, 20], [30, None], [40, None]]
+
+    def test_coalesce_key(self, thread_worker):
+        """coalesce のキー"""
+        _key = thread_worker._coalesce_key
+        _fut = MagicMock()
+
+        _fut.cmd = {"method": "move", "params": {"angles": [30, None, 0]}}
+        assert _key(_fut) == ("move_all_angles_sync", (0, 2))
+        _fut.cmd = {"method": "move_all_angles", "params": {"angles": [1]}}
+        assert _key(_fut) == ("move_all_angles", (0,))
+        _fut.cmd = {"method": "move_all_pulses", "params": {"pulses": [1, 2]}}
+        assert _key(_fut) == ("move_all_pulses", (0, 1))
+
+        _fut.cmd = {"method": "move_all_angles_sync_relative", "params": {}}
+        assert _key(_fut) is None
+        _fut.cmd = {"method": "set", "params": {"servo": 1}}
+        assert _key(_fut) is None
+        _fut.cmd = {"method": "move"}
+        assert _key(_fut) is None
+
+    def test_send_queue_full(self, mocker_multiservo, mocker_pigpio):
+        """queue_maxsize: 上限に達したら、QUEUE_FULLエラー"""
+        worker = ThreadWorker(
+            mocker_pigpio(),
+            PINS,
+            queue_maxsize=2,
+            queue_policy="reject",
+        )
+        cmd = {"method": "move", "params": {"angles": [0]}}
+        reply = worker.send(cmd)
+        assert reply["result"]["qsize"] == 1
+        worker.send(cmd)
+
+        reply = worker.send(cmd)
+        assert reply["error"]["code"] == worker.ERROR_CODE["QUEUE_FULL"]
+        assert worker.qsize == 2
+
+        reply = worker.send({"method": "qsize"})
+        assert reply["result"]["high_water"] == 2
+        assert reply["result"]["dropped"] == 0
+
+        # emergencyは、上限に達していても入れる
+        reply = worker.send({**cmd, "priority": "emergency"})
+        assert "error" not in reply
+        assert worker.qsize == 3
+
+    def test_send_queue_drop_oldest(self, mocker_multiservo, mocker_pigpio):
+        """queue_maxsize: drop_oldest"""
+        worker = ThreadWorker(
+            mocker_pigpio(),
+            PINS,
+            queue_maxsize=1,
+            queue_policy="drop_oldest",
+        )
+        cmd = {"method": "move", "params": {"angles": [0]}}
+        id1 = worker.send(cmd)["result"]["id"]
+        reply = worker.send(cmd)
+        assert reply["result"]["dropped"] == 1
+        assert worker.qsize == 1
+
+        reply = worker.send({"method": "status", "params": {"id": id1}})
+        assert reply["result"]["value"]["state"] == "cancelled"
+
+    def test_send_lookahead(self, thread_worker):
+        """lookahead: 続く同期移動を、一つの軌道にまとめて実行"""
+        release = threading.Event()
+        _mservo = thread_worker.mservo
+        _mservo.move_all_angles_sync.side_effect = lambda *_: release.wait(2)
+        thread_worker.lookahead = 2
+
+        def _mv(angles, **params):
+            return {
+                "method": "move",
+                "params": {"angles": angles, "move_sec": 0.1, **params},
+            }
+
+        thread_worker.send(_mv([0, 0]))
+        self._wait_for_mock_call(_mservo.move_all_angles_sync)
+
+        id1 = thread_worker.send(_mv([10, 10]))["result"]["id"]
+        thread_worker.send(_mv([20, None]))
+        thread_worker.send(_mv([30, 30]))
+        thread_worker.send(_mv([40, 40]))  # lookahead を超える
+        thread_worker.send(_mv([50, 50], step_n=5))  # ステップ数の指定
+
+        release.set()
+        thread_worker.send({"method": thread_worker.CMD_WAIT})
+
+        _mservo.move_all_angles_sync_path.assert_called_once_with(
+            [[10, 10], [20, None], [30, 30]], [0.1, 0.1, 0.1], None, None
+        )
+        assert [
+            c.args[0] for c in _mservo.move_all_angles_sync.call_args_list
+        ] == [[0, 0], [40, 40], [50, 50]]
+
+        reply = thread_worker.send(
+            {"method": "status", "params": {"id": id1}}
+        )
+        assert reply["result"]["value"]["state"] == "done"
+        assert not thread_worker._busy_flag
+
+    def _send_path(self, worker, n):
+        """先頭の移動で止めておき、続くn個の同期移動を送る"""
+        release = threading.Event()
+        _mservo = worker.mservo
+        _mservo.move_all_angles_sync.side_effect = lambda *_: release.wait(2)
+
+        worker.send({"method": "move", "params": {"angles": [0]}})
+        self._wait_for_mock_call(_mservo.move_all_angles_sync)
+        _ids = []
+        for _i in range(n):
+            _params = {"angles": [_i], "move_sec": 0.2}
+            _reply = worker.send({"method": "move", "params": _params})
+            _ids.append(_reply["result"]["id"])
+        release.set()
+        worker.send({"method": worker.CMD_WAIT})
+        return _ids
+
+    def test_send_lookahead_interval(self, thread_worker):
+        """lookahead: `interval_sec`が0より大きい場合は、まとめない"""
+        thread_worker.lookahead = 2
+        thread_worker.interval_sec = 0.01
+        self._send_path(thread_worker, 2)
+
+        _mservo = thread_worker.mservo
+        _mservo.move_all_angles_sync_path.assert_not_called()
+        assert _mservo.move_all_angles_sync.call_count == 3
+        assert _mservo.wait_cancel.call_count == 3
+
+    def test_send_lookahead_interrupted(self, thread_worker):
+        """lookahead: 中断された場合、通過できなかった移動は中断扱い"""
+        _mservo = thread_worker.mservo
+
+        def _path(*_args):
+            time.sleep(0.3)  # 1つ目(0.2秒)だけ通過
+            _mservo.cancel_event.set()
+
+        _mservo.move_all_angles_sync_path.side_effect = _path
+        thread_worker.lookahead = 2
+        _ids = self._send_path(thread_worker, 3)
+
+        _mservo.move_all_angles_sync_path.assert_called_once()
+        _states = [
+            thread_worker.send({"method": "status", "params": {"id": _id}})[
+                "result"
+            ]["value"]["state"]
+            for _id in _ids
+        ]
+        assert _states == ["done", "cancelled", "cancelled"]
 
     def test_send_qsize_command(self, thread_worker):
         """qsizeコマンドのテスト"""
@@ -183,13 +560,71 @@ class TestThreadWorker:
         assert reply["result"]["value"] == 1
         assert thread_worker.qsize == 1
 
+    def test_send_move_result_stats(self, thread_worker):
+        """同期移動の結果は、その移動の統計"""
+        thread_worker.mservo.last_move_stats = {"step_n": 10, "dropped": 0}
+        _cmd = {"method": "move", "params": {"angles": [0]}}
+        _id = thread_worker.send(_cmd)["result"]["id"]
+        reply = thread_worker.send(
+            {"method": thread_worker.CMD_AWAIT, "params": {"id": _id}}
+        )
+        assert reply["result"]["value"]["result"] == {
+            "step_n": 10,
+            "dropped": 0,
+        }
+
+    def test_send_duplicate_id(self, thread_worker):
+        """終わっていないコマンドと同じ"id"は、エラー"""
+        release = threading.Event()
+        _mservo = thread_worker.mservo
+        _mservo.move_all_angles_sync.side_effect = lambda *_: release.wait(2)
+
+        _cmd = {"method": "move", "params": {"angles": [0]}, "id": 1}
+        assert thread_worker.send(_cmd)["result"]["id"] == 1
+        reply = thread_worker.send(_cmd)
+        assert reply["error"]["code"] == -32602
+
+        # 自動採番は、指定されたIDを飛ばす
+        _cmd = {"method": "move", "params": {"angles": [0]}}
+        assert thread_worker.send(_cmd)["result"]["id"] == 2
+
+        release.set()
+        thread_worker.send({"method": thread_worker.CMD_WAIT})
+        assert _mservo.move_all_angles_sync.call_count == 2
+
+    def test_send_stats_command(self, thread_worker):
+        """statsコマンド: キューを通さずに、書き込みの統計を返す"""
+        _mservo = thread_worker.mservo
+        _mservo.write_stats = {"written": 3, "skipped": 1}
+        _mservo.last_move_stats = {"step_n": 10}
+
+        reply = thread_worker.send({"method": thread_worker.CMD_STATS})
+        assert reply["result"]["value"] == {
+            "write": {"written": 3, "skipped": 1},
+            "last_move": {"step_n": 10},
+        }
+        _mservo.reset_write_stats.assert_not_called()
+
+        thread_worker.send(
+            {"method": thread_worker.CMD_STATS, "params": {"reset": True}}
+        )
+        _mservo.reset_write_stats.assert_called_once()
+        assert thread_worker.qsize == 0
+
     def test_send_wait_command(self, thread_worker, mocker):
-        """waitコマンドのテスト"""
-        # _busy_flagとqsizeをモックして、waitコマンドの動作を制御する
-        thread_worker._busy_flag = True
-        mock_cmdq_qsize = mocker.patch.object(
-            thread_worker._cmdq, "qsize", return_value=1
+        """waitコマンドのテスト
+
+        実行中のコマンドがある間はブロックし、
+        最後のコマンドが終わると、すぐに戻る。
+        """
+        # 実行中のコマンドを、イベントで止めておく
+        release = threading.Event()
+        mocker.patch.object(
+            thread_worker,
+            "_dispatch_cmd",
+            side_effect=lambda cmd: release.wait(2),
         )
+        thread_worker.send({"method": "sleep", "params": {"sec": 1}})
 
         cmd_wait = {"method": thread_worker.CMD_WAIT}
 
@@ -199,19 +634,43 @@ class TestThreadWorker:
         )
         send_thread.start()
 
-        # waitコマンドがブロックされている間に、_busy_flagとqsizeを変更
         time.sleep(0.1)  # waitコマンドが実行されるのを待つ
         assert send_thread.is_alive()
+        assert thread_worker._busy_flag
 
-        thread_worker._busy_flag = False
-        mock_cmdq_qsize.return_value = 0  # qsizeを0に変更
-
-        send_thread.join(timeout=1)  # waitコマンドが終了するのを待つ
+        # コマンドを終わらせると、waitもすぐに終わる
+        t_release = time.monotonic()
+        release.set()
+        send_thread.join(timeout=1)
         assert not send_thread.is_alive()
+        assert time.monotonic() - t_release < 0.1
 
-        # 最終的なqsizeが0であることを確認
+        assert not thread_worker._busy_flag
         assert thread_worker.qsize == 0
 
+    def test_send_wait_timeout(self, thread_worker, mocker):
+        """waitのタイムアウト: 終わっていなければ、busy_flagがTrue"""
+        release = threading.Event()
+        mocker.patch.object(
+            thread_worker,
+            "_dispatch_cmd",
+            side_effect=lambda cmd: release.wait(2),
+        )
+        thread_worker.send({"method": "sleep", "params": {"sec": 1}})
+
+        _t0 = time.monotonic()
+        reply = thread_worker.send(
+            {"method": thread_worker.CMD_WAIT, "params": {"timeout": 0.05}}
+        )
+        assert time.monotonic() - _t0 < 1
+        assert reply["result"]["busy_flag"]
+
+        release.set()
+        reply = thread_worker.send(
+            {"method": thread_worker.CMD_WAIT, "params": {"timeout": 1}}
+        )
+        assert not reply["result"]["busy_flag"]
+
     def test_send_error_key_command(self, thread_worker):
         """send()メソッドのエラーキーチェックのテスト"""
         cmd = {"error": "INVALID_JSON", "data": "some_data"}
@@ -264,7 +723,7 @@ class TestThreadWorker:
         )
 
         mservo_instance.move_all_angles_sync_relative.assert_called_once_with(
-            [10, -10], 0.1, 10
+            [10, -10], 0.1, 10, None
         )
         assert thread_worker.qsize == 0
 
@@ -312,6 +771,26 @@ class TestThreadWorker:
         assert thread_worker.step_n == 50
         assert thread_worker.qsize == 0
 
+    @pytest.mark.parametrize(
+        ("params", "expected"),
+        [
+            ({"n": None}, None),
+            ({"n": "auto"}, None),
+            ({"step_n": "AUTO"}, None),
+            ({"step_n": 20}, 20),
+            ({"n": 0}, 50),  # エラー: 変更しない
+            ({"n": -1}, 50),
+            ({"n": "x"}, 50),
+            ({}, 50),
+        ],
+    )
+    def test_handle_step_n_auto(self, thread_worker, params, expected):
+        """_handle_step_nのテスト (null, "auto": 自動)"""
+        thread_worker.step_n = 50
+        thread_worker._handle_step_n({"method": "step_n", "params": params})
+
+        assert thread_worker.step_n == expected
+
     def test_handle_interval(self, thread_worker, mocker):
         """_handle_intervalのテスト"""
         mock_cmdq_get = mocker.patch.object(thread_worker._cmdq, "get")
@@ -348,3 +827,76 @@ class TestThreadWorker:
         # コマンド処理後、キューが空になったらbusy_flagはFalseに戻る
         assert thread_worker._busy_flag is False
         assert thread_worker.qsize == 0
+
+
+@pytest.fixture
+def real_worker(mocker_pigpio, tmp_path, monkeypatch):
+    """本物のMultiServo(pigpioはモック)で動く、開始前のThreadWorker"""
+    monkeypatch.chdir(tmp_path)
+    worker = ThreadWorker(mocker_pigpio(), PINS, first_move=False)
+    worker.mservo.move_all_angles = MagicMock()
+    yield worker
+    worker.end()
+
+
+def _fire_after_get(worker: ThreadWorker, cmd: dict):
+    """最初に取り出した直後(実行する前)に、`cmd`を送る"""
+    _get = worker._cmdq.get
+    _fired = threading.Event()
+
+    def _get_and_fire(*args, **kwargs):
+        _item = _get(*args, **kwargs)
+        if _item is not None and not _fired.is_set():
+            _fired.set()
+            worker.send(cmd)
+        return _item
+
+    worker._cmdq.get = _get_and_fire
+
+
+def _state(worker: ThreadWorker, reply: dict) -> str:
+    return worker._futures.get(reply["result"]["id"]).state
+
+
+class TestThreadWorkerCancelRace:
+    """取り出してから実行するまでの間の中断"""
+
+    MOVE = {"method": "move_all_angles", "params": {"angles": [30, 30]}}
+
+    @pytest.mark.parametrize(
+        "stop_cmd",
+        [
+            {"method": "cancel"},
+            {"method": "estop"},
+            {"method": "estop", "params": {"mode": "off"}},
+        ],
+    )
+    def test_stop_before_exec(self, real_worker, stop_cmd):
+        """取り出したコマンドは実行せず、後から送ったコマンドは実行する"""
+        _fire_after_get(real_worker, stop_cmd)
+        _old = real_worker.send(self.MOVE)
+        real_worker.start()
+        real_worker.send({"method": "wait"})
+
+        assert _state(real_worker, _old) == "cancelled"
+        real_worker.mservo.move_all_angles.assert_not_called()
+        assert real_worker.mservo.cancel_event.is_set()  # hold
+
+        _new = real_worker.send(self.MOVE)
+        real_worker.send({"method": "wait"})
+
+        assert _state(real_worker, _new) == "done"
+        real_worker.mservo.move_all_angles.assert_called_once()
+
+    def test_emergency_before_exec(self, real_worker):
+        """emergency: 取り出したコマンドだけを中断し、実行待ちは残す"""
+        _emergency = {**self.MOVE, "priority": "emergency"}
+        _fire_after_get(real_worker, _emergency)
+        _first = real_worker.send(self.MOVE)
+        _queued = real_worker.send(self.MOVE)
+        real_worker.start()
+        real_worker.send({"method": "wait"})
+
+        assert _state(real_worker, _first) == "cancelled"
+        assert _state(real_worker, _queued) == "done"
+        assert real_worker.mservo.move_all_angles.call_count == 2
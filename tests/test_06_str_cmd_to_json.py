@@ -97,18 +97,71 @@ class TestStrCmdToJson:
         result = instance.cmdstr_to_json(cmd_str)
         assert result == expected_json_obj
 
-    def test_cmdstr_to_json_step_n_less_than_one(self):
-        """cmdstr_to_jsonでstep_nが1未満のテスト"""
+    @pytest.mark.parametrize("profile", ["linear", "ease", "Trapezoid"])
+    def test_cmdstr_to_json_mv_profile(self, profile):
+        """cmdstr_to_jsonでmvにプロファイルを指定するテスト"""
         instance = StrCmdToJson()
-        cmd_str = "st:0"
+        result = instance.cmdstr_to_json(f"mv:30,.,c:{profile}")
+        assert result == {
+            "method": "move_all_angles_sync",
+            "params": {
+                "angles": [30, None, "center"],
+                "profile": profile.lower(),
+            },
+        }
+
+    def test_cmdstr_to_json_mv_invalid_profile(self):
+        """cmdstr_to_jsonでmvのプロファイルが不正なテスト"""
+        instance = StrCmdToJson()
+        result = instance.cmdstr_to_json("mv:30,20:bouncy")
+        assert result == {
+            "method": "ERROR",
+            "error": "INVALID_PARAM",
+            "data": "mv:30,20:bouncy",
+        }
+
+    def test_cmdstr_to_json_step_n_negative(self):
+        """cmdstr_to_jsonでstep_nが負のテスト"""
+        instance = StrCmdToJson()
+        cmd_str = "st:-1"
         expected_json_obj = {
             "method": "ERROR",
             "error": "INVALID_PARAM",
-            "data": "st:0",
+            "data": "st:-1",
         }
         result = instance.cmdstr_to_json(cmd_str)
         assert result == expected_json_obj
 
+    def test_cmdstr_to_json_step_n_auto(self):
+        """cmdstr_to_jsonでstep_nが"auto"(自動)のテスト"""
+        instance = StrCmdToJson()
+        result = instance.cmdstr_to_json("st:auto")
+        assert result == {"method": "step_n", "params": {"n": "auto"}}
+
+        result = instance.cmdstr_to_json("st:0")
+        assert result["error"] == "INVALID_PARAM"
+
+    @pytest.mark.parametrize(
+        ("cmd_str", "expected_json_obj"),
+        [
+            ("es", {"method": "estop"}),
+            ("es:off", {"method": "estop", "params": {"mode": "off"}}),
+            ("ES:Hold", {"method": "estop", "params": {"mode": "hold"}}),
+            (
+                "es:xxx",
+                {
+                    "method": "ERROR",
+                    "error": "INVALID_PARAM",
+                    "data": "es:xxx",
+                },
+            ),
+        ],
+    )
+    def test_cmdstr_to_json_estop(self, cmd_str, expected_json_obj):
+        """cmdstr_to_jsonでestopのテスト"""
+        instance = StrCmdToJson()
+        assert instance.cmdstr_to_json(cmd_str) == expected_json_obj
+
     @pytest.mark.parametrize(
         ("cmd_str", "expected_json_obj"),
         [
@@ -155,7 +208,7 @@ class TestStrCmdToJson:
                     {
                         "method": "set",
                         "params": {
-                            "servo_i": 0,
+                            "servo": 0,
                             "target": "center",
                             "pulse": None,
                         },
@@ -168,7 +221,7 @@ class TestStrCmdToJson:
                     {
                         "method": "set",
                         "params": {
-                            "servo_i": 1,
+                            "servo": 1,
                             "target": "min",
                             "pulse": 1500,
                         },
@@ -294,3 +347,46 @@ class TestStrCmdToJson:
         result = str_cmd_to_json_instance.cmdstr_to_jsonliststr(cmd_line)
         result_obj = json.loads(result)
         assert result_obj == expected_json_obj
+
+
+class TestStrCmdToJsonCache:
+    """StrCmdToJsonのキャッシュのテスト"""
+
+    def test_cache_hits(self):
+        """同じ文字列は、解析しない"""
+        _parser = StrCmdToJson(cache_size=8)
+        _line = "mv:30,.,c ms:0.5 mv:30,.,c"
+        _expected = StrCmdToJson().cmdstr_to_jsonlist(_line)
+
+        assert _parser.cmdstr_to_jsonlist(_line) == _expected
+        assert _parser.cache_hits == 1
+        assert _parser.cmdstr_to_jsonlist(_line) == _expected
+        assert _parser.cache_hits == 4
+
+    def test_cache_copy(self):
+        """返り値を変更しても、キャッシュは変わらない"""
+        _parser = StrCmdToJson(cache_size=8)
+        _cmd = _parser.cmdstr_to_json_cached("mv:30,0")
+        _cmd["params"]["angles"][0] = 90
+        _cmd["group"] = "arm"
+
+        assert _parser.cmdstr_to_json_cached("mv:30,0") == {
+            "method": "move_all_angles_sync",
+            "params": {"angles": [30, 0]},
+        }
+
+    def test_cache_evict(self):
+        """cache_size個を超えたら、古いものから消す"""
+        _parser = StrCmdToJson(cache_size=2)
+        for _s in ("sl:0.1", "sl:0.2", "sl:0.1", "sl:0.3"):
+            _parser.cmdstr_to_json_cached(_s)
+
+        assert list(_parser._cache) == ["sl:0.1", "sl:0.3"]
+
+    def test_no_cache(self):
+        """cache_size=0: キャッシュしない"""
+        _parser = StrCmdToJson()
+        _parser.cmdstr_to_jsonlist("sl:0.1 sl:0.1")
+
+        assert _parser.cache_hits == 0
+        assert not _parser._cache
@@ -22,6 +22,8 @@ def mocker_multiservo():
         "pi0servo.helper.thread_worker.MultiServo"
     ) as mock_mservo_constructor:
         mock_mservo_instance = MagicMock(spec=MultiServo)
+        mock_mservo_instance.cancel_gen = 0
+        mock_mservo_instance.last_move_stats = {}
         mock_mservo_constructor.return_value = mock_mservo_instance
         yield mock_mservo_constructor
 
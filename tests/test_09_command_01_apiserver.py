@@ -0,0 +1,107 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_command_01_apiserver.py
+"""
+
+import os
+import socket
+from unittest.mock import patch
+
+import pytest
+
+from pi0servo.command.cmd_apiserver import CmdApiServer
+
+
+@pytest.fixture
+def mock_uvicorn():
+    """サーバーは起動しない"""
+    with patch("pi0servo.command.cmd_apiserver.uvicorn") as _uvicorn:
+        yield _uvicorn
+
+
+def _server(**kwargs) -> CmdApiServer:
+    """空いているポートで動かす CmdApiServer"""
+    return CmdApiServer([17, 18], "127.0.0.1", 0, **kwargs)
+
+
+class TestCmdApiServer:
+    """CmdApiServerクラスのテスト"""
+
+    def test_main_dev(self, mock_uvicorn):
+        """開発用: 自動リロード"""
+        _server().main()
+
+        mock_uvicorn.run.assert_called_once()
+        assert mock_uvicorn.run.call_args.kwargs["reload"] is True
+        mock_uvicorn.Server.assert_not_called()
+        assert os.environ[CmdApiServer.ENV_PINS] == "17,18"
+
+    def test_main_production(self, mock_uvicorn):
+        """production: 同じプロセスで、リロードなし"""
+        _nodelay: list = []
+        mock_uvicorn.Server.return_value.run.side_effect = lambda sockets: (
+            _nodelay.extend(
+                _s.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+                for _s in sockets
+            )
+        )
+
+        _server(production=True).main()
+
+        mock_uvicorn.run.assert_not_called()
+        _kwargs = mock_uvicorn.Config.call_args.kwargs
+        assert "reload" not in _kwargs
+        assert _kwargs["access_log"] is False
+        assert _kwargs["loop"] in ("uvloop", "asyncio")
+        assert _kwargs["http"] in ("httptools", "h11")
+        assert _nodelay == [1]  # TCPのみ
+
+    @pytest.mark.parametrize(
+        ("found", "expected"),
+        [
+            (True, {"loop": "uvloop", "http": "httptools"}),
+            (False, {"loop": "asyncio", "http": "h11"}),
+        ],
+    )
+    def test_server_options(self, found, expected):
+        """使える中で、速いイベントループとHTTPパーサー"""
+        with patch.object(CmdApiServer, "_has_module", return_value=found):
+            _options = _server(production=True).server_options()
+
+        assert _options == {**expected, "access_log": False}
+        assert _server().server_options() == {}
+
+    def test_main_uds(self, mock_uvicorn, tmp_path):
+        """uds: TCPとUnixドメインソケット。終わったら、ソケットを消す"""
+        _path = str(tmp_path / "api.sock")
+        _families: list = []
+        _run = mock_uvicorn.Server.return_value.run
+        _run.side_effect = lambda sockets: _families.extend(
+            _s.family for _s in sockets
+        )
+
+        _server(uds=_path).main()
+
+        assert _families == [socket.AF_INET, socket.AF_UNIX]
+        assert not os.path.exists(_path)
+
+    def test_bind_uds(self, tmp_path):
+        """前に残ったソケットファイルは消して、作り直す"""
+        _path = str(tmp_path / "api.sock")
+        for _ in range(2):
+            _sock = CmdApiServer.bind_uds(_path)
+            _sock.listen()
+            with socket.socket(socket.AF_UNIX) as _client:
+                _client.connect(_path)
+            _sock.close()
+        assert os.stat(_path).st_mode & 0o777 == 0o660
+
+    def test_bind_uds_not_socket(self, tmp_path):
+        """ソケット以外のファイルは消さない"""
+        _path = tmp_path / "api.sock"
+        _path.write_text("")
+        with pytest.raises(FileExistsError, match="not a socket"):
+            CmdApiServer.bind_uds(str(_path))
+        assert _path.exists()
@@ -0,0 +1,46 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_command_02_cli.py
+
+サブコマンドのオプションと関数の引数が合っていることを、
+同じプロセスで(CliRunner)確かめる。
+"""
+
+import pytest
+from click.testing import CliRunner
+
+from pi0servo.__main__ import cli
+
+
+@pytest.fixture
+def runner(mocker_pigpio, tmp_path, monkeypatch):
+    """pigpioはモック。設定ファイルは一時ディレクトリに作る"""
+    monkeypatch.chdir(tmp_path)
+    return CliRunner()
+
+
+class TestCli:
+    """pi0servo CLIのテスト"""
+
+    @pytest.mark.parametrize(
+        "subcmd",
+        ["api-cli", "str-cli", "api-client", "str-client", "api-server"],
+    )
+    def test_help(self, runner, subcmd):
+        """--help"""
+        _res = runner.invoke(cli, [subcmd, "--help"])
+
+        assert _res.exit_code == 0, _res.output
+        assert "Usage: " in _res.output
+
+    def test_api_cli_script(self, runner, tmp_path):
+        """api-cli: スクリプトのコマンドを実行する"""
+        _script = tmp_path / "script.txt"
+        _script.write_text('{"method": "qsize"}\n')
+
+        _res = runner.invoke(cli, ["api-cli", "17,27", "-f", str(_script)])
+
+        assert _res.exception is None, _res.exception
+        assert "'qsize': 0" in _res.output
@@ -0,0 +1,129 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_core_01_script_player.py
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from pi0servo.core.script_player import ScriptPlayer
+
+PINS = [17, 27]
+
+
+@pytest.fixture
+def mock_pi():
+    """スクリプト対応のpigpio.piのモック"""
+    pi = MagicMock()
+    pi.store_script.return_value = 3
+    pi.run_script.return_value = 0
+    pi.script_status.return_value = (ScriptPlayer.SCRIPT_HALTED, ())
+    return pi
+
+
+class TestScriptPlayer:
+    """ScriptPlayerクラスのテスト"""
+
+    def test_compile(self, mock_pi):
+        """変化したパルスだけがスクリプトになること"""
+        player = ScriptPlayer(mock_pi)
+        rows = [[1500, 1500], [1510, 1500], [1520, 1500]]
+
+        script = player.compile(PINS, rows, 0.005)
+
+        assert script == (
+            "servo 17 1500 servo 27 1500 mics 5000 "
+            "servo 17 1510 mics 5000 "
+            "servo 17 1520 mics 5000"
+        )
+
+    def test_compile_long_step(self, mock_pi):
+        """1秒を超える待ちは、`mics`を分ける"""
+        player = ScriptPlayer(mock_pi)
+
+        script = player.compile(PINS, [[1500, 1500]], 2.5)
+
+        assert script == (
+            "servo 17 1500 servo 27 1500 "
+            "mics 1000000 mics 1000000 mics 500000"
+        )
+
+    @patch("time.sleep")
+    def test_play(self, mock_sleep, mock_pi):
+        """再生のテスト"""
+        player = ScriptPlayer(mock_pi)
+        rows = [[1500, 1500], [1510, 1490]]
+
+        assert player.play(PINS, rows, 0.01) is True
+
+        mock_pi.store_script.assert_called_once()
+        mock_pi.run_script.assert_called_once_with(3)
+
+    @patch("time.sleep")
+    def test_play_cached(self, mock_sleep, mock_pi):
+        """同じ軌道は、再度storeされないこと"""
+        player = ScriptPlayer(mock_pi)
+        rows = [[1500, 1500], [1510, 1490]]
+
+        player.play(PINS, rows, 0.01)
+        player.play(PINS, rows, 0.01)
+
+        mock_pi.store_script.assert_called_once()
+        assert mock_pi.run_script.call_count == 2
+
+    @patch("time.sleep")
+    def test_play_cache_evict(self, mock_sleep, mock_pi):
+        """キャッシュがいっぱいの場合、古いスクリプトが削除されること"""
+        mock_pi.store_script.side_effect = [1, 2]
+        player = ScriptPlayer(mock_pi, cache_n=1)
+
+        player.play(PINS, [[1500, 1500]], 0.01)
+        player.play(PINS, [[1600, 1500]], 0.01)
+
+        mock_pi.delete_script.assert_called_once_with(1)
+
+    def test_play_too_long(self, mock_pi):
+        """スクリプトが長すぎる場合は、フォールバック"""
+        player = ScriptPlayer(mock_pi, max_script_len=10)
+        rows = [[1500, 1500], [1510, 1490]]
+
+        assert player.play(PINS, rows, 0.01) is False
+        mock_pi.store_script.assert_not_called()
+
+    def test_play_not_supported(self):
+        """スクリプト非対応のバックエンドは、フォールバック"""
+        pi = MagicMock(spec=["set_servo_pulsewidth"])
+        player = ScriptPlayer(pi)
+
+        assert player.supported is False
+        assert player.play(PINS, [[1500, 1500]], 0.01) is False
+
+    def test_play_store_error(self, mock_pi):
+        """store_script()が失敗した場合は、フォールバック"""
+        mock_pi.store_script.side_effect = Exception("no script room")
+        player = ScriptPlayer(mock_pi)
+
+        assert player.play(PINS, [[1500, 1500]], 0.01) is False
+        mock_pi.run_script.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "status",
+        [ScriptPlayer.SCRIPT_FAILED, ConnectionError("pigpiod")],
+    )
+    @patch("time.sleep")
+    def test_play_error_after_run(self, mock_sleep, mock_pi, status):
+        """再生を始めた後の失敗は、スクリプトを止めて、例外にする"""
+        mock_pi.script_status.side_effect = [
+            (ScriptPlayer.SCRIPT_HALTED, ()),  # store_script()の後
+            status if isinstance(status, Exception) else (status, ()),
+        ]
+        player = ScriptPlayer(mock_pi)
+
+        with pytest.raises(RuntimeError):
+            player.play(PINS, [[1500, 1500]], 0.01)
+
+        mock_pi.run_script.assert_called_once_with(3)
+        mock_pi.stop_script.assert_called_once_with(3)
@@ -0,0 +1,193 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_core_02_trajectory.py
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from pi0servo.core.calibrable_servo import CalibrableServo
+from pi0servo.core.motion_profile import MotionProfile
+from pi0servo.core.trajectory import TrajectoryPlanner
+
+PINS = [17, -27]  # 2番目は逆回転
+CONF_FILE = "test_trajectory_conf.json"
+
+
+@pytest.fixture
+def servos(mocker_pigpio):
+    """キャリブレーション値の異なるCalibrableServoのリスト"""
+    with patch("pi0servo.core.calibrable_servo.ServoConfigManager") as scm:
+        scm.return_value.get_config.return_value = None
+        scm.return_value.conf_file = CONF_FILE
+
+        pi = mocker_pigpio()
+        _servos = [
+            CalibrableServo(pi, pin, conf_file=CONF_FILE) for pin in PINS
+        ]
+
+    _servos[0]._pulse_min = 600
+    _servos[0]._pulse_center = 1450
+    _servos[0]._pulse_max = 2400
+    _servos[1]._pulse_min = 550
+    _servos[1]._pulse_center = 1500
+    _servos[1]._pulse_max = 2300
+    return _servos
+
+
+class TestTrajectoryPlanner:
+    """TrajectoryPlannerクラスのテスト"""
+
+    @pytest.mark.parametrize(
+        "angles", [[0, 0], [90, -90], [45.5, -12.3], [-90, 90], [-0.1, 0.1]]
+    )
+    def test_angles2pulses(self, servos, angles):
+        """deg2pulse()と同じ結果になること"""
+        planner = TrajectoryPlanner(servos)
+
+        pulses = planner.angles2pulses(angles).tolist()
+
+        assert pulses == [
+            s.deg2pulse(a) for s, a in zip(servos, angles, strict=True)
+        ]
+
+    def test_plan(self, servos):
+        """各ステップが、線形補間した角度のパルス幅になること"""
+        planner = TrajectoryPlanner(servos)
+        start = [10.0, -20.0]
+        target = [90.0, 40.0]
+        step_n = 8
+
+        matrix = planner.plan(start, target, step_n)
+
+        assert matrix.shape == (step_n, len(servos))
+        for i in range(step_n):
+            expected = [
+                s.deg2pulse(st + (tg - st) * (i + 1) / step_n)
+                for s, st, tg in zip(servos, start, target, strict=True)
+            ]
+            assert matrix[i].tolist() == expected
+
+        assert matrix[-1, 0] == servos[0].pulse_max
+
+    @pytest.mark.parametrize("profile", MotionProfile.PROFILES)
+    def test_plan_profile(self, servos, profile):
+        """プロファイルの進み具合で補間し、最終行が目標になること"""
+        planner = TrajectoryPlanner(servos)
+        start = [-40.0, 10.0]
+        target = [60.0, -30.0]
+        table = MotionProfile.table(profile, 10)
+
+        matrix = planner.plan(start, target, 10, profile)
+
+        for i in range(10):
+            angles = [
+                st + (tg - st) * table[i]
+                for st, tg in zip(start, target, strict=True)
+            ]
+            assert (
+                matrix[i].tolist() == planner.angles2pulses(angles).tolist()
+            )
+        assert matrix[-1].tolist() == planner.angles2pulses(target).tolist()
+
+    def test_plan_clip(self, servos):
+        """範囲外の角度は、クリップされること"""
+        planner = TrajectoryPlanner(servos)
+
+        matrix = planner.plan([-135.0, 0.0], [-135.0, 0.0], 2)
+
+        assert matrix[:, 0].tolist() == [servos[0].pulse_min] * 2
+
+    def test_plan_calib_changed(self, servos):
+        """キャリブレーションの変更が反映されること"""
+        planner = TrajectoryPlanner(servos)
+        servos[0]._pulse_max = 2000
+
+        matrix = planner.plan([0.0, 0.0], [90.0, 0.0], 1)
+
+        assert matrix[-1, 0] == 2000
+
+    @pytest.mark.parametrize(
+        ("move_sec", "frame_sec", "expected"),
+        [(0.2, 0.02, 10), (0.21, 0.02, 11), (0.01, 0.02, 1), (0.0, 0.02, 1)],
+    )
+    def test_adaptive_step_n(self, servos, move_sec, frame_sec, expected):
+        """ステップ数が、動作時間 / PWMフレーム周期 になること"""
+        planner = TrajectoryPlanner(servos)
+
+        step_n = planner.adaptive_step_n(
+            [0.0, 0.0], [90.0, 0.0], move_sec, frame_sec
+        )
+
+        assert step_n == expected
+
+    @pytest.mark.parametrize(
+        ("target", "min_pulse_step", "expected"),
+        [
+            ([90.0, 0.0], 10, 50),  # 950us / 10us = 95 -> 50 (フレーム数)
+            ([10.0, 0.0], 20, 6),  # 106us / 20us -> 6
+            ([0.0, 0.0], 20, 1),  # 動かない
+        ],
+    )
+    def test_adaptive_step_n_min_pulse_step(
+        self, servos, target, min_pulse_step, expected
+    ):
+        """小さな動きは、ステップ数が少なくなること"""
+        planner = TrajectoryPlanner(servos)
+
+        step_n = planner.adaptive_step_n(
+            [0.0, 0.0], target, 1.0, 0.02, min_pulse_step
+        )
+
+        assert step_n == expected
+
+    def test_plan_path(self, servos):
+        """経由点を、止まらずに通過すること"""
+        planner = TrajectoryPlanner(servos)
+        start = [0.0, 0.0]
+        waypoints = [[40.0, -20.0], [0.0, 20.0]]
+
+        pulses = planner.plan_path(start, waypoints, [0.2, 0.2], 10)
+
+        assert pulses.shape == (10, 2)
+        # 区間の境界(5ステップ目)で、経由点を通過する
+        assert pulses[4].tolist() == planner.angles2pulses([40, -20]).tolist()
+        assert pulses[-1].tolist() == planner.angles2pulses([0, 20]).tolist()
+
+        # 経由点の前後で、止まらない(同じパルス幅が続かない)
+        assert (pulses[1:, 0] != pulses[:-1, 0]).all()
+
+    def test_plan_path_move_secs(self, servos):
+        """区間ごとの時間に比例して、ステップが割り当てられること"""
+        planner = TrajectoryPlanner(servos)
+
+        pulses = planner.plan_path([0, 0], [[30, 0], [60, 0]], [0.3, 0.1], 4)
+
+        assert pulses[:, 0].tolist() == [
+            servos[0].deg2pulse(a) for a in [10, 20, 30, 60]
+        ]
+
+    def test_plan_path_profile(self, servos):
+        """プロファイルは、全体にかかること"""
+        planner = TrajectoryPlanner(servos)
+        table = MotionProfile.table(MotionProfile.EASE, 8)
+
+        pulses = planner.plan_path(
+            [0, 0], [[45, 0], [90, 0]], [0.1, 0.1], 8, MotionProfile.EASE
+        )
+
+        assert pulses[:, 0].tolist() == [
+            servos[0].deg2pulse(90 * r) for r in table
+        ]
+
+    def test_path_step_n(self, servos):
+        """経路に沿ったパルス変化量で、ステップ数を制限すること"""
+        planner = TrajectoryPlanner(servos)
+        points = [[0, 0], [10, 0], [0, 0]]  # 始点と終点が同じ
+
+        assert planner.path_step_n(points, 1.0, 0.02) == 50
+        # servo0: 0 -> 10 -> 0 で、合計 2 x 106us
+        assert planner.path_step_n(points, 1.0, 0.02, 20) == 11
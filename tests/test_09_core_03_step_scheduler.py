@@ -0,0 +1,132 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_core_03_step_scheduler.py
+"""
+
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from pi0servo.core.step_scheduler import StepScheduler
+
+
+class FakeClock:
+    """time.monotonic()とtime.sleep()の代わりになる、仮想的な時計。
+
+    書き込みごとに`write_sec`だけ時間が進む。
+    """
+
+    def __init__(self, write_sec=0.0):
+        self.now = 100.0
+        self.write_sec = write_sec
+        self.written = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, sec):
+        self.now += sec
+
+    def write(self, row):
+        self.written.append(row)
+        self.now += self.write_sec
+
+
+@pytest.fixture
+def clock():
+    """仮想的な時計に差し替える"""
+    _clock = FakeClock()
+    with (
+        patch("time.monotonic", side_effect=_clock.monotonic),
+        patch("time.sleep", side_effect=_clock.sleep),
+    ):
+        yield _clock
+
+
+class TestStepScheduler:
+    """StepSchedulerクラスのテスト"""
+
+    def test_run_on_time(self, clock):
+        """書き込みが速い場合は、すべてのステップが期限通りに送られる"""
+        clock.write_sec = 0.001
+        rows = list(range(10))
+
+        stats = StepScheduler().run(rows, 0.02, clock.write)
+
+        assert clock.written == rows
+        assert stats["sent"] == 10
+        assert stats["dropped"] == 0
+        assert stats["max_overrun_sec"] == pytest.approx(0.0)
+        # 書き込み時間は待ち時間で吸収され、予定通りに終わる
+        assert stats["elapsed_sec"] == pytest.approx(0.2)
+
+    def test_run_late(self, clock):
+        """書き込みが遅い場合は、ステップを飛ばして予定通りに終わる"""
+        clock.write_sec = 0.025
+        rows = list(range(10))
+
+        stats = StepScheduler().run(rows, 0.01, clock.write)
+
+        # 最後のステップ(目標位置)は、必ず送られる
+        assert clock.written[-1] == rows[-1]
+        assert stats["sent"] + stats["dropped"] == 10
+        assert stats["dropped"] > 0
+        assert stats["max_overrun_sec"] > 0
+        assert stats["elapsed_sec"] < 0.1 + 0.025 * 2
+
+    def test_run_no_drop_without_delay(self, clock):
+        """書き込み時間0なら、step_secの合計が動作時間になる"""
+        stats = StepScheduler().run([1, 2, 3], 0.05, clock.write)
+
+        assert clock.written == [1, 2, 3]
+        assert stats["planned_sec"] == pytest.approx(0.15)
+        assert stats["elapsed_sec"] == pytest.approx(0.15)
+
+    def test_run_cancel_before(self, clock):
+        """中断済みの場合は、何も送らない"""
+        event = threading.Event()
+        event.set()
+
+        stats = StepScheduler().run(list(range(10)), 0.02, clock.write, event)
+
+        assert clock.written == []
+        assert stats["cancelled"] is True
+
+    def test_run_cancel_between_steps(self, clock):
+        """ステップの間で中断すると、次のステップは送らない"""
+        event = threading.Event()
+
+        def _write(row):
+            clock.write(row)
+            if row == 2:
+                event.set()
+
+        def _wait(sec):
+            if event.is_set():
+                return True
+            clock.sleep(sec)
+            return False
+
+        with patch.object(event, "wait", side_effect=_wait):
+            stats = StepScheduler().run(list(range(10)), 1.0, _write, event)
+
+        # 中断後の待ちは、すぐに終わる
+        assert clock.written == [0, 1, 2]
+        assert stats["sent"] == 3
+        assert stats["cancelled"] is True
+        assert stats["elapsed_sec"] == pytest.approx(2.0)
+
+    def test_run_not_cancelled(self, clock):
+        """中断しなければ、最後まで送る"""
+        event = threading.Event()
+        # 待ちの間に中断されない(wait()がFalseを返す)
+        with patch.object(event, "wait", side_effect=clock.sleep):
+            stats = StepScheduler().run(
+                list(range(5)), 0.02, clock.write, event
+            )
+
+        assert clock.written == list(range(5))
+        assert stats["cancelled"] is False
@@ -0,0 +1,66 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_core_04_motion_profile.py
+"""
+
+import numpy as np
+import pytest
+
+from pi0servo.core.motion_profile import MotionProfile
+
+
+class TestMotionProfile:
+    """MotionProfileクラスのテスト"""
+
+    @pytest.mark.parametrize("profile", MotionProfile.PROFILES)
+    @pytest.mark.parametrize("step_n", [1, 2, 10, 40])
+    def test_table(self, profile, step_n):
+        """単調増加で、最後が1.0になること"""
+        table = MotionProfile.table(profile, step_n)
+
+        assert table.shape == (step_n,)
+        assert table[-1] == 1.0
+        assert np.all(table > 0.0)
+        assert np.all(np.diff(table) >= 0.0)
+
+    def test_linear(self):
+        """linearは等間隔"""
+        table = MotionProfile.table(MotionProfile.LINEAR, 4)
+        assert table.tolist() == [0.25, 0.5, 0.75, 1.0]
+
+    @pytest.mark.parametrize(
+        "profile",
+        [MotionProfile.EASE, MotionProfile.TRAPEZOID, MotionProfile.MINJERK],
+    )
+    def test_smooth_start_end(self, profile):
+        """始点・終点付近は、linearより動きが小さいこと"""
+        step_n = 20
+        table = MotionProfile.table(profile, step_n)
+        linear = MotionProfile.table(MotionProfile.LINEAR, step_n)
+
+        assert table[0] < linear[0]
+        assert table[-1] - table[-2] < linear[-1] - linear[-2]
+
+    @pytest.mark.parametrize("profile", MotionProfile.PROFILES)
+    def test_symmetric(self, profile):
+        """中間点で、ちょうど半分になること"""
+        table = MotionProfile.table(profile, 10)
+        assert table[4] == pytest.approx(0.5)
+
+    def test_cache(self):
+        """同じ(profile, step_n)は、同じ配列を返し、書き換えできないこと"""
+        table1 = MotionProfile.table(MotionProfile.EASE, 30)
+        table2 = MotionProfile.table(MotionProfile.EASE, 30)
+
+        assert table1 is table2
+        with pytest.raises(ValueError, match="read-only"):
+            table1[0] = 0.0
+
+    def test_invalid(self):
+        """不明なプロファイル名"""
+        assert not MotionProfile.is_valid("bouncy")
+        assert MotionProfile.is_valid(None)
+        with pytest.raises(ValueError, match="unknown profile"):
+            MotionProfile.table("bouncy", 10)
@@ -0,0 +1,231 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_core_05_multi_track.py
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from pi0servo.core.multi_servo import MultiServo
+from pi0servo.core.multi_track import MultiTrackScheduler
+
+PINS = [17, 18, 27]
+CONF_FILE = "test_multi_track_conf.json"
+TICK_SEC = 0.1
+
+
+def a2p(angle: float) -> int:
+    """角度 -> パルス幅 (1度 = 10us)"""
+    return int(1500 + angle * 10)
+
+
+@pytest.fixture
+def mservo(mocker_pigpio):
+    """1度 = 10us のMultiServo (move_all_pulses()は記録するだけ)"""
+    with patch("pi0servo.core.calibrable_servo.ServoConfigManager") as scm:
+        scm.return_value.get_config.return_value = None
+        scm.return_value.conf_file = CONF_FILE
+
+        _ms = MultiServo(mocker_pigpio(), PINS, first_move=False)
+        for _s in _ms.servo:
+            _s._pulse_min = 600
+            _s._pulse_center = 1500
+            _s._pulse_max = 2400
+            _s.last_pulse = 1500
+        _ms.move_all_pulses = MagicMock()
+        yield _ms
+
+
+def rows(mservo) -> list:
+    """書き込まれた行のリスト"""
+    return [c.args[0] for c in mservo.move_all_pulses.call_args_list]
+
+
+class TestMultiTrackScheduler:
+    """MultiTrackSchedulerクラスのテスト"""
+
+    def test_default_tracks(self, mservo):
+        """デフォルトは、サーボごとに一つのトラック"""
+        mtrack = MultiTrackScheduler(mservo)
+
+        assert {_n: _t.servo_idx for _n, _t in mtrack.tracks.items()} == {
+            "0": [0],
+            "1": [1],
+            "2": [2],
+        }
+        assert mtrack.tick_sec == mservo.pwm_frame_sec
+        assert not mtrack.busy
+
+    @pytest.mark.parametrize(
+        ("tracks", "match"),
+        [
+            ({"a": [0], "b": [0, 1]}, "two tracks"),
+            ({"a": [3]}, "invalid servo index"),
+            ({"a": [-1]}, "invalid servo index"),
+        ],
+    )
+    def test_invalid_tracks(self, mservo, tracks, match):
+        """サーボ番号の誤り、複数のトラックに属するサーボ"""
+        with pytest.raises(ValueError, match=match):
+            MultiTrackScheduler(mservo, tracks)
+
+    def test_add_invalid(self, mservo):
+        """不明なトラック、角度の数の誤り、不明なプロファイル"""
+        mtrack = MultiTrackScheduler(mservo, {"arm": [0, 1], "head": [2]})
+
+        with pytest.raises(ValueError, match="unknown track"):
+            mtrack.add("leg", [0])
+        with pytest.raises(ValueError, match="len"):
+            mtrack.add("arm", [0])
+        with pytest.raises(ValueError, match="unknown profile"):
+            mtrack.add("head", [0], profile="xxx")
+        assert not mtrack.busy
+
+    def test_tick_independent(self, mservo):
+        """トラックごとに別々の動作時間で動き、1 tick で1回だけ書き込む"""
+        mtrack = MultiTrackScheduler(
+            mservo, {"arm": [0, 1], "head": [2]}, TICK_SEC
+        )
+        mtrack.add("arm", [40, -40], 0.4)
+        mtrack.add("head", [20], 0.2)
+
+        for _k in range(5):
+            mtrack.tick(10.0 + _k * TICK_SEC)
+
+        assert rows(mservo) == [
+            [a2p(10), a2p(-10), a2p(10)],
+            [a2p(20), a2p(-20), a2p(20)],
+            [a2p(30), a2p(-30), None],  # head は終わった
+            [a2p(40), a2p(-40), None],
+        ]
+        assert not mtrack.busy
+        assert mtrack.tick_n == 5
+
+    def test_tick_chain(self, mservo):
+        """続く区間は、前の区間の目標角度と終了時刻から、止まらずに始まる"""
+        mtrack = MultiTrackScheduler(mservo, {"head": [2]}, TICK_SEC)
+        mtrack.add("head", [20], 0.2)
+        mtrack.add("head", [None], 0.1)  # None: 前の区間の目標角度
+        mtrack.add("head", ["min"], 0.2)
+
+        _busy = [mtrack.tick(10.0 + _k * TICK_SEC) for _k in range(5)]
+
+        assert [_r[2] for _r in rows(mservo)] == [
+            a2p(10),
+            a2p(20),
+            a2p(20),
+            a2p(-35),
+            a2p(-90),
+        ]
+        assert _busy == [True, True, True, True, False]
+
+    def test_tick_late(self, mservo):
+        """tick が遅れた場合は、その時刻の角度を書き込む"""
+        mtrack = MultiTrackScheduler(mservo, {"head": [2]}, TICK_SEC)
+        mtrack.add("head", [40], 0.4)
+        mtrack.add("head", [0], 0.4)
+
+        mtrack.tick(10.0)
+        mtrack.tick(10.0 + 5 * TICK_SEC)  # 2つ目の区間の2ステップ目
+
+        assert [_r[2] for _r in rows(mservo)] == [a2p(10), a2p(20)]
+
+    def test_clear(self, mservo):
+        """clear: トラックの区間を破棄する"""
+        mtrack = MultiTrackScheduler(
+            mservo, {"arm": [0, 1], "head": [2]}, TICK_SEC
+        )
+        mtrack.add("arm", [40, -40], 0.4)
+        mtrack.add("head", [20], 0.2)
+        mtrack.tick(10.0)
+
+        mtrack.clear("arm")
+        mtrack.tick(10.0 + TICK_SEC)
+
+        assert rows(mservo)[-1] == [None, None, a2p(20)]
+        assert not mtrack.busy
+
+    def test_cancel(self, mservo):
+        """cancel_move(): すべてのトラックの区間を破棄する"""
+        mtrack = MultiTrackScheduler(mservo, tick_sec=TICK_SEC)
+        mtrack.add("0", [40], 0.4)
+        mtrack.add("2", [40], 0.4)
+        mtrack.tick(10.0)
+
+        mservo.cancel_move()
+        assert not mtrack.tick(10.0 + TICK_SEC)
+        assert not mtrack.busy
+        assert len(rows(mservo)) == 1
+
+    @pytest.mark.parametrize("stop", ["cancel", "estop"])
+    def test_add_after_cancel(self, mservo, stop):
+        """中断の後に追加した区間は、動かす"""
+        mtrack = MultiTrackScheduler(mservo, tick_sec=TICK_SEC)
+        mtrack.add("0", [40], 0.4)
+        mtrack.tick(10.0)
+
+        if stop == "cancel":
+            mservo.cancel_move()
+        else:
+            mservo.estop()  # hold: 中断したまま
+        mtrack.add("1", [20], 0.1)
+        assert not mservo.cancel_event.is_set()
+
+        assert not mtrack.tick(10.0 + TICK_SEC)
+        assert rows(mservo)[-1] == [None, a2p(20), None]
+        assert not mtrack.busy
+
+    def test_cancel_after_add(self, mservo):
+        """追加した後に中断されたら、まだ始まっていない区間も破棄する"""
+        mtrack = MultiTrackScheduler(mservo, tick_sec=TICK_SEC)
+        mtrack.add("0", [40], 0.4)
+        mservo.cancel_move()
+
+        assert not mtrack.tick(10.0)
+        assert not mservo.move_all_pulses.called
+        assert not mtrack.busy
+
+    def test_run_after_cancel(self, mservo):
+        """スレッドで動かす: 中断の後も、追加した区間を動かす"""
+        mtrack = MultiTrackScheduler(mservo, tick_sec=0.01)
+        mtrack.start()
+        try:
+            mtrack.add("0", [40], 5)
+            mservo.cancel_move()
+            assert mtrack.wait(2)
+
+            mtrack.add("2", [20], 0.02)
+            assert mtrack.wait(2)
+        finally:
+            mtrack.end()
+
+        assert rows(mservo)[-1] == [None, None, a2p(20)]
+
+    def test_run(self, mservo):
+        """スレッドで動かす"""
+        mtrack = MultiTrackScheduler(
+            mservo, {"arm": [0, 1], "head": [2]}, 0.01
+        )
+        mtrack.start()
+        try:
+            mtrack.add("arm", [40, -40], 0.05)
+            mtrack.add("head", [20], 0.02)
+            assert mtrack.wait(2)
+        finally:
+            mtrack.end()
+
+        _rows = rows(mservo)
+        assert _rows[-1][:2] == [a2p(40), a2p(-40)]
+        assert [_r[2] for _r in _rows if _r[2] is not None][-1] == a2p(20)
+        assert not mtrack.is_alive()
+
+    def test_wait_timeout(self, mservo):
+        """wait: タイムアウト"""
+        mtrack = MultiTrackScheduler(mservo, tick_sec=TICK_SEC)
+        mtrack.add("0", [40], 0.4)
+
+        assert not mtrack.wait(0.01)
+        assert mtrack.busy
@@ -0,0 +1,274 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_helper_01_cmd_queue.py
+"""
+
+import queue
+import threading
+import time
+
+import pytest
+
+from pi0servo.helper.cmd_queue import CmdQueue
+
+
+class TestCmdQueue:
+    """CmdQueueクラスのテスト"""
+
+    def test_put_get(self):
+        """FIFOで取り出せること"""
+        q = CmdQueue()
+        q.put("a")
+        q.put("b")
+
+        assert q.qsize() == 2
+        assert q.get() == "a"
+        assert q.get() == "b"
+        assert q.empty()
+
+    def test_get_timeout(self):
+        """タイムアウトした場合はNone"""
+        q = CmdQueue()
+        assert q.get(timeout=0.01) is None
+
+    def test_get_wakeup(self):
+        """putされると、待っているget()がすぐに戻ること"""
+        q = CmdQueue()
+        result = []
+        th = threading.Thread(target=lambda: result.append(q.get()))
+        th.start()
+
+        time.sleep(0.05)
+        t0 = time.monotonic()
+        q.put("cmd")
+        th.join(timeout=1)
+
+        assert result == ["cmd"]
+        assert time.monotonic() - t0 < 0.05
+
+    def test_close(self):
+        """close()されると、待っているget()はNoneを返すこと"""
+        q = CmdQueue()
+        result = []
+        th = threading.Thread(target=lambda: result.append(q.get()))
+        th.start()
+
+        time.sleep(0.05)
+        q.close()
+        th.join(timeout=1)
+
+        assert not th.is_alive()
+        assert result == [None]
+        assert q.closed
+
+    def test_busy_join(self):
+        """task_done()まではbusyで、join()はその時点で戻ること"""
+        q = CmdQueue()
+        assert not q.busy
+        assert q.join(timeout=0)
+
+        q.put("cmd")
+        assert q.busy
+        q.get()
+        assert q.busy  # 実行中
+        assert not q.join(timeout=0.01)
+
+        threading.Timer(0.05, q.task_done).start()
+        t0 = time.monotonic()
+        assert q.join(timeout=1)
+        assert time.monotonic() - t0 < 0.1
+        assert not q.busy
+
+    def test_clear(self):
+        """clear()で、実行待ちのコマンドだけが破棄されること"""
+        q = CmdQueue()
+        q.put("a")
+        q.get()  # 実行中
+        q.put("b")
+        q.put("c")
+
+        assert q.clear() == ["b", "c"]
+        assert q.qsize() == 0
+        assert q.busy  # "a"は実行中
+
+        q.task_done()
+        assert not q.busy
+
+    def test_priority_lanes(self):
+        """優先度の高いレーンから取り出すこと (同じレーンはFIFO)"""
+        q = CmdQueue()
+        q.put("bg1", CmdQueue.PRIO_BACKGROUND)
+        q.put("i1")
+        q.put("em1", CmdQueue.PRIO_EMERGENCY)
+        q.put("i2", CmdQueue.PRIO_INTERACTIVE)
+        q.put("em2", CmdQueue.PRIO_EMERGENCY)
+
+        assert q.lane_sizes() == {
+            "emergency": 2,
+            "interactive": 2,
+            "background": 1,
+        }
+        assert [q.get() for _ in range(5)] == [
+            "em1",
+            "em2",
+            "i1",
+            "i2",
+            "bg1",
+        ]
+
+    def test_priority(self):
+        """優先度名 -> レーン番号"""
+        assert CmdQueue.priority(None) == CmdQueue.DEF_PRIORITY
+        assert CmdQueue.priority("Emergency") == CmdQueue.PRIO_EMERGENCY
+        assert CmdQueue.priority("background") == CmdQueue.PRIO_BACKGROUND
+        assert CmdQueue.priority(1) == CmdQueue.PRIO_INTERACTIVE
+
+        with pytest.raises(ValueError, match="unknown priority"):
+            CmdQueue.priority("urgent")
+        with pytest.raises(ValueError, match="unknown priority"):
+            CmdQueue.priority(5)
+
+    def test_coalesce(self):
+        """同じキーのコマンドが続いた場合は、新しい方で置き換えること"""
+        q = CmdQueue(coalesce_key=lambda item: item[0] or None)
+        assert q.put(("a", 1)) is None
+        assert q.put(("a", 2)) == ("a", 1)
+        assert q.put(("b", 1)) is None
+        assert q.put(("", 1)) is None  # キーがNone: 置き換えない
+        assert q.put(("", 2)) is None
+        assert q.put(("b", 2)) is None  # 続いていない
+        assert q.put(("b", 3)) == ("b", 2)
+
+        assert q.coalesced == 2
+        assert [q.get() for _ in range(q.qsize())] == [
+            ("a", 2),
+            ("b", 1),
+            ("", 1),
+            ("", 2),
+            ("b", 3),
+        ]
+
+        # 実行待ちの数だけが数えられていること
+        for _ in range(5):
+            q.task_done()
+        assert not q.busy
+
+    def test_coalesce_lanes(self):
+        """coalesce は、同じレーンの中だけ"""
+        q = CmdQueue(coalesce_key=lambda item: item[0])
+        q.put(("a", 1))
+        assert q.put(("a", 2), CmdQueue.PRIO_BACKGROUND) is None
+        assert q.coalesced == 0
+        assert q.qsize() == 2
+
+    def test_coalesce_disabled(self):
+        """coalesce_key が None の場合は、置き換えない"""
+        q = CmdQueue()
+        q.put(("a", 1))
+        assert q.put(("a", 2)) is None
+        assert q.coalesced == 0
+
+    def test_maxsize_reject(self):
+        """reject: 上限に達したら、queue.Full"""
+        q = CmdQueue(maxsize=2, policy=CmdQueue.POLICY_REJECT)
+        q.put("a")
+        q.put("b")
+        with pytest.raises(queue.Full):
+            q.put("c")
+        assert q.qsize() == 2
+        assert q.high_water == 2
+
+        q.get()
+        q.put("c")
+        assert [q.get(), q.get()] == ["b", "c"]
+
+    def test_maxsize_drop_oldest(self):
+        """drop_oldest: 一番古いコマンドを破棄して、入れる"""
+        q = CmdQueue(maxsize=2, policy=CmdQueue.POLICY_DROP_OLDEST)
+        q.put("a")
+        q.put("b")
+        assert q.put("c") == "a"
+        assert q.dropped == 1
+
+        # 優先度の高いコマンドは、低いコマンドのために破棄しない
+        q.put("em", CmdQueue.PRIO_EMERGENCY)  # "b"を破棄
+        q.put("em2", CmdQueue.PRIO_EMERGENCY)  # "c"を破棄
+        assert q.put("bg", CmdQueue.PRIO_BACKGROUND) == "bg"
+        assert q.dropped == 4
+        assert [q.get(), q.get()] == ["em", "em2"]
+
+        for _ in range(2):
+            q.task_done()
+        assert not q.busy
+
+    def test_maxsize_drop_newest(self):
+        """drop_newest: 入れようとしたコマンドを破棄する"""
+        q = CmdQueue(maxsize=1, policy=CmdQueue.POLICY_DROP_NEWEST)
+        assert q.put("a") is None
+        assert q.put("b") == "b"
+        assert q.dropped == 1
+        assert q.qsize() == 1
+
+        q.get()
+        q.task_done()
+        assert not q.busy
+
+    def test_maxsize_block(self):
+        """block: 空きができるまで待つ"""
+        q = CmdQueue(maxsize=1)
+        q.put("a")
+        with pytest.raises(queue.Full):
+            q.put("b", timeout=0.01)
+
+        threading.Timer(0.05, q.get).start()
+        t0 = time.monotonic()
+        q.put("b", timeout=1)
+        assert time.monotonic() - t0 < 0.5
+        assert q.get() == "b"
+
+    @pytest.mark.parametrize("policy", CmdQueue.POLICIES)
+    def test_maxsize_emergency(self, policy):
+        """emergency: 上限に達していても、必ず入れる"""
+        q = CmdQueue(maxsize=1, policy=policy)
+        q.put("a")
+
+        t0 = time.monotonic()
+        _dropped = q.put("em", CmdQueue.PRIO_EMERGENCY, timeout=1)
+        assert time.monotonic() - t0 < 0.5
+        assert _dropped != "em"
+        assert q.get() == "em"
+
+        # ほかの優先度は、今までどおり
+        if policy == CmdQueue.POLICY_DROP_OLDEST:
+            assert _dropped == "a"
+            assert q.qsize() == 0
+        else:
+            assert _dropped is None
+            assert q.qsize() == 1
+            assert q.high_water == 2
+
+    def test_invalid_policy(self):
+        """不明なpolicy"""
+        with pytest.raises(ValueError, match="unknown policy"):
+            CmdQueue(policy="xxx")
+
+    def test_get_while(self):
+        """get_while: 次に取り出されるコマンドから、条件を満たす間だけ"""
+        q = CmdQueue()
+        q.put("bg", CmdQueue.PRIO_BACKGROUND)
+        for _item in ["a1", "a2", "b", "a3"]:
+            q.put(_item)
+
+        assert q.get() == "a1"
+        assert q.get_while(lambda item: item.startswith("a"), 5) == ["a2"]
+        assert q.get_while(lambda item: item.startswith("a"), 5) == []
+        assert q.get() == "b"
+        assert q.get_while(lambda item: True, 1) == ["a3"]
+        assert q.get_while(lambda item: True, 5) == ["bg"]
+        assert q.empty()
+
+        for _ in range(5):
+            q.task_done()
+        assert not q.busy
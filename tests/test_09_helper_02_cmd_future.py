@@ -0,0 +1,98 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_helper_02_cmd_future.py
+"""
+
+import threading
+
+import pytest
+
+from pi0servo.helper.cmd_future import CmdFuture, CmdFutureTable
+
+
+class TestCmdFuture:
+    """CmdFutureクラスのテスト"""
+
+    def test_lifecycle(self):
+        """queued -> running -> done"""
+        fut = CmdFuture(1, "move", {"method": "move"})
+        assert fut.state == CmdFuture.QUEUED
+        assert not fut.finished
+        assert not fut.wait(0)
+
+        fut.set_running()
+        assert fut.state == CmdFuture.RUNNING
+
+        fut.set_done("ok")
+        assert fut.finished
+        assert fut.wait(0)
+
+        status = fut.to_dict()
+        assert status["state"] == CmdFuture.DONE
+        assert status["result"] == "ok"
+        assert status["error"] is None
+        assert status["queue_sec"] >= 0
+        assert status["exec_sec"] >= 0
+
+    def test_cancelled(self):
+        """実行前に破棄された場合"""
+        fut = CmdFuture(1, "move")
+        fut.set_cancelled()
+
+        status = fut.to_dict()
+        assert status["state"] == CmdFuture.CANCELLED
+        assert status["start_time"] is None
+        assert status["exec_sec"] is None
+
+    def test_wait_wakeup(self):
+        """別スレッドで終わると、wait()が戻ること"""
+        fut = CmdFuture(1, "move")
+        threading.Timer(0.05, fut.set_done).start()
+        assert fut.wait(1)
+
+
+class TestCmdFutureTable:
+    """CmdFutureTableクラスのテスト"""
+
+    def test_new_get(self):
+        """IDを採番して、IDで取り出せること"""
+        table = CmdFutureTable()
+        fut1 = table.new("move")
+        fut2 = table.new("sleep")
+        fut3 = table.new("move", req_id="abc")
+
+        assert fut1.id != fut2.id
+        assert table.get(fut1.id) is fut1
+        assert table.get("abc") is fut3
+        assert table.get(999) is None
+
+    def test_duplicate_id(self):
+        """終わっていないIDは使えず、自動採番は指定されたIDを飛ばす"""
+        table = CmdFutureTable()
+        fut1 = table.new("move", req_id=1)
+        with pytest.raises(ValueError, match="duplicate id"):
+            table.new("move", req_id=1)
+        assert table.get(1) is fut1
+
+        fut2 = table.new("move")
+        assert fut2.id == 2
+
+        fut1.set_done()
+        fut3 = table.new("move", req_id=1)  # 終わったものは置き換える
+        assert table.get(1) is fut3
+
+    def test_evict(self):
+        """終わったものは、古い順に削除されること"""
+        table = CmdFutureTable(history_n=2)
+        futs = [table.new("move") for _ in range(3)]
+        assert len(table) == 3  # 終わっていないものは削除しない
+
+        futs[0].set_done()
+        futs[1].set_done()
+        table.new("move")
+
+        assert table.get(futs[0].id) is None
+        assert table.get(futs[1].id) is None
+        assert table.get(futs[2].id) is futs[2]
@@ -0,0 +1,237 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_helper_03_jsonrpc_worker.py
+"""
+
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from pi0servo.core.multi_servo import MultiServo
+from pi0servo.helper.jsonrpc_worker import JsonRpcWorker
+from pi0servo.helper.str_cmd_to_json import StrCmdToJson
+
+PINS = [17, 18]
+
+
+@pytest.fixture
+def jsonrpc_worker(mocker_pigpio):
+    """JsonRpcWorkerのテスト用インスタンスを生成するフィクスチャ"""
+    with patch("pi0servo.helper.jsonrpc_worker.MultiServo") as mock_cls:
+        mock_cls.ESTOP_MODES = MultiServo.ESTOP_MODES
+        mock_mservo = MagicMock(spec=MultiServo)
+        mock_mservo.cancel_gen = 0
+        mock_mservo.last_move_stats = {}
+        mock_mservo.cancel_event = threading.Event()
+        mock_cls.return_value = mock_mservo
+
+        worker = JsonRpcWorker(mocker_pigpio(), PINS, debug=False)
+        worker.start()
+        yield worker
+        worker.end()
+
+
+class TestJsonRpcWorker:
+    """JsonRpcWorkerクラスのテスト"""
+
+    def test_call_queued(self, jsonrpc_worker):
+        """キューに入れたコマンドは、束縛済みの関数で実行される"""
+        _ret = jsonrpc_worker.call(
+            [
+                {
+                    "method": "move_all_angles_sync",
+                    "params": {"angles": [30, 0], "move_sec": 0.1},
+                }
+            ]
+        )
+        assert _ret[0]["result"] == "queued"
+        req_id = _ret[0]["id"]
+
+        _status = jsonrpc_worker.call(
+            [{"method": "await", "params": {"id": req_id, "timeout": 1}}]
+        )[0]
+        assert _status["jsonrpc"] == "2.0"
+        assert _status["result"]["state"] == "done"
+        assert _status["result"]["error"] is None
+
+        jsonrpc_worker.mservo.move_all_angles_sync.assert_called_once_with(
+            [30, 0], 0.1, None, None
+        )
+
+    def test_call_queued_positional(self, jsonrpc_worker):
+        """パラメータは、リストでもよい"""
+        _ret = jsonrpc_worker.call(
+            [{"method": "move_all_angles_sync", "params": [[10, 20], 0.2]}]
+        )
+        assert _ret[0]["result"] == "queued"
+
+        jsonrpc_worker.obj_notqueued.wait(1)
+        jsonrpc_worker.mservo.move_all_angles_sync.assert_called_once_with(
+            [10, 20], 0.2, None, None
+        )
+
+    def test_call_invalid_params(self, jsonrpc_worker):
+        """パラメータの誤りは、キューに入れる前にエラーになる"""
+        _ret = jsonrpc_worker.call(
+            [{"method": "move_all_angles_sync", "params": {"angle": [0]}}]
+        )
+        assert _ret[0]["jsonrpc"] == "2.0"
+        assert _ret[0]["error"]["code"] == -32602
+        assert _ret[0]["error"]["data"]["type"] == "TypeError"
+        assert jsonrpc_worker.qsize == 0
+        assert not jsonrpc_worker.is_busy
+
+    def test_call_exec_error(self, jsonrpc_worker):
+        """実行時のエラーは、JSON-RPCのエラーとして記録される"""
+        jsonrpc_worker.mservo.move_all_angles_sync.side_effect = ValueError(
+            "bad angle"
+        )
+        _ret = jsonrpc_worker.call(
+            [{"method": "move_all_angles_sync", "params": {"angles": [0]}}]
+        )
+        req_id = _ret[0]["id"]
+
+        _status = jsonrpc_worker.call(
+            [{"method": "await", "params": {"id": req_id, "timeout": 1}}]
+        )[0]
+        _error = _status["result"]["error"]
+        assert _error["code"] == -32000
+        assert _error["data"]["type"] == "ValueError"
+        assert _error["data"]["message"] == "bad angle"
+
+    def test_call_notqueued(self, jsonrpc_worker):
+        """キューに入れないコマンドは、すぐに実行される"""
+        _ret = jsonrpc_worker.call([{"method": "qsize", "id": 7}])
+        assert _ret == [{"jsonrpc": "2.0", "result": 0, "id": 7}]
+
+        _ret = jsonrpc_worker.call(
+            [{"method": "status", "params": {"id": 999}}]
+        )
+        assert _ret[0]["error"]["code"] == -32000
+
+    def test_call_stats(self, jsonrpc_worker):
+        """stats: 書き込みの統計"""
+        _mservo = jsonrpc_worker.mservo
+        _mservo.write_stats = {"written": 5, "skipped": 2}
+        _mservo.last_move_stats = {"step_n": 10}
+        _ret = jsonrpc_worker.call(
+            [{"method": "stats", "params": {"reset": True}}]
+        )
+        assert _ret[0]["result"] == {
+            "write": {"written": 5, "skipped": 2},
+            "last_move": {"step_n": 10},
+        }
+        _mservo.reset_write_stats.assert_called_once()
+
+    def test_call_str_id(self, jsonrpc_worker):
+        """文字列のIDの後でも、IDなしのリクエストは自動採番される"""
+        _ret = jsonrpc_worker.call([{"method": "qsize", "id": "abc"}])
+        assert _ret == [{"jsonrpc": "2.0", "result": 0, "id": "abc"}]
+
+        _ret = jsonrpc_worker.call(
+            [
+                {"method": "qsize"},
+                {"method": "move_all_angles_sync", "params": {"angles": [0]}},
+            ]
+        )
+        assert _ret[0]["result"] == 0
+        assert isinstance(_ret[0]["id"], int)
+        assert _ret[1]["result"] == "queued"
+        assert _ret[1]["id"] == _ret[0]["id"] + 1
+
+    def test_call_duplicate_id(self, jsonrpc_worker):
+        """終わっていないリクエストと同じIDは、キューに入れない"""
+        release = threading.Event()
+        _mservo = jsonrpc_worker.mservo
+        _mservo.move_all_angles_sync.side_effect = lambda *_: release.wait(2)
+        _mv = {"method": "move_all_angles_sync", "params": {"angles": [0]}}
+
+        _ret = jsonrpc_worker.call([{**_mv, "id": 1}, {**_mv, "id": 1}, _mv])
+        assert _ret[0]["result"] == "queued"
+        assert _ret[1]["error"]["code"] == -32602
+        assert _ret[1]["id"] == 1
+        assert _ret[2]["result"] == "queued"
+        assert _ret[2]["id"] == 2  # 使われているIDは飛ばす
+
+        release.set()
+        jsonrpc_worker.obj_notqueued.wait(2)
+        assert _mservo.move_all_angles_sync.call_count == 2
+
+    def test_call_invalid_request(self, jsonrpc_worker, monkeypatch):
+        """リクエストを作れない場合は、Invalid Request"""
+        monkeypatch.setattr(jsonrpc_worker, "mk_jsonrpc_req", lambda *a: {})
+        _ret = jsonrpc_worker.call(
+            [
+                {"method": "qsize", "id": 3},
+                {"method": "move_all_angles_sync", "params": {"angles": [0]}},
+            ]
+        )
+        assert [_r["error"]["code"] for _r in _ret] == [-32600, -32600]
+        assert _ret[0]["id"] == 3
+        assert jsonrpc_worker.qsize == 0
+
+    def test_call_strcmd(self, jsonrpc_worker):
+        """文字列コマンドのパラメータ名(`PARAM_ALIASES`で読み替える)"""
+        jsonrpc_worker.mservo.pins = PINS
+        _cmds = StrCmdToJson().cmdstr_to_jsonlist("st:20 sc:1 mp:0,-5")
+
+        _ret = jsonrpc_worker.call(_cmds)
+        assert ["error" in _r for _r in _ret] == [False, False, False]
+        jsonrpc_worker.obj_notqueued.wait(1)
+
+        assert jsonrpc_worker.obj_queue.param_step_n == 20
+        jsonrpc_worker.mservo.set_pulse_center.assert_called_once_with(
+            1, None
+        )
+        jsonrpc_worker.mservo.move_pulse_relative.assert_called_once_with(
+            0, -5, forced=True
+        )
+
+        jsonrpc_worker.call(StrCmdToJson().cmdstr_to_jsonlist("st:auto"))
+        jsonrpc_worker.obj_notqueued.wait(1)
+        assert jsonrpc_worker.obj_queue.param_step_n is None
+
+    def test_call_invalid_method(self, jsonrpc_worker):
+        """不明なメソッド"""
+        _ret = jsonrpc_worker.call([{"method": "xxx"}])
+        assert "error" in _ret[0]
+        assert jsonrpc_worker.qsize == 0
+
+
+class TestJsonRpcWorkerCancelRace:
+    """取り出してから実行するまでの間の中断"""
+
+    MOVE = {"method": "move_all_angles_sync", "params": {"angles": [30, 0]}}
+
+    def test_cancel_before_exec(self, mocker_pigpio, tmp_path, monkeypatch):
+        """取り出したリストは実行せず、後から送ったリストは実行する"""
+        monkeypatch.chdir(tmp_path)
+        worker = JsonRpcWorker(mocker_pigpio(), PINS, first_move=False)
+        worker.mservo.move_all_angles_sync = MagicMock()
+
+        _get = worker.reqlist_q.get
+
+        def _get_and_cancel(*args, **kwargs):
+            _item = _get(*args, **kwargs)
+            if _item:
+                worker.reqlist_q.get = _get
+                worker.call([{"method": "cancel"}])
+            return _item
+
+        worker.reqlist_q.get = _get_and_cancel
+        _old = worker.call([self.MOVE])[0]["id"]
+        worker.start()
+        try:
+            worker.call([{"method": "wait", "params": {"timeout": 2}}])
+            assert worker.futures.get(_old).state == "cancelled"
+            worker.mservo.move_all_angles_sync.assert_not_called()
+
+            _new = worker.call([self.MOVE])[0]["id"]
+            worker.call([{"method": "wait", "params": {"timeout": 2}}])
+            assert worker.futures.get(_new).state == "done"
+            worker.mservo.move_all_angles_sync.assert_called_once()
+        finally:
+            worker.end()
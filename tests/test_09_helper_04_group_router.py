@@ -0,0 +1,191 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_helper_04_group_router.py
+"""
+
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from pi0servo.core.multi_servo import MultiServo
+from pi0servo.helper.group_router import GroupRouter
+
+GROUPS = {"arm": [17, 18], "head": [27]}
+
+
+def _new_mservo(*_args, **_kwargs):
+    """グループごとに、別のMultiServoのモック"""
+    _mservo = MagicMock(spec=MultiServo)
+    _mservo.cancel_gen = 0
+    _mservo.last_move_stats = {}
+    _mservo.ESTOP_HOLD = MultiServo.ESTOP_HOLD
+    _mservo.ESTOP_MODES = MultiServo.ESTOP_MODES
+    _mservo.estop.return_value = {"mode": "hold", "latency_sec": 0.0}
+    return _mservo
+
+
+@pytest.fixture
+def pi_factory():
+    """呼ばれるたびに、別の接続(モック)を返す"""
+    return MagicMock(side_effect=lambda: MagicMock(connected=True))
+
+
+@pytest.fixture
+def router(pi_factory):
+    """GroupRouterのテスト用インスタンスを生成するフィクスチャ"""
+    with patch(
+        "pi0servo.helper.thread_worker.MultiServo", side_effect=_new_mservo
+    ):
+        _router = GroupRouter(GROUPS, pi_factory, separate_pi=True)
+        _router.start()
+        yield _router
+        _router.end()
+
+
+class TestGroupRouter:
+    """GroupRouterクラスのテスト"""
+
+    def test_init(self, router, pi_factory):
+        """グループごとに、別のワーカーと接続"""
+        assert list(router.workers) == ["arm", "head"]
+        assert router.default_group == "arm"
+        assert pi_factory.call_count == 2
+        assert len(router._pis) == 2
+
+    def test_init_shared_pi(self, pi_factory):
+        """separate_pi=False: 接続は一つ"""
+        with patch(
+            "pi0servo.helper.thread_worker.MultiServo",
+            side_effect=_new_mservo,
+        ):
+            _router = GroupRouter(GROUPS, pi_factory)
+        assert pi_factory.call_count == 1
+
+        _pi = _router._pis[0]
+        _router.end()
+        _pi.stop.assert_called_once()
+
+    def test_init_servo_opts(self, pi_factory):
+        """use_script, trust_daemon: 各グループの`MultiServo`に渡される"""
+        with patch(
+            "pi0servo.helper.thread_worker.MultiServo",
+            side_effect=_new_mservo,
+        ) as _mservo_cls:
+            _router = GroupRouter(
+                GROUPS, pi_factory, use_script=True, trust_daemon=True
+            )
+        _router.end()
+
+        assert _mservo_cls.call_count == 2
+        for _call in _mservo_cls.call_args_list:
+            assert _call.kwargs["use_script"] is True
+            assert _call.kwargs["trust_daemon"] is True
+
+    @pytest.mark.parametrize(
+        ("groups", "match"),
+        [
+            ({}, "no groups"),
+            ({"a": []}, "no pins"),
+            ({"a": [17], "b": [-17]}, "two groups"),
+        ],
+    )
+    def test_init_invalid(self, pi_factory, groups, match):
+        """グループの誤り"""
+        with pytest.raises(ValueError, match=match):
+            GroupRouter(groups, pi_factory)
+
+    def test_init_not_connected(self):
+        """pigpiodに接続できない"""
+        with pytest.raises(ConnectionError):
+            GroupRouter(GROUPS, lambda: MagicMock(connected=False))
+
+    def test_send_routed(self, router):
+        """groupで指定したグループで、並行して実行される"""
+        release = threading.Event()
+        _arm = router.worker("arm").mservo
+        _arm.move_all_angles_sync.side_effect = lambda *_: release.wait(2)
+        _head = router.worker("head").mservo
+
+        _ret = router.send(
+            {"method": "move", "params": {"angles": [30, 0]}, "group": "arm"}
+        )
+        assert _ret["result"]["group"] == "arm"
+
+        # 腕の動作中でも、頭は動く
+        router.send(
+            {"method": "move", "params": {"angles": [10]}, "group": "head"}
+        )
+        _ret = router.send({"method": "wait", "group": "head"})
+        assert _ret["result"]["group"] == "head"
+        _head.move_all_angles_sync.assert_called_once()
+        assert router.worker("arm")._busy_flag
+
+        release.set()
+        router.send({"method": "wait", "group": "arm"})
+        _arm.move_all_angles_sync.assert_called_once()
+
+    def test_send_default_group(self, router):
+        """groupがない場合は、最初のグループ"""
+        _ret = router.send('{"method": "move", "params": {"angles": [1]}}')
+        assert _ret["result"]["group"] == "arm"
+
+    def test_send_unknown_group(self, router):
+        """不明なグループ"""
+        _ret = router.send({"method": "move", "group": "leg"})
+        assert _ret["error"]["code"] == -32602
+        assert "leg" in _ret["error"]["message"]
+
+    def test_send_broadcast(self, router):
+        """groupのない estop は、すべてのグループに送る"""
+        _ret = router.send({"method": "estop"})
+
+        assert set(_ret["result"]["value"]) == {"arm", "head"}
+        for _name in GROUPS:
+            router.worker(_name).mservo.estop.assert_called_once()
+
+        # "group"があれば、そのグループだけ
+        router.send({"method": "estop", "group": "head"})
+        assert router.worker("arm").mservo.estop.call_count == 1
+        assert router.worker("head").mservo.estop.call_count == 2
+
+    @pytest.mark.parametrize("method", GroupRouter.BROADCAST_METHODS)
+    def test_send_broadcast_single_group(self, pi_factory, method):
+        """グループが1つなら、返り値をまとめない(ThreadWorkerと同じ形)"""
+        with patch(
+            "pi0servo.helper.thread_worker.MultiServo",
+            side_effect=_new_mservo,
+        ):
+            _router = GroupRouter({"default": [17]}, pi_factory)
+        _router.start()
+        try:
+            _ret = _router.send({"method": method})
+        finally:
+            _router.end()
+
+        assert _ret["result"]["group"] == "default"
+        assert _ret["result"]["qsize"] == 0
+        assert _ret["result"]["busy_flag"] is False
+
+    @pytest.mark.parametrize(
+        ("specs", "expected"),
+        [
+            ("arm=17,18;head=27", {"arm": [17, 18], "head": [27]}),
+            (
+                ["arm=17, -18", " head = 27 "],
+                {"arm": [17, -18], "head": [27]},
+            ),
+            ("", {}),
+        ],
+    )
+    def test_parse_groups(self, specs, expected):
+        """グループ指定の解析"""
+        assert GroupRouter.parse_groups(specs) == expected
+
+    @pytest.mark.parametrize("specs", ["arm", "=17", "arm=x"])
+    def test_parse_groups_invalid(self, specs):
+        """グループ指定の誤り"""
+        with pytest.raises(ValueError, match="invalid"):
+            GroupRouter.parse_groups(specs)
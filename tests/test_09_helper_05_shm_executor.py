@@ -0,0 +1,262 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_helper_05_shm_executor.py
+"""
+
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from pi0servo.core.multi_servo import MultiServo
+from pi0servo.helper.shm_executor import ShmExecutor, ShmPulses, ShmRing
+
+GROUPS = {"arm": [17, 18], "head": [27]}
+
+
+def _new_mservo(_pi, pins, *_args, **_kwargs):
+    """グループごとに、別のMultiServoのモック"""
+    _mservo = MagicMock(spec=MultiServo)
+    _mservo.cancel_gen = 0
+    _mservo.last_move_stats = {}
+    _mservo.ESTOP_HOLD = MultiServo.ESTOP_HOLD
+    _mservo.ESTOP_MODES = MultiServo.ESTOP_MODES
+    _mservo.estop.return_value = {"mode": "hold", "latency_sec": 0.0}
+    _mservo.get_all_pulses.return_value = [1500 + _i for _i in pins]
+    return _mservo
+
+
+def _new_mservo_blocking(_pi, pins, *_args, **_kwargs):
+    """移動は、cancel, estopされるまで終わらない"""
+    _mservo = _new_mservo(_pi, pins)
+    _stop = threading.Event()
+
+    def _estop(*_args):
+        _stop.set()
+        return {"mode": "hold", "latency_sec": 0.0}
+
+    _mservo.move_all_angles_sync.side_effect = lambda *_: _stop.wait(10)
+    _mservo.cancel_move.side_effect = _stop.set
+    _mservo.estop.side_effect = _estop
+    return _mservo
+
+
+def _pi_factory():
+    """子プロセスで呼ばれる"""
+    return MagicMock(connected=True)
+
+
+@pytest.fixture
+def ring():
+    """作成したリングと、接続したリング"""
+    _ring = ShmRing(None, 4, 16, create=True)
+    _peer = ShmRing(_ring.name, 4, 16)
+    yield _ring, _peer
+    _peer.close()
+    _ring.close(unlink=True)
+
+
+@pytest.fixture
+def executor():
+    """子プロセス(fork)で、モックのサーボを動かす"""
+    with patch(
+        "pi0servo.helper.thread_worker.MultiServo", side_effect=_new_mservo
+    ):
+        _executor = ShmExecutor(
+            GROUPS, _pi_factory, publish_sec=0.01, start_method="fork"
+        )
+        _executor.start()
+        yield _executor
+        _executor.end()
+
+
+class TestShmRing:
+    """ShmRingクラスのテスト"""
+
+    def test_push_pop(self, ring):
+        """書いた順に、別の接続から読める"""
+        _ring, _peer = ring
+
+        assert _peer.pop() is None
+        assert _ring.push(b"abc")
+        assert _ring.push(b"")
+        assert len(_peer) == 2
+
+        assert _peer.pop() == b"abc"
+        assert _peer.pop() == b""
+        assert _peer.pop() is None
+
+    def test_full_wrap(self, ring):
+        """いっぱいになったら書けない。読めば、また書ける(折り返し)"""
+        _ring, _peer = ring
+
+        for _i in range(10):
+            for _j in range(4):
+                assert _ring.push(bytes([_i, _j]))
+            assert not _ring.push(b"x")
+            assert [_peer.pop() for _ in range(4)] == [
+                bytes([_i, _j]) for _j in range(4)
+            ]
+
+    def test_too_large(self, ring):
+        """スロットに入らない"""
+        _ring, _ = ring
+        assert _ring.max_payload == 12
+
+        with pytest.raises(ValueError, match="too large"):
+            _ring.push(b"x" * 13)
+
+    @pytest.mark.parametrize(
+        ("slot_n", "slot_size"), [(3, 16), (0, 16), (4, 4)]
+    )
+    def test_invalid(self, slot_n, slot_size):
+        """スロット数は2のべき乗"""
+        with pytest.raises(ValueError, match="slot"):
+            ShmRing(None, slot_n, slot_size, create=True)
+
+
+class TestShmPulses:
+    """ShmPulsesクラスのテスト"""
+
+    def test_write_read(self):
+        """書いた値が、別の接続から読める"""
+        _pulses = ShmPulses(None, 3, create=True)
+        _peer = ShmPulses(_pulses.name, 3)
+        try:
+            assert _peer.read() == [0, 0, 0]
+            _pulses.write([1500, 600, 2400])
+            assert _peer.read() == [1500, 600, 2400]
+        finally:
+            _peer.close()
+            _pulses.close(unlink=True)
+
+    def test_read_while_writing(self):
+        """書き込み中(seqが奇数)は読めない"""
+        _pulses = ShmPulses(None, 1, create=True)
+        try:
+            _pulses._SEQ.pack_into(_pulses.shm.buf, 0, 1)
+            assert _pulses.read(retry_n=3) is None
+        finally:
+            _pulses.close(unlink=True)
+
+
+class TestShmExecutor:
+    """ShmExecutorクラスのテスト"""
+
+    def test_send(self, executor):
+        """子プロセスで実行して、返り値が返る"""
+        _ret = executor.send(
+            {"method": "move", "params": {"angles": [10]}, "group": "head"}
+        )
+        assert _ret["result"]["group"] == "head"
+        assert _ret["result"]["id"] == 1
+
+        _ret = executor.send('{"method": "wait"}')
+        assert set(_ret["result"]["value"]) == {"arm", "head"}
+
+        _ret = executor.send({"method": "estop", "group": "arm"})
+        assert _ret["result"]["value"]["mode"] == "hold"
+
+    def test_send_error(self, executor):
+        """エラーも、そのまま返る"""
+        _ret = executor.send({"method": "move", "group": "leg"})
+        assert _ret["error"]["code"] == -32602
+
+        _ret = executor.send("{")
+        assert _ret["error"]["code"] == -32700
+
+        _ret = executor.send({"method": "move", "params": "x" * 2000})
+        assert _ret["error"]["code"] == -32600
+
+    def test_pulses(self, executor):
+        """パルス幅が、グループの順に公開される"""
+        _deadline = time.monotonic() + 5
+        while executor.pulses == [0, 0, 0]:
+            assert time.monotonic() < _deadline
+            time.sleep(0.01)
+        assert executor.pulses == [1517, 1518, 1527]
+
+    def test_estop_while_blocked(self):
+        """キューが一杯で"block"の間も、estopはすぐに実行される"""
+        with patch(
+            "pi0servo.helper.thread_worker.MultiServo",
+            side_effect=_new_mservo_blocking,
+        ):
+            _executor = ShmExecutor(
+                {"arm": [17]},
+                _pi_factory,
+                queue_maxsize=1,
+                start_method="fork",
+            )
+            _executor.start()
+        try:
+            _move = {"method": "move", "params": {"angles": [10]}}
+            _executor.send(_move)  # 実行中
+            _deadline = time.monotonic() + 5
+            while _executor.send({"method": "qsize"})["result"]["qsize"]:
+                assert time.monotonic() < _deadline
+                time.sleep(0.01)
+            _executor.send(_move)  # 実行待ち (一杯)
+
+            _blocked = threading.Thread(target=_executor.send, args=(_move,))
+            _blocked.start()
+            time.sleep(0.1)
+            assert _blocked.is_alive()
+
+            _t0 = time.monotonic()
+            _ret = _executor.send({"method": "estop"}, timeout=2)
+            assert time.monotonic() - _t0 < 1
+            assert _ret["result"]["value"]["mode"] == "hold"
+
+            _blocked.join(5)
+            assert not _blocked.is_alive()
+        finally:
+            _executor.end()
+
+    def test_wait_workers(self):
+        """同時に待てる`wait`の数を超えると、"QUEUE_FULL"エラー"""
+        with patch(
+            "pi0servo.helper.thread_worker.MultiServo",
+            side_effect=_new_mservo_blocking,
+        ):
+            _executor = ShmExecutor(
+                {"arm": [17]},
+                _pi_factory,
+                wait_workers=1,
+                start_method="fork",
+            )
+            _executor.start()
+        try:
+            _executor.send({"method": "move", "params": {"angles": [10]}})
+            _waiter = threading.Thread(
+                target=_executor.send, args=({"method": "wait"},)
+            )
+            _waiter.start()
+            time.sleep(0.1)
+
+            _ret = _executor.send(
+                {"method": "wait", "params": {"timeout": 0.1}}, timeout=2
+            )
+            assert _ret["error"]["code"] == -32001
+
+            _executor.send({"method": "estop"})
+            _waiter.join(5)
+            assert not _waiter.is_alive()
+
+            # 空いたら、また待てる
+            _ret = _executor.send({"method": "wait"}, timeout=2)
+            assert "error" not in _ret
+        finally:
+            _executor.end()
+
+    def test_not_running(self):
+        """子プロセスが動いていない"""
+        _executor = ShmExecutor(GROUPS, _pi_factory, start_method="fork")
+        try:
+            _ret = _executor.send({"method": "qsize"})
+            assert _ret["error"]["code"] == -32603
+        finally:
+            _executor.end()
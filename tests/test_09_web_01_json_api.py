@@ -0,0 +1,334 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_web_01_json_api.py
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from pi0servo.core.multi_servo import MultiServo
+from pi0servo.web.json_api import JsonApi, app
+from pi0servo.web.udp_pose import UdpPoseSender
+
+PINS = [17, 18]
+QSIZE = {"method": "qsize", "group": "default"}
+WAIT = {"method": "wait", "group": "default"}
+
+
+def _new_mservo(*_args, **_kwargs):
+    """MultiServoのモック"""
+    _mservo = MagicMock(spec=MultiServo)
+    _mservo.cancel_gen = 0
+    _mservo.last_move_stats = {}
+    _mservo.ESTOP_HOLD = MultiServo.ESTOP_HOLD
+    _mservo.ESTOP_MODES = MultiServo.ESTOP_MODES
+    _mservo.estop.return_value = {"mode": "hold", "latency_sec": 0.0}
+    return _mservo
+
+
+@pytest.fixture
+def json_app(mocker_pigpio):
+    """モックのサーボで動く JsonApi"""
+    with patch(
+        "pi0servo.helper.thread_worker.MultiServo", side_effect=_new_mservo
+    ):
+        _json_app = JsonApi(PINS)
+        yield _json_app
+        _json_app.end()
+
+
+@pytest.fixture
+def client(json_app):
+    """lifespanを使わずに、app.stateを設定する"""
+    app.state.json_app = json_app
+    app.state.debug = False
+    return TestClient(app)
+
+
+class TestJsonApi:
+    """JSON API(HTTP, WebSocket)のテスト"""
+
+    def test_cmd(self, client):
+        """HTTP: 1つのコマンドと、コマンドの配列"""
+        _res = client.post("/cmd", json=QSIZE).json()
+        assert _res["result"]["value"] == 0
+
+        _res = client.post("/cmd", json=[QSIZE, {"method": "xxx"}]).json()
+        assert _res[0]["result"]["value"] == 0
+        assert _res[1]["error"]["code"] == -32601
+
+    def test_cmd_not_blocking(self, client, json_app):
+        """HTTP: `wait`の間も、ほかのリクエストに応答する"""
+        release = threading.Event()
+        _mservo = json_app.thr_worker.mservo
+        _mservo.move_all_angles_sync.side_effect = lambda *_: release.wait(5)
+        client.post(
+            "/cmd", json={"method": "move", "params": {"angles": [1]}}
+        )
+
+        _waiter = threading.Thread(
+            target=client.post, args=("/cmd",), kwargs={"json": WAIT}
+        )
+        _waiter.start()
+        try:
+            time.sleep(0.1)
+            _t0 = time.monotonic()
+            assert client.get("/").json() == {"Hello": "World"}
+            assert client.post("/cmd", json=QSIZE).json()["result"]
+            assert time.monotonic() - _t0 < 1
+            assert _waiter.is_alive()
+        finally:
+            release.set()
+            _waiter.join(5)
+        assert not _waiter.is_alive()
+
+    def test_control_not_starved(self, json_app):
+        """共有のスレッドが埋まっていても、estop, qsizeはすぐに返る"""
+        release = threading.Event()
+        _mservo = json_app.thr_worker.mservo
+        _mservo.move_all_angles_sync.side_effect = lambda *_: release.wait(5)
+
+        async def _main():
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(1)
+            )
+            await json_app.send_cmdjson_async(
+                {"method": "move", "params": {"angles": [1]}}
+            )
+            # 共有のスレッドを、ふさいでおく
+            _busy = asyncio.create_task(asyncio.to_thread(release.wait, 5))
+            _waiter = asyncio.create_task(json_app.send_cmdlist_async([WAIT]))
+            await asyncio.sleep(0.1)
+
+            _t0 = time.monotonic()
+            _res = await asyncio.wait_for(
+                json_app.send_cmdlist_async(
+                    [QSIZE, {"method": "estop", "group": "default"}]
+                ),
+                1,
+            )
+            assert time.monotonic() - _t0 < 1
+            assert _res[0]["result"]["busy_flag"]
+            assert "error" not in _res[1]
+            assert not _waiter.done()
+
+            release.set()
+            _res = await asyncio.wait_for(_waiter, 2)
+            await _busy
+            return _res
+
+        with patch.object(JsonApi, "WAIT_SLICE_SEC", 0.05):
+            _res = asyncio.run(_main())
+
+        # サーバーが分けて待っても、返り値はもとのリクエスト
+        assert not _res[0]["result"]["busy_flag"]
+        assert _res[0]["result"]["request"] == WAIT
+
+    def test_ws_stream(self, client):
+        """WebSocket: 1つの接続で、続けて送る"""
+        with client.websocket_connect("/ws?events=0") as _ws:
+            for _ in range(3):
+                _ws.send_json(QSIZE)
+                _res = _ws.receive_json()
+                assert _res["result"]["value"] == 0
+
+            _ws.send_json([QSIZE, 1])
+            _res = _ws.receive_json()
+            assert _res[0]["result"]["value"] == 0
+            assert _res[1]["error"]["code"] == -32600
+
+            _ws.send_text("3")
+            assert _ws.receive_json()["error"]["code"] == -32600
+
+    def test_ws_control_first(self, client, json_app):
+        """WebSocket: `wait`の途中でも、`estop`はすぐに返る"""
+        release = threading.Event()
+        _mservo = json_app.thr_worker.mservo
+        _mservo.move_all_angles_sync.side_effect = lambda *_: release.wait(5)
+
+        with client.websocket_connect("/ws?events=0") as _ws:
+            _ws.send_json({"method": "move", "params": {"angles": [1]}})
+            assert _ws.receive_json()["result"]["id"]
+
+            _ws.send_json(WAIT)
+            _ws.send_json({"method": "estop", "group": "default"})
+            _res = _ws.receive_json()
+            assert _res["result"]["request"]["method"] == "estop"
+
+            release.set()
+            _res = _ws.receive_json()
+            assert _res["result"]["request"] == WAIT
+            assert not _res["result"]["busy_flag"]
+
+    def test_ws_strcmd(self, client, json_app):
+        """WebSocket: 文字列コマンド"""
+        with client.websocket_connect("/ws?events=0") as _ws:
+            _ws.send_text("mv:30,-30 wa")
+            _res = _ws.receive_json()
+
+        assert [_r["result"]["request"]["method"] for _r in _res] == [
+            "move_all_angles_sync",
+            "wait",
+        ]
+        json_app.thr_worker.mservo.move_all_angles_sync.assert_called_once()
+
+    def test_str(self, client, json_app):
+        """HTTP: 文字列コマンド (本体は text/plain)"""
+        _res = client.post(
+            "/str",
+            content="mv:30,. ms:0.5 wa",
+            headers={"content-type": "text/plain"},
+        ).json()
+
+        assert [_r["result"]["request"]["method"] for _r in _res] == [
+            "move_all_angles_sync",
+            "move_sec",
+            "wait",
+        ]
+        json_app.thr_worker.mservo.move_all_angles_sync.assert_called_once()
+
+        _res = client.post("/str", content="xx:1").json()
+        assert _res[0]["error"]["code"] == -32601
+
+    @pytest.mark.parametrize(
+        ("cmd_str", "method", "args"),
+        [
+            ("mv:30,-30", "move_all_angles_sync", None),
+            ("mr:10,-10", "move_all_angles_sync_relative", None),
+            ("sl:0.01", "wait_cancel", (0.01,)),
+            ("mp:1,-20", "move_pulse_relative", (1, -20)),
+            ("sc:1", "set_pulse_center", (1,)),
+            ("sn:1", "set_pulse_min", (1,)),
+            ("sx:1", "set_pulse_max", (1,)),
+            ("ca", "cancel_move", ()),
+            ("zz", "cancel_move", ()),
+            ("es", "estop", ("hold",)),
+            ("es:off", "estop", ("off",)),
+        ],
+    )
+    def test_str_each_cmd(self, client, json_app, cmd_str, method, args):
+        """HTTP(/str): 文字列コマンドごとに、サーボのメソッドが呼ばれる"""
+        _res = client.post("/str", content=f"{cmd_str} wa").json()
+
+        assert len(_res) == 2
+        assert "error" not in _res[0], _res[0]
+        assert not _res[1]["result"]["busy_flag"]
+
+        _mock = getattr(json_app.thr_worker.mservo, method)
+        _mock.assert_called()
+        if args is not None:
+            assert _mock.call_args.args[: len(args)] == args
+
+    @pytest.mark.parametrize(
+        ("cmd_str", "attr", "expected"),
+        [
+            ("ms:0.5", "move_sec", 0.5),
+            ("st:20", "step_n", 20),
+            ("st:auto", "step_n", None),
+            ("is:0.1", "interval_sec", 0.1),
+            ("qs", "step_n", 50),
+            ("qq", "step_n", 50),
+            ("ww", "step_n", 50),
+        ],
+    )
+    def test_str_each_param(self, client, json_app, cmd_str, attr, expected):
+        """HTTP(/str): 文字列コマンドで、ワーカーの設定が変わる"""
+        json_app.thr_worker.step_n = 50
+
+        _res = client.post("/str", content=f"{cmd_str} wa").json()
+
+        assert len(_res) == 2
+        assert "error" not in _res[0], _res[0]
+        assert not _res[1]["result"]["busy_flag"]
+        assert getattr(json_app.thr_worker, attr) == expected
+
+    def test_ws_str(self, client, json_app):
+        """WebSocket(/ws/str): JSONに見えても、文字列コマンド"""
+        with client.websocket_connect("/ws/str?events=0") as _ws:
+            for _ in range(2):
+                _ws.send_text("mv:30,-30")
+                _res = _ws.receive_json()
+                assert _res[0]["result"]["request"]["method"] == (
+                    "move_all_angles_sync"
+                )
+
+            _ws.send_text('{"method":"qsize"}')
+            _res = _ws.receive_json()
+            assert len(_res) == 1
+            assert _res[0]["error"]["code"] == -32601
+
+        assert json_app.str_parser.cache_hits == 1
+
+    def test_ws_done_event(self, client, json_app):
+        """WebSocket: キューに入れたコマンドの完了イベント"""
+        release = threading.Event()
+        _mservo = json_app.thr_worker.mservo
+        _mservo.move_all_angles_sync.side_effect = lambda *_: release.wait(2)
+
+        with client.websocket_connect("/ws") as _ws:
+            _ws.send_json({"method": "move", "params": {"angles": [30, 0]}})
+            _res = _ws.receive_json()
+            _id = _res["result"]["id"]
+            assert _res["result"]["group"] == "default"
+
+            release.set()
+            _event = _ws.receive_json()
+
+        assert _event["event"] == "done"
+        assert _event["id"] == _id
+        assert _event["group"] == "default"
+        assert _event["value"]["state"] == "done"
+
+    def test_ws_status_no_event(self, client):
+        """WebSocket: `status`, `await`では、完了イベントを送らない"""
+        with client.websocket_connect("/ws") as _ws:
+            _ws.send_json({"method": "move", "params": {"angles": [30, 0]}})
+            _id = _ws.receive_json()["result"]["id"]
+            _event = _ws.receive_json()
+            assert _event["event"] == "done"
+            assert _event["id"] == _id
+
+            for _method in ("status", "await"):
+                _ws.send_json(
+                    {
+                        "method": _method,
+                        "params": {"id": _id},
+                        "group": "default",
+                    }
+                )
+                _res = _ws.receive_json()
+                assert _res["result"]["value"]["state"] == "done"
+
+            # 次に届くのは、qsizeの返り値 (イベントではない)
+            _ws.send_json(QSIZE)
+            assert "event" not in _ws.receive_json()
+
+    def test_udp_pose(self, mocker_pigpio):
+        """udp_port: UDPのフレームを、coalesce モードのワーカーで実行"""
+        with patch(
+            "pi0servo.helper.thread_worker.MultiServo",
+            side_effect=_new_mservo,
+        ):
+            _json_app = JsonApi(PINS, udp_port=0, udp_host="127.0.0.1")
+        try:
+            assert _json_app.thr_worker.coalesce
+            _mservo = _json_app.thr_worker.mservo
+
+            with UdpPoseSender(*_json_app.udp_server.address) as _sender:
+                _sender.send([30, None])
+
+            _deadline = time.monotonic() + 2
+            while not _mservo.move_all_angles.called:
+                assert time.monotonic() < _deadline
+                time.sleep(0.01)
+            _mservo.move_all_angles.assert_called_once_with([30.0, None])
+        finally:
+            _json_app.end()
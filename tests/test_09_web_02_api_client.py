@@ -0,0 +1,216 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_web_02_api_client.py
+"""
+
+import asyncio
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from pi0servo.web.api_client import ApiClient, AsyncApiClient
+
+
+def _fake_post(_url, data, **_kwargs):
+    """`/cmd`のように、コマンドごとに返り値を返す"""
+    _cmd = json.loads(data)
+    _res = MagicMock()
+    if isinstance(_cmd, list):
+        _res.json.return_value = [{"result": {"request": _c}} for _c in _cmd]
+    else:
+        _res.json.return_value = {"result": {"request": _cmd}}
+    return _res
+
+
+@pytest.fixture
+def client():
+    """接続を使い回す ApiClient (POSTはモック)"""
+    _client = ApiClient(keep_alive=True, batch_max=3)
+    _client._session.post = MagicMock(side_effect=_fake_post)
+    yield _client
+    _client.close()
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    """`/cmd`のように、受け取ったJSONを返す (keep-alive)"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        _body = self.rfile.read(int(self.headers["content-length"]))
+        _data = json.dumps(
+            {"path": self.path, "request": json.loads(_body)}
+        ).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(_data)))
+        self.end_headers()
+        self.wfile.write(_data)
+
+    def log_message(self, *_args):
+        pass
+
+
+class _UnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+    accepted = 0
+
+    def get_request(self):
+        self.accepted += 1
+        return super().get_request()
+
+
+@pytest.fixture
+def uds_server(tmp_path):
+    """Unixドメインソケットで受け付けるHTTPサーバー"""
+    _path = str(tmp_path / "api.sock")
+    _server = _UnixHTTPServer(_path, _EchoHandler)
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    yield _server, _path
+    _server.shutdown()
+    _server.server_close()
+
+
+def posted(client) -> list:
+    """POSTしたデータのリスト"""
+    return [
+        json.loads(_c.kwargs["data"])
+        for _c in client._session.post.call_args_list
+    ]
+
+
+class TestApiClient:
+    """ApiClientクラスのテスト"""
+
+    def test_post(self):
+        """デフォルトは、コマンドごとに requests.post()"""
+        with patch(
+            "pi0servo.web.api_client.requests.post", side_effect=_fake_post
+        ) as _post:
+            _client = ApiClient()
+            _ret = _client.post({"method": "qsize"})
+
+        assert _ret == {"result": {"request": {"method": "qsize"}}}
+        assert _client._session is None
+        assert _post.call_args.kwargs["timeout"] == ApiClient.DEF_TIMEOUT
+
+    def test_post_keep_alive(self, client):
+        """keep_alive: セッションで送る"""
+        client.post({"method": "qsize"})
+        client.post({"method": "wait"})
+
+        assert posted(client) == [{"method": "qsize"}, {"method": "wait"}]
+
+    def test_post_error(self, client):
+        """接続できない"""
+        client._session.post.side_effect = requests.exceptions.ConnectionError
+        _ret = client.post({"method": "qsize"})
+
+        assert _ret["status"] == "ERR"
+        assert _ret["cmddata"] == {"method": "qsize"}
+
+    def test_submit_batch_max(self, client):
+        """batch_max個たまったら、配列で送る"""
+        _futs = [
+            client.submit({"method": "move", "id": _i}) for _i in range(4)
+        ]
+
+        assert posted(client) == [
+            [{"method": "move", "id": _i} for _i in range(3)]
+        ]
+        _ids = [_f.result(0)["result"]["request"]["id"] for _f in _futs[:3]]
+        assert _ids == [0, 1, 2]
+        assert not _futs[3].done()
+
+        assert client.flush() == 1
+        assert _futs[3].result(0)["result"]["request"]["id"] == 3
+        assert client.flush() == 0
+
+    def test_submit_batch_sec(self):
+        """batch_sec秒たったら送る"""
+        _client = ApiClient(keep_alive=True, batch_sec=0.05)
+        _client._session.post = MagicMock(side_effect=_fake_post)
+        try:
+            _fut1 = _client.submit({"method": "qsize"})
+            _fut2 = _client.submit({"method": "wait"})
+            assert not _fut1.done()
+
+            assert _fut2.result(2)["result"]["request"] == {"method": "wait"}
+            assert _client._session.post.call_count == 1
+        finally:
+            _client.close()
+
+    def test_submit_error(self, client):
+        """エラーは、すべてのコマンドの返り値になる"""
+        client._session.post.side_effect = requests.exceptions.ConnectionError
+        _futs = [client.submit({"method": "qsize"}) for _ in range(3)]
+
+        assert all(_f.result(0)["status"] == "ERR" for _f in _futs)
+
+    def test_close_flush(self, client):
+        """close()で、ためたコマンドを送る"""
+        _fut = client.submit({"method": "qsize"})
+        client.close()
+
+        assert _fut.result(0)["result"]["request"] == {"method": "qsize"}
+        assert client._session is None
+
+    def test_post_uds(self, uds_server):
+        """uds: Unixドメインソケットで、同じ接続を使い回す"""
+        _server, _path = uds_server
+        with ApiClient("http://localhost/cmd", uds=_path) as _client:
+            for _i in range(3):
+                _ret = _client.post({"id": _i})
+                assert _ret == {"path": "/cmd", "request": {"id": _i}}
+
+        assert _server.accepted == 1
+
+    def test_post_uds_error(self, tmp_path):
+        """ソケットがない"""
+        _client = ApiClient(uds=str(tmp_path / "none.sock"))
+        _ret = _client.post({"method": "qsize"})
+        assert _ret["status"] == "ERR"
+
+
+class TestAsyncApiClient:
+    """AsyncApiClientクラスのテスト"""
+
+    def test_post_concurrent(self):
+        """max_inflight個まで、同時に送る"""
+        _lock = threading.Lock()
+        _count = {"now": 0, "max": 0}
+
+        def _slow_post(*args, **kwargs):
+            with _lock:
+                _count["now"] += 1
+                _count["max"] = max(_count["max"], _count["now"])
+            time.sleep(0.05)
+            with _lock:
+                _count["now"] -= 1
+            return _fake_post(*args, **kwargs)
+
+        async def _main():
+            async with AsyncApiClient(max_inflight=4) as _client:
+                _client._client._session.post = MagicMock(
+                    side_effect=_slow_post
+                )
+                return await asyncio.gather(
+                    *[_client.post({"id": _i}) for _i in range(8)]
+                )
+
+        _rets = asyncio.run(_main())
+
+        assert [_r["result"]["request"]["id"] for _r in _rets] == list(
+            range(8)
+        )
+        assert 1 < _count["max"] <= 4
@@ -0,0 +1,181 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_web_03_udp_pose.py
+"""
+
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from pi0servo.web.udp_pose import (
+    HEADER,
+    SEQ_MOD,
+    UdpPoseSender,
+    UdpPoseServer,
+    decode_pose,
+    encode_pose,
+)
+
+GROUPS = {"arm": 2, "head": 1}
+ADDR = ("127.0.0.1", 50000)
+
+
+@pytest.fixture
+def server():
+    """空いているポートで受け付ける (send_funcはモック)"""
+    _server = UdpPoseServer(
+        MagicMock(return_value={"result": {}}), GROUPS, "127.0.0.1", 0
+    )
+    yield _server
+    _server.end()
+
+
+class TestPoseFrame:
+    """フレームのテスト"""
+
+    @pytest.mark.parametrize(
+        ("values", "pulses", "expected"),
+        [
+            ([30.25, -45], False, [30.25, -45]),
+            ([None, 12.346], False, [None, 12.35]),
+            ([1500, None, 600], True, [1500, None, 600]),
+            ([None, None], False, []),
+        ],
+    )
+    def test_roundtrip(self, values, pulses, expected):
+        """エンコードして、デコードする"""
+        _data = encode_pose(7, values, group=1, pulses=pulses)
+        _n = sum(_v is not None for _v in values)
+        assert len(_data) == HEADER.size + 2 * _n
+
+        assert decode_pose(_data) == (1, 7, pulses, expected)
+
+    @pytest.mark.parametrize(
+        ("values", "match"),
+        [([0] * 33, "too many"), ([400], "invalid frame")],
+    )
+    def test_encode_invalid(self, values, match):
+        """サーボの数、値の範囲の誤り"""
+        with pytest.raises(ValueError, match=match):
+            encode_pose(1, values)
+
+    @pytest.mark.parametrize(
+        ("data", "match"),
+        [
+            (b"PS", "short"),
+            (b"XX" + encode_pose(1, [0])[2:], "magic"),
+            (encode_pose(1, [0, 0])[:-2], "length"),
+        ],
+    )
+    def test_decode_invalid(self, data, match):
+        """フレームの誤り"""
+        with pytest.raises(ValueError, match=match):
+            decode_pose(data)
+
+
+class TestUdpPoseServer:
+    """UdpPoseServerクラスのテスト"""
+
+    def test_accept(self, server):
+        """角度は move_all_angles、パルス幅は move_all_pulses"""
+        _cmd = server.accept(encode_pose(1, [None, 30]), ADDR, 0.0)
+        assert _cmd == {
+            "method": "move_all_angles",
+            "params": {"angles": [None, 30.0]},
+            "group": "arm",
+            "priority": "interactive",
+        }
+
+        _data = encode_pose(1, [1500], group=1, pulses=True)
+        _cmd = server.accept(_data, ADDR, 0.0)
+        assert _cmd["method"] == "move_all_pulses"
+        assert _cmd["params"] == {"pulses": [1500]}
+        assert _cmd["group"] == "head"
+
+    def test_accept_padding(self, server):
+        """マスクにないサーボは None"""
+        _cmd = server.accept(encode_pose(1, [10]), ADDR, 0.0)
+        assert _cmd["params"]["angles"] == [10.0, None]
+
+    def test_accept_invalid(self, server):
+        """不明なグループ、サーボの数の誤り、壊れたフレーム"""
+        assert server.accept(encode_pose(1, [0], group=2), ADDR, 0.0) is None
+        assert server.accept(encode_pose(1, [0, 0, 0]), ADDR, 0.0) is None
+        assert server.accept(b"garbage", ADDR, 0.0) is None
+        assert server.invalid == 3
+
+    def test_accept_out_of_order(self, server):
+        """古いseqのフレームは捨てる(送り元・グループごと)"""
+        assert server.accept(encode_pose(5, [0]), ADDR, 0.0)
+        assert server.accept(encode_pose(4, [0]), ADDR, 0.1) is None
+        assert server.accept(encode_pose(5, [0]), ADDR, 0.1) is None
+        assert server.dropped_old == 2
+
+        # 別のグループ、別の送り元
+        assert server.accept(encode_pose(1, [0], group=1), ADDR, 0.1)
+        assert server.accept(encode_pose(1, [0]), ("127.0.0.1", 1), 0.1)
+
+    def test_accept_wrap(self, server):
+        """seqの折り返し"""
+        assert server.accept(encode_pose(SEQ_MOD - 1, [0]), ADDR, 0.0)
+        assert server.accept(encode_pose(0, [0]), ADDR, 0.1)
+        assert server.accept(encode_pose(SEQ_MOD - 1, [0]), ADDR, 0.2) is None
+
+    def test_accept_reset(self, server):
+        """reset_sec秒以上あいたら、どのseqも受け付ける"""
+        assert server.accept(encode_pose(100, [0]), ADDR, 0.0)
+        assert server.accept(encode_pose(1, [0]), ADDR, server.reset_sec)
+
+    def test_accept_prune(self, server):
+        """フレームのなくなった送り元は、削除される"""
+        for _port in range(100):
+            server.accept(encode_pose(0, [0]), ("127.0.0.1", _port), 0.0)
+        assert len(server._last) == 100
+
+        server.accept(encode_pose(1, [0]), ADDR, server.reset_sec / 2)
+        assert len(server._last) == 101
+
+        server.accept(encode_pose(2, [0]), ADDR, server.reset_sec * 1.2)
+        assert list(server._last) == [(ADDR, 0)]
+
+    def test_run(self, server):
+        """UDPで受け取って、send_funcに渡す"""
+        server.start()
+        _host, _port = server.address
+        with UdpPoseSender(_host, _port, group=1) as _sender:
+            assert _sender.send([45]) == 1
+
+        _send_func = server._send_func
+        _deadline = time.monotonic() + 2
+        while not _send_func.called:
+            assert time.monotonic() < _deadline
+            time.sleep(0.01)
+
+        _cmd = _send_func.call_args.args[0]
+        assert _cmd["params"] == {"angles": [45.0]}
+        assert _cmd["group"] == "head"
+        assert server.stats["dispatched"] == 1
+
+    def test_run_latest(self, server):
+        """たまったフレームは、グループごとに最新のものだけ送る"""
+        _host, _port = server.address
+        with UdpPoseSender(_host, _port) as _sender:
+            for _i in range(5):
+                _sender.send([_i, _i])
+
+        server.start()
+        _send_func = server._send_func
+        _deadline = time.monotonic() + 2
+        while server.received < 5:
+            assert time.monotonic() < _deadline
+            time.sleep(0.01)
+        time.sleep(0.05)
+
+        _sent = [
+            _c.args[0]["params"]["angles"] for _c in _send_func.call_args_list
+        ]
+        assert _sent[-1] == [4.0, 4.0]
+        assert len(_sent) + server.dropped_stale == 5